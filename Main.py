@@ -1,16 +1,16 @@
-import streamlit as st
-import pandas as pd
-import folium
 import json
-import geopandas as gpd
-from streamlit_folium import st_folium
-from pathlib import Path
-from branca.colormap import StepColormap
-import matplotlib.pyplot as plt
-from streamlit.components.v1 import html
-from branca.element import MacroElement
-from jinja2 import Template
-from adjustText import adjust_text
+import time
+import streamlit as st
+from daten import DATEN_DIR, BOUNDARY_FILE, aenderung_info, aenderung_layer, layer_dateien, layer_info, quell_dateien, zonen_layer
+import messung
+import vorwaermen
+
+# Schwere Module (folium, streamlit_folium, pandas, matplotlib, shapely, ...)
+# werden erst in dem Abschnitt importiert, der sie braucht – Seitenleiste und
+# Titel stehen beim ersten Besuch, bevor sie geladen sind. vorwaermen.py lädt
+# sie nach dem ersten Lauf im Hintergrund.
+
+_lauf_start = time.perf_counter()
 
 # --- Inhaltsverzeichnis ---
 st.sidebar.title("Navigation")
@@ -23,13 +23,31 @@ toc_items = {
 for name, anchor in toc_items.items():
     st.sidebar.markdown(f"- [{name}]({anchor})")
 
+kartenmodus = st.sidebar.radio(
+    "Kartenmodus",
+    ["Eingebettet", "Vektorkacheln", "Dateien"],
+    help="Vektorkacheln: der Browser lädt nur die Kacheln des sichtbaren Ausschnitts, "
+         "statt alle Daten mit der Seite zu übertragen. Dateien: der Browser lädt jeden "
+         "Layer einmal als komprimierte Datei und nimmt ihn danach aus seinem Cache.",
+)
+diagramm_modus = st.sidebar.radio(
+    "Trenddiagramm",
+    ["Bild", "Interaktiv"],
+    help="Interaktiv: Vega-Lite-Diagramm im Browser, ohne matplotlib auf dem Server.",
+)
+zeige_performance = st.sidebar.checkbox(
+    "Performance anzeigen",
+    key="performance",
+    help="Dauer der einzelnen Schritte, Nutzlast der Karte und Cache-Treffer dieses Server-Prozesses.",
+)
+
 st.markdown("<a name='Dashboard'></a>", unsafe_allow_html=True) 
 st.title("1. Dashboard zur Luftverschmutzung in Dresden")
 
 # GeoJSON-Verzeichnis und Dateien
-geojson_dir = Path(__file__).parent
-boundary_file = "dresden_grenze.geojson"
-geojson_files = [f for f in geojson_dir.glob("*.geojson") if f.name != boundary_file]
+geojson_dir = DATEN_DIR
+boundary_file = BOUNDARY_FILE
+geojson_files = layer_dateien()
 layer_options = sorted([f.stem for f in geojson_files])
 
 col1, col2 = st.columns([5, 1])
@@ -37,252 +55,172 @@ col1, col2 = st.columns([5, 1])
 with col1:
     selected_layers = st.multiselect(
         "Wähle die Layer aus, die angezeigt werden sollen:",
-        layer_options
+        layer_options + aenderung_layer() + zonen_layer()
     )
 
-class MetricScaleControl(MacroElement):
-    _template = Template(u"""
-        {% macro script(this, kwargs) %}
-        var mapObj = {{this._parent.get_name()}};
-        mapObj.whenReady(function() {
-            L.control.scale({
-                metric: true,
-                imperial: false,
-                position: 'bottomleft'
-            }).addTo(mapObj);
-        });
-        {% endmacro %}
-    """)
-
-# Karte ohne eingebauten Maßstab
-m = folium.Map(location=[51.05, 13.74], zoom_start=12)
-
-# Nur metrischen Maßstab hinzufügen
-m.add_child(MetricScaleControl())
-
-# Stadtgrenze laden
 boundary_path = geojson_dir / boundary_file
-if boundary_path.exists():
-    with open(boundary_path, "r", encoding="utf-8") as f:
-        boundary_geojson = json.load(f)
-    folium.GeoJson(
-        boundary_geojson,
-        name="Stadtgrenze Dresden",
-        style_function=lambda feature: {
-            "color": "black",
-            "weight": 2,
-            "fillOpacity": 0,
-        },
-        control=False,
-    ).add_to(m)
-else:
+if not boundary_path.exists():
     st.warning("dresden_grenze.geojson wurde nicht gefunden!")
 
-colors = [ "#008000", "#ADFF2F", "#FFFF00", "#FFA500","#FF0000"] 
-thresholds = [0, 15, 20, 27, 40, 41]
-
-colormap = StepColormap(
-    colors=colors,
-    index=thresholds,
-    vmin=0, vmax=40
-)
-colormap.caption = "NO₂-Konzentration (µg/m³)"
-
-# GeoJSON-Layer verarbeiten
 for layer_name in selected_layers:
-    filepath = geojson_dir / f"{layer_name}.geojson"
-    if filepath.exists():
-        with open(filepath, "r", encoding="utf-8") as f:
-            geojson_data = json.load(f)
-
-        # NO₂ Fläche
-        if "NO2" in layer_name and "Flächenbelastung" in layer_name:
-            tooltip = folium.GeoJsonTooltip(
-                fields=["NO2", "Jahr"],
-                aliases=["NO₂-Flächenbelastung (µg/m³):", "Jahr:"]
-            )
-            style_fn = lambda feature: {
-                "fillColor": colormap(feature["properties"].get("NO2")),
-                "color": "black",
-                "weight": 0.5,
-                "fillOpacity": 0.6
-            }
-            folium.GeoJson(
-                geojson_data,
-                name=layer_name,
-                tooltip=tooltip,
-                style_function=style_fn
-            ).add_to(m)
-
-        # NO₂ Straße
-        elif "NO2" in layer_name and "Straßenrandbelastung" in layer_name:
-            tooltip = folium.GeoJsonTooltip(
-                fields=["no2_i1", "jahr"],
-                aliases=["NO₂-Straßenrandbelastung (µg/m³):", "Jahr:"]
-            )
-
-
-            def style_fn(feature):
-                return {
-                    "color": colormap(feature["properties"].get("no2_i1")),
-                    "weight": 3
-                }
-
-            # Nur Features mit gültigem Wert anzeigen
-            valid_features = [
-            f for f in geojson_data["features"]
-            if isinstance(f["properties"].get("no2_i1"), (int, float)) and f["properties"]["no2_i1"] is not None
-            ]
-
-            if valid_features:
-                folium.GeoJson(
-                    data={"type": "FeatureCollection", "features": valid_features},
-                    name=layer_name,
-                    tooltip=tooltip,
-                    style_function=style_fn
-                ).add_to(m)
-
-
-        # PM10 Fläche
-        elif "PM10" in layer_name and "Flächenbelastung" in layer_name:
-            tooltip = folium.GeoJsonTooltip(
-                fields=["PM10", "Jahr"],
-                aliases=["PM10-Flächenbelastung (µg/m³):", "Jahr:"]
-            )
-            style_fn = lambda feature: {
-                "fillColor": colormap(feature["properties"].get("PM10")),
-                "color": "black",
-                "weight": 0.5,
-                "fillOpacity": 0.6
-            }
-            folium.GeoJson(
-                geojson_data,
-                name=layer_name,
-                tooltip=tooltip,
-                style_function=style_fn
-            ).add_to(m)
-
-        # PM10 Straße
-        elif "PM10" in layer_name and "Straßenrandbelastung" in layer_name:
-            tooltip = folium.GeoJsonTooltip(
-                fields=["pm10_ist", "jahr"],
-                aliases=["PM10-Straßenrandbelastung (µg/m³):", "Jahr:"]
-            )
-            
-            
-            def style_fn(feature):
-                return {
-                    "color": colormap(feature["properties"].get("pm10_ist")),
-                    "weight": 3
-                }
-            valid_features = [
-                f for f in geojson_data["features"]
-                if isinstance(f["properties"].get("pm10_ist"), (int, float)) and f["properties"]["pm10_ist"] is not None
-            ]
-
-            if valid_features:
-                folium.GeoJson(
-                    data={"type": "FeatureCollection", "features": valid_features},
-                    name=layer_name,
-                    tooltip=tooltip,
-                    style_function=style_fn
-                ).add_to(m)
-
-    else:
+    if not all(f.exists() for f in quell_dateien(layer_name)):
         st.warning(f"{layer_name}.geojson wurde nicht gefunden!")
-
-folium.LayerControl().add_to(m)
-# Daten sammeln
-jahres_daten = {
-    "NO2-Flächenbelastung": {},
-    "NO2-Straßenrandbelastung": {},
-    "PM10-Flächenbelastung": {},
-    "PM10-Straßenrandbelastung": {}
-}
-
-for layer_name in layer_options:
-    filepath = geojson_dir / f"{layer_name}.geojson"
-    if filepath.exists():
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        for feature in data["features"]:
-            props = feature.get("properties", {})
-            jahr = str(props.get("Jahr") or props.get("jahr") or "unbekannt")
-
-            if "NO2" in layer_name and "Fläche" in layer_name:
-                val = props.get("NO2")
-                if isinstance(val, (int, float)) and val > 0:
-                    jahres_daten["NO2-Flächenbelastung"].setdefault(jahr, []).append(val)
-
-            elif "NO2" in layer_name and "Straße" in layer_name:
-                val = props.get("no2_i1")
-                if isinstance(val, (int, float)) and val > 0:
-                    jahres_daten["NO2-Straßenrandbelastung"].setdefault(jahr, []).append(val)
-
-            elif "PM10" in layer_name and "Fläche" in layer_name:
-                val = props.get("PM10")
-                if isinstance(val, (int, float)) and val > 0:
-                    jahres_daten["PM10-Flächenbelastung"].setdefault(jahr, []).append(val)
-
-            elif "PM10" in layer_name and "Straße" in layer_name:
-                val = props.get("pm10_ist")
-                if isinstance(val, (int, float)) and val > 0:
-                    jahres_daten["PM10-Straßenrandbelastung"].setdefault(jahr, []).append(val)
-
-# Durchschnitt pro Jahr berechnen
-df = pd.DataFrame({
-    name: {jahr: round(sum(vals)/len(vals), 2) for jahr, vals in jahres.items()}
-    for name, jahres in jahres_daten.items()
-}).sort_index()
-
-def _sort_key(idx):
-    out = []
-    for x in idx:
-        s = str(x)
-        out.append(int(s) if s.isdigit() else 10**9)  # Nicht-Zahlen ganz ans Ende
-    return out
-
-df = df.sort_index(key=_sort_key).round(2)
-df.index = df.index.astype(int)
-df.index.name = "Jahr"  # nur kosmetisch für die Achsenbeschriftung
-
-# Diagramm zeichnen
-fig, ax = plt.subplots(figsize=(10, 5))
-df.plot(ax=ax, marker='o')
-plt.ylim(bottom=10,top=40)
-
-texts = []
-for col, line in zip(df.columns, ax.get_lines()):
-    color = line.get_color()  # gleiche Farbe wie die Linie
-    for x, y in zip(df.index, df[col]):
-        if col == "NO2-Flächenbelastung":  
-            # blaue Linie → Labels UNTER dem Punkt
-            texts.append(
-                ax.text(
-                    x, y-0.5, f"{y:.2f}",
-                    ha="center", va="top", fontsize=8, color=color
+karten_layer = [
+    layer_name for layer_name in selected_layers
+    if all(f.exists() for f in quell_dateien(layer_name))
+]
+
+
+@st.fragment
+def karte_anzeigen(auswahl, modus):
+    import folium
+    import pandas as pd
+    from streamlit_folium import st_folium
+
+    from karte import MetricScaleControl
+    from kartenlayer import grenze_gruppe, layer_gruppen, sichtbarer_ausschnitt, strassen_gruppe, ueber_grenze
+    from vereinfachung import lod_stufe
+    from waben import WABEN_STUFEN
+
+    # Die Grundkarte ist bei jedem Lauf gleich, damit st_folium sie im Browser
+    # nicht neu aufbaut; die Layer kommen als FeatureGroups dazu und werden dort
+    # ausgetauscht. Zurückgegeben werden nur Klick, Zoom und (für die Straßen-
+    # Layer) der Ausschnitt – Interaktionen lösen nur einen Rerun dieses
+    # Fragments aus, und die Layer ändern sich erst, wenn der Ausschnitt den
+    # geladenen Bereich verlässt.
+    karte_state = st.session_state.get("karte") or {}
+    zoom = karte_state.get("zoom") or 12
+    stufe = lod_stufe(zoom)
+    ausschnitt = sichtbarer_ausschnitt(karte_state.get("bounds"), zoom)
+
+    # Grenzwert-Filter: nur Abschnitte/Zellen über dem gewählten Wert zeigen (0 = alle)
+    schwelle = st.slider(
+        "Nur Abschnitte/Zellen über … µg/m³ anzeigen",
+        min_value=0,
+        max_value=60,
+        value=0,
+        step=1,
+        key="grenzwert_filter",
+        help="0 = alle Werte. Orientierung: 40 µg/m³ Jahresmittel-Grenzwert NO₂/PM10 (EU), "
+             "20 µg/m³ EU-Grenzwert ab 2030, 10 µg/m³ (NO₂) bzw. 15 µg/m³ (PM10) WHO-Richtwert 2021, "
+             "29 µg/m³ PM10-Jahresmittel, ab dem der Tagesgrenzwert meist überschritten wird.",
+    )
+    grenze = schwelle or None
+
+    # Straßensuche: Präfixsuche im Straßennamen-Katalog aller Jahre (strassennamen.py);
+    # die gewählte Straße wird hervorgehoben und die Karte auf sie gezoomt
+    such_spalte, treffer_spalte = st.columns(2)
+    with such_spalte:
+        suchtext = st.text_input("Straße suchen", key="strassensuche", placeholder="z. B. Bautzner")
+    strasse = None
+    if suchtext.strip():
+        from strassennamen import lade_katalog
+
+        with messung.stufe("app_strassensuche"):
+            katalog = lade_katalog()
+            treffer = katalog.suche(suchtext)
+        with treffer_spalte:
+            if treffer:
+                strasse = st.selectbox(
+                    "Treffer", treffer, format_func=katalog.namen.__getitem__, key="strassensuche_treffer"
                 )
-            )
+            else:
+                st.info("Keine Straße gefunden.")
+
+    # Karte ohne eingebauten Maßstab
+    m = folium.Map(location=[51.05, 13.74], zoom_start=12)
+
+    # Nur metrischen Maßstab hinzufügen
+    m.add_child(MetricScaleControl())
+
+    # Layerdaten je Auswahl aus dem LRU-Cache (kartenlayer.py); die Nutzlast
+    # wird für diese Session nur gemessen, solange ihr Panel offen ist
+    with messung.stufe("app_kartenlayer"):
+        gruppen = layer_gruppen(auswahl, modus, stufe, ausschnitt, grenze, nutzlast_messen=zeige_performance)
+        if boundary_path.exists():
+            gruppen.insert(0, grenze_gruppe(stufe))
+        if strasse is not None:
+            hervorhebung = strassen_gruppe(strasse, auswahl)
+            if hervorhebung is not None:
+                gruppen.append(hervorhebung)
+    # Nur eine geänderte Ansicht verschiebt die Karte – danach bleibt sie frei beweglich
+    center, suche_zoom = katalog.ansicht(strasse, 1000, 600) if strasse is not None else (None, None)
+
+    # Serialisieren der Karte und Übergabe an die Komponente (ohne die Zeit im Browser)
+    with messung.stufe("app_st_folium"):
+        karte_ausgabe = st_folium(
+            m,
+            width=1000,
+            height=600,
+            key="karte",
+            feature_group_to_add=gruppen,
+            layer_control=folium.LayerControl(),
+            center=center,
+            zoom=suche_zoom,
+            returned_objects=["last_clicked", "zoom"] + (["bounds"] if modus == "Eingebettet" else []),
+        )
+
+    # Straßenrand-Layer bei kleinen Zoomstufen als Waben (waben.py)
+    if modus == "Eingebettet" and stufe in WABEN_STUFEN and any(
+        layer_info(name) and layer_info(name)[1] == "Straßenrandbelastung" for name in auswahl
+    ):
+        st.caption(
+            "Straßenrand-Layer sind bei dieser Zoomstufe zu Waben zusammengefasst "
+            "(Farbe nach dem höchsten Abschnitt, Tooltip mit längengewichtetem Mittel). "
+            "Zum Anzeigen der einzelnen Abschnitte weiter hineinzoomen."
+        )
+
+    # Umfang über der Grenze je Layer (binäre Suche in vorsortierten Werten)
+    if grenze is not None:
+        with messung.stufe("app_ueber_grenze"):
+            umfang = ueber_grenze(auswahl, grenze)
+        if umfang:
+            st.markdown(f"**Über {grenze} µg/m³**")
+            st.dataframe(pd.DataFrame([
+                {
+                    "Layer": name,
+                    "Über Grenze": f"{menge:.1f} {einheit}".replace(".", ","),
+                    "Gesamt": f"{gesamt:.1f} {einheit}".replace(".", ","),
+                    "Anteil (%)": round(100 * menge / gesamt, 1) if gesamt else None,
+                }
+                for name, (menge, gesamt, einheit) in umfang.items()
+            ]), hide_index=True)
+
+    # Punktabfrage: Werte aller Layer und Jahre am zuletzt angeklickten Punkt
+    klick = (karte_ausgabe or {}).get("last_clicked")
+    if klick:
+        from abfrage import punktabfrage
+
+        with messung.stufe("app_punktabfrage"):
+            ergebnisse = punktabfrage(klick["lng"], klick["lat"])
+        st.markdown(f"**Belastung am Punkt {klick['lat']:.5f}, {klick['lng']:.5f}**")
+        if ergebnisse:
+            tabelle = pd.DataFrame([
+                {
+                    "Jahr": r["jahr"],
+                    "Schadstoff": r["schadstoff"],
+                    "Layer": r["typ"],
+                    "Wert (µg/m³)": r["wert"],
+                    "Straße": (r.get("strname") or "").strip(),
+                    "Abstand (m)": r.get("abstand_m"),
+                    "Straßen in Zelle Ø (µg/m³)": r.get("strassen_mittel"),
+                    "Straßen in Zelle max. (µg/m³)": r.get("strassen_max"),
+                    "Über 40 µg/m³ in Zelle (m)": r.get("ueberschreitung_m"),
+                }
+                for r in ergebnisse
+            ]).sort_values(["Jahr", "Schadstoff", "Layer"])
+            st.dataframe(tabelle, hide_index=True)
         else:
-            # alle anderen Linien → Labels ÜBER dem Punkt
-            texts.append(
-                ax.text(
-                    x, y+0.5, f"{y:.2f}",
-                    ha="center", va="bottom", fontsize=8, color=color
-                )
-            )
-ax.set_ylabel("Belastung (µg/m³)")
-ax.set_xlabel("Jahr")
-ax.set_title("NO₂ und PM₁₀ – Durchschnittliche Jahresbelastung")
-ax.grid(True)
-ax.legend(title="Kategorie")
+            st.info("Für diesen Punkt liegen keine Daten vor.")
+
 
 col1, col2 = st.columns([5, 1])
 st.set_page_config(layout="wide")
 with col1:
-    st_folium(m, width=1000, height=600)
-    
+    karte_anzeigen(karten_layer, kartenmodus)
+    # Bis hier steht der sichtbare Teil der Seite (erste Anzeige)
+    messung.erfasse("app_bis_karte", time.perf_counter() - _lauf_start)
+
 with col2:
     st.markdown(
         """
@@ -322,11 +260,89 @@ with col2:
         </div>
         """, unsafe_allow_html=True
     )
+    # Veränderungs-Layer (Segmentindex, segmente.py)
+    if any(aenderung_info(layer_name) for layer_name in karten_layer):
+        st.markdown(
+            """
+            <div style="
+                width: 220px;
+                background-color: white;
+                border:2px solid grey;
+                border-radius:10px;
+                font-size:14px;
+                padding: 16px 16px 8px 16px;
+                margin-bottom: 8px;
+                box-shadow: 2px 2px 6px rgba(0,0,0,0.15);
+                ">
+                <b>Veränderung</b><br><br>
+                <div style="display:flex; align-items:center; margin-bottom:6px;">
+                    <span style="display:inline-block; background:#D7191C; width:15px; height:15px; border-radius:3px; margin-right:10px; opacity:0.8;"></span>
+                    ≥ +5 µg/m³
+                </div>
+                <div style="display:flex; align-items:center; margin-bottom:6px;">
+                    <span style="display:inline-block; background:#FDAE61; width:15px; height:15px; border-radius:3px; margin-right:10px; opacity:0.8;"></span>
+                    +1 bis +5 µg/m³
+                </div>
+                <div style="display:flex; align-items:center; margin-bottom:6px;">
+                    <span style="display:inline-block; background:#D9D9D9; width:15px; height:15px; border-radius:3px; margin-right:10px; opacity:0.8;"></span>
+                    -1 bis +1 µg/m³
+                </div>
+                <div style="display:flex; align-items:center; margin-bottom:6px;">
+                    <span style="display:inline-block; background:#A6D96A; width:15px; height:15px; border-radius:3px; margin-right:10px; opacity:0.8;"></span>
+                    -5 bis -1 µg/m³
+                </div>
+                <div style="display:flex; align-items:center;">
+                    <span style="display:inline-block; background:#1A9641; width:15px; height:15px; border-radius:3px; margin-right:10px; opacity:0.8;"></span>
+                    &lt; -5 µg/m³
+                </div>
+            </div>
+            """, unsafe_allow_html=True
+        )
 st.markdown("<a name='Durchschnitt'></a>", unsafe_allow_html=True)
 st.header("2. Entwicklung der mittleren Luftverschmutzung")
 col1, col2 = st.columns([5, 1])
 with col1:
-    st.pyplot(fig)
+    darstellung = st.radio(
+        "Darstellung",
+        ["Jahresmittel", "Perzentilbänder", "Boxplots"],
+        horizontal=True,
+        key="diagramm_darstellung",
+        help="Perzentilbänder: Median mit den Bereichen P25–P75 und P10–P90, P98 gestrichelt. "
+             "Boxplots: Box P25–P75, Median, Antennen P2–P98, Punkt = Mittelwert. "
+             "Die gepunktete Linie ist der Grenzwert von 40 µg/m³. Beide immer interaktiv.",
+    )
+    # Trend aus den vorberechneten Jahreskennzahlen (build/stats), je Datenversion
+    # einmal gezeichnet (diagramm.py)
+    with messung.stufe("app_diagramm"):
+        from diagramm import boxplot_vega, perzentil_vega, trend_png, trend_vega
+
+        if darstellung == "Perzentilbänder":
+            st.vega_lite_chart(spec=perzentil_vega(layer_options), width="stretch")
+        elif darstellung == "Boxplots":
+            st.vega_lite_chart(spec=boxplot_vega(layer_options), width="stretch")
+        elif diagramm_modus == "Interaktiv":
+            st.vega_lite_chart(spec=trend_vega(layer_options), width="stretch")
+        else:
+            st.image(trend_png(layer_options), width="stretch")
+
+    with st.expander("Verteilung und Überschreitungsanteile je Jahr"):
+        from statistik import ANTEIL_GRENZEN, verteilung_dataframe
+
+        st.dataframe(
+            verteilung_dataframe(layer_options),
+            hide_index=True,
+            column_config={
+                "Jahr": st.column_config.NumberColumn(format="%d"),
+                **{
+                    f"> {g}": st.column_config.NumberColumn(f"Anteil > {g} µg/m³", format="%.1f %%")
+                    for g in ANTEIL_GRENZEN
+                },
+            },
+        )
+        st.caption(
+            "Anzahl der Flächen bzw. Straßenabschnitte mit Wert; Perzentile in µg/m³ "
+            "(aus t-Digests, auf Bruchteile eines µg/m³ genau), Anteile exakt aus den Histogrammen."
+        )
 
 # Unterkapitel
 st.markdown("<a name='NO₂-Informationen'></a>", unsafe_allow_html=True)
@@ -392,9 +408,65 @@ Das LfULG berechnet auf der Grundlage des Sächsischen Emissionskatasters und de
 Die Karte stellt vor einem Stadthintergrund, der zur besseren Orientierung im Stadtgebiet dient, im Ein-Kilometer-Raster die flächenhafte PM10-Belastung als Jahresmittelwert dar. Zusätzlich wird die häufig erhöhte Luftverschmutzung am Straßenrand für ein speziell festgelegtes Straßennetz der Stadt Dresden dargestellt. Beide Werte zusammen können einen Eindruck über die Belastungssituation in der Stadt vermitteln. Punktgenaue Aussagen sind naturgemäß in einem Ein-Kilometer-Raster nicht möglich. Auch bei der berechneten Straßenrandbelastung sind derartige Aussagen nicht möglich, weil die verwendeten Bebauungsdaten (Fahrbahnabstand, Bebauungsdichte, Bebauungshöhe), die zur Ermittlung dieser Belastung herangezogen werden, Mittelwerte sind, die für mindestens 65 Meter lange Abschnitte gelten.\n
 """)
 
-
-
-
-
-
-
+# --- Performance (messung.py) ---
+lauf_s = time.perf_counter() - _lauf_start
+messung.erfasse("app_lauf", lauf_s)
+# Erster Lauf dieses Server-Prozesses: getrennt messen und die übrigen Caches
+# im Hintergrund füllen (vorwaermen.py)
+if vorwaermen.nach_erstem_lauf():
+    messung.erfasse("app_erster_lauf", lauf_s)
+messung.exportiere_periodisch("app")
+if zeige_performance:
+    import pandas as pd
+
+    stand = messung.stand()
+    with st.sidebar.expander("Performance", expanded=True):
+        st.caption("Summen seit dem Start dieses Server-Prozesses; Kartenläufe ohne die Zeit im Browser.")
+        st.dataframe(pd.DataFrame([
+            {
+                "Schritt": name,
+                "Anzahl": s["anzahl"],
+                "Ø (ms)": round(1000 * s["summe_s"] / s["anzahl"], 1),
+                "max. (ms)": round(1000 * s["max_s"], 1),
+                "zuletzt (ms)": round(1000 * s["letzte_s"], 1),
+            }
+            for name, s in stand["stufen"].items()
+        ]), hide_index=True)
+        if stand["mengen"]:
+            st.dataframe(pd.DataFrame([
+                {"Menge": name, "zuletzt": m["letzter"], "Ø": round(m["summe"] / m["anzahl"])}
+                for name, m in stand["mengen"].items()
+            ]), hide_index=True)
+        st.dataframe(pd.DataFrame([
+            {
+                "Cache": name,
+                "Treffer": c["treffer"],
+                "Fehlschläge": c["fehlschlaege"],
+                "Quote (%)": round(100 * c["treffer"] / (c["treffer"] + c["fehlschlaege"]), 1),
+            }
+            for name, c in stand["caches"].items()
+        ]), hide_index=True)
+        # Gemeinsamer Zwischenspeicher aller Sessions (zwischenspeicher.py)
+        import zwischenspeicher
+
+        speicher = zwischenspeicher.statistik()
+        gesamt = speicher.pop("gesamt")
+        st.caption(
+            f"Zwischenspeicher: {gesamt['bytes'] / 2**20:.1f} von {gesamt['budget'] / 2**20:.0f} MB, "
+            f"{gesamt['eintraege']} Einträge, {gesamt['verdraengt']} verdrängt".replace(".", ",")
+        )
+        st.dataframe(pd.DataFrame([
+            {
+                "Bereich": name,
+                "Einträge": b["eintraege"],
+                "MB": round(b["bytes"] / 2**20, 2),
+                "Treffer": b["treffer"],
+                "Fehlschläge": b["fehlschlaege"],
+                "Verdrängt": b["verdraengt"],
+            }
+            for name, b in speicher.items()
+        ]), hide_index=True)
+        st.download_button("Prometheus-Metriken", messung.als_prometheus(stand),
+                           file_name="metriken.prom", mime="text/plain")
+        st.download_button("JSON", json.dumps(stand, ensure_ascii=False, indent=2),
+                           file_name="messung.json", mime="application/json")
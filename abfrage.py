@@ -0,0 +1,146 @@
+import math
+import threading
+
+import numpy as np
+import shapely
+
+from daten import layer_dateien, layer_info, signatur
+import messung
+from raster import lade_raster
+from spalten import lade_strassen_layer
+from zonen import lade_zonen
+
+# Punktabfrage über alle Layer und Jahre: "Wie hoch ist die Belastung hier?"
+# Je Straßen-Layer wird einmal ein STRtree aufgebaut, Flächen-Layer werden im
+# Rasterwürfel (raster.py) nachgeschlagen. Der Index gilt, bis sich eine der
+# Layerdateien ändert.
+
+# Abschnitte, die weiter als MAX_ABSTAND_M vom Klickpunkt entfernt sind, zählen nicht
+MAX_ABSTAND_M = 250
+
+# Lokale Projektion um Dresden (abstandstreu genug für die Suche im Stadtgebiet)
+_LON0, _LAT0 = 13.74, 51.05
+_M_PRO_GRAD = 111_320
+_KX = math.cos(math.radians(_LAT0)) * _M_PRO_GRAD
+
+_index = None
+_lock = threading.Lock()
+
+
+def projiziere(coords):
+    coords = np.asarray(coords, dtype=np.float64)
+    return np.column_stack(((coords[:, 0] - _LON0) * _KX, (coords[:, 1] - _LAT0) * _M_PRO_GRAD))
+
+
+def entprojiziere(xy):
+    """Umkehrung von projiziere: Meter -> (lon, lat)."""
+    xy = np.asarray(xy, dtype=np.float64)
+    return np.column_stack((xy[:, 0] / _KX + _LON0, xy[:, 1] / _M_PRO_GRAD + _LAT0))
+
+
+class _FlaechenIndex:
+    # Flächen-Layer über den Rasterwürfel – die Zelle wird berechnet, nicht gesucht.
+    # Dazu die Straßen-Kennzahlen derselben Zelle aus zonen.py.
+    def __init__(self, wuerfel, zonen, schadstoff, jahr):
+        self.wuerfel = wuerfel
+        self.zonen = zonen
+        self.schadstoff = schadstoff
+        self.jahr = jahr
+
+    def abfrage(self, lon, lat, punkt_m):
+        wert = self.wuerfel.wert(lon, lat, self.jahr, self.schadstoff)
+        if wert is None:
+            return None
+        treffer = {"wert": wert}
+        kennzahlen = self.zonen.zelle(*self.wuerfel.zelle(lon, lat, self.jahr), self.jahr, self.schadstoff)
+        if kennzahlen:
+            treffer.update(
+                strassen_mittel=kennzahlen["mittel"],
+                strassen_max=kennzahlen["max"],
+                ueberschreitung_m=round(kennzahlen["ueberschreitung_m"]),
+            )
+        return treffer
+
+
+class _StrassenIndex:
+    def __init__(self, filepath):
+        strassen = lade_strassen_layer(filepath)
+        self.strassen = strassen
+        self.indizes = strassen.gueltig()
+        laengen = np.diff(strassen.offsets)
+        linien = shapely.linestrings(
+            projiziere(strassen.coords),
+            indices=np.repeat(np.arange(len(strassen)), laengen),
+        )
+        self.baum = shapely.STRtree(linien[self.indizes])
+
+    def abfrage(self, lon, lat, punkt_m):
+        treffer, abstand = self.baum.query_nearest(
+            punkt_m, max_distance=MAX_ABSTAND_M, return_distance=True, all_matches=False
+        )
+        if not len(treffer):
+            return None
+        i = int(self.indizes[treffer[0]])
+        return {
+            "wert": float(self.strassen.werte[i]),
+            "strname": self.strassen.strnamen[self.strassen.strname_codes[i]],
+            "abstand_m": round(float(abstand[0])),
+        }
+
+
+class Abfrageindex:
+    """Räumliche Indizes aller Layer einer Datenversion."""
+
+    def __init__(self, dateien):
+        self.layer = []
+        wuerfel = zonen = None
+        for filepath in sorted(dateien):
+            info = layer_info(filepath.stem)
+            if not info:
+                continue
+            if info[1] == "Straßenrandbelastung":
+                index = _StrassenIndex(filepath)
+            else:
+                wuerfel = wuerfel or lade_raster()
+                zonen = zonen or lade_zonen()
+                index = _FlaechenIndex(wuerfel, zonen, info[0], info[2])
+            self.layer.append((filepath.stem, info, index))
+
+    def punkt(self, lon, lat):
+        """Werte aller Layer am Punkt (lon, lat).
+
+        Flächen-Layer liefern den Wert der Rasterzelle, die den Punkt enthält,
+        Straßen-Layer den nächsten Abschnitt mit Messwert im Umkreis von MAX_ABSTAND_M.
+        """
+        punkt_m = shapely.Point(*projiziere([[lon, lat]])[0])
+        ergebnisse = []
+        for name, (schadstoff, typ, jahr), index in self.layer:
+            treffer = index.abfrage(lon, lat, punkt_m)
+            if treffer is not None:
+                ergebnisse.append(dict(treffer, layer=name, schadstoff=schadstoff, typ=typ, jahr=int(jahr)))
+        return ergebnisse
+
+
+def datenversion():
+    return tuple(sorted((f.stem, signatur(f)) for f in layer_dateien()))
+
+
+def lade_abfrageindex():
+    """Abfrageindex der aktuellen Datenversion; wird prozessweit geteilt und nur bei Änderungen neu gebaut."""
+    global _index
+    version = datenversion()
+    with _lock:
+        if _index is not None and _index[0] == version:
+            messung.cache("abfrageindex", True)
+            return _index[1]
+    messung.cache("abfrageindex", False)
+
+    with messung.stufe("bau_abfrageindex"):
+        index = Abfrageindex(layer_dateien())
+    with _lock:
+        _index = (version, index)
+    return index
+
+
+def punktabfrage(lon, lat):
+    return lade_abfrageindex().punkt(lon, lat)
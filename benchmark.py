@@ -0,0 +1,300 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from daten import BOUNDARY_FILE, BUILD_DIR, DATEN_DIR, layer_dateien, layer_info, wert_feld
+from geojson_stream import lies_features
+
+# Benchmark der Pipeline CSV → GeoJSON → Aggregation → Karte, ohne Streamlit-Server.
+#
+#   python benchmark.py                      # Faktoren 1 und 10, Vergleich mit der Basis
+#   python benchmark.py --faktoren 1 10 100 --jahre 4
+#   python benchmark.py --als-basis          # aktuelle Messung als neue Basis speichern
+#
+# Je Skalierung werden aus den Dresdner Layern synthetische CSV-Dateien erzeugt
+# (FAKTOR Kopien jedes Straßenabschnitts, leicht versetzt, und JAHRE zusätzliche
+# Jahre). Gemessen wird in einem eigenen Prozess mit LUFTDATEN_DIR auf diesen
+# Daten, also mit leeren Caches und eigenem build-Ordner. Jede Messung wird an
+# VERLAUF angehängt; liegt eine Basis vor, endet der Lauf mit Exit-Code 1, wenn
+# eine Stufe mehr als --toleranz langsamer geworden ist.
+
+BENCHMARK_DIR = BUILD_DIR / "benchmark"
+VERLAUF = BENCHMARK_DIR / "verlauf.jsonl"
+BASIS = BENCHMARK_DIR / "basis.json"
+# Bei Änderungen am Generator hochzählen – vorhandene synthetische Daten werden neu erzeugt
+GENERATOR_VERSION = 1
+
+# Versatz der Kopien eines Straßenabschnitts (Grad, etwa 15–20 m)
+VERSATZ_GRAD = 0.0002
+# Abweichungen unter MIN_DIFF_S gelten nie als Regression (Messrauschen)
+MIN_DIFF_S = 0.05
+ABFRAGEN = 1000
+
+
+def _wkt_linie(coords):
+    return "SRID=4326;LINESTRING (" + ", ".join(f"{x!r} {y!r}" for x, y in coords) + ")"
+
+
+def _wkt_polygon(ringe):
+    return "SRID=4326;POLYGON (" + ", ".join(
+        "(" + ", ".join(f"{x!r} {y!r}" for x, y in ring) + ")" for ring in ringe
+    ) + ")"
+
+
+def _csv_name(schadstoff, typ, jahr):
+    typ = "flächenhafte Belastung" if typ == "Flächenbelastung" else "Straßenrandbelastung"
+    return f"{schadstoff} - {typ} ({jahr}).csv"
+
+
+def erzeuge_daten(ziel, faktor=1, jahre=0, seed=0):
+    """Schreibt synthetische CSV-Eingaben für etl.py nach ziel/csv.
+
+    Straßen-Layer: jeder Abschnitt faktor-mal, jede Kopie um VERSATZ_GRAD
+    verschoben. Flächen-Layer bleiben beim 1-km-Raster der Stadt. Zusätzliche
+    Jahre (2021, 2023, ...) übernehmen die Geometrie eines vorhandenen Jahres
+    mit um bis zu ±10 % veränderten Werten.
+    """
+    ziel = Path(ziel)
+    csv_dir = ziel / "csv"
+    shutil.rmtree(ziel, ignore_errors=True)
+    csv_dir.mkdir(parents=True)
+    shutil.copy(DATEN_DIR / BOUNDARY_FILE, ziel / BOUNDARY_FILE)
+
+    rng = np.random.default_rng(seed)
+    layer = sorted((layer_info(f.stem), f) for f in layer_dateien() if layer_info(f.stem))
+    echte_jahre = sorted({info[2] for info, _ in layer})
+    neue_jahre = [str(int(echte_jahre[-1]) + 2 * (i + 1)) for i in range(jahre)]
+
+    for (schadstoff, typ, jahr), filepath in layer:
+        feld = wert_feld(filepath.stem)
+        features = list(lies_features(filepath))
+        zieljahre = [jahr] + [
+            neu for i, neu in enumerate(neue_jahre) if echte_jahre[i % len(echte_jahre)] == jahr
+        ]
+        for zieljahr in zieljahre:
+            werte = np.array([
+                np.nan if f["properties"].get(feld) is None else f["properties"][feld]
+                for f in features
+            ], dtype=np.float64)
+            if zieljahr != jahr:
+                werte = np.round(werte * rng.uniform(0.9, 1.1, len(werte)), 1)
+
+            if typ == "Flächenbelastung":
+                df = pd.DataFrame({
+                    "deskn1": werte,
+                    "shape": [_wkt_polygon(f["geometry"]["coordinates"]) for f in features],
+                })
+            else:
+                kopien = [
+                    (f, k) for k in range(faktor) for f in features
+                ]
+                spalte = feld if int(zieljahr) < 2019 else "deskn1"
+                df = pd.DataFrame({
+                    "strname": [f["properties"].get("strname") for f, _ in kopien],
+                    spalte: np.tile(werte, faktor),
+                    "shape": [
+                        _wkt_linie((np.asarray(f["geometry"]["coordinates"]) + k * VERSATZ_GRAD).tolist())
+                        for f, k in kopien
+                    ],
+                })
+            df.to_csv(csv_dir / _csv_name(schadstoff, typ, zieljahr), sep=";", decimal=",",
+                      index=False, encoding="utf-8")
+
+    with open(ziel / "generator.json", "w", encoding="utf-8") as f:
+        json.dump({"version": GENERATOR_VERSION, "faktor": faktor, "jahre": jahre, "seed": seed}, f)
+    return csv_dir
+
+
+def _daten_aktuell(ziel, faktor, jahre, seed):
+    try:
+        with open(Path(ziel) / "generator.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta == {"version": GENERATOR_VERSION, "faktor": faktor, "jahre": jahre, "seed": seed}
+
+
+class _Stoppuhr:
+    def __init__(self):
+        self.zeiten = {}
+
+    @contextlib.contextmanager
+    def stufe(self, name):
+        start = time.perf_counter()
+        yield
+        self.zeiten[name] = round(time.perf_counter() - start, 4)
+
+
+def messe(csv_dir):
+    """Misst alle Stufen auf den Daten in LUFTDATEN_DIR. Läuft im Messprozess."""
+    import folium
+
+    import etl
+    from abfrage import lade_abfrageindex
+    from daten import lade_geojson
+    from diagramm import trend_png
+    from kartenlayer import grenze_gruppe, layer_gruppen
+    from raster import lade_raster
+    from spalten import baue_alle as baue_spalten
+    from statistik import baue_alle as baue_statistik, trend_dataframe
+
+    uhr = _Stoppuhr()
+    werte = {}
+    csv_bytes = sum(f.stat().st_size for f in Path(csv_dir).glob("*.csv"))
+
+    # Ausgaben der Build-Skripte unterdrücken, stdout gehört dem Ergebnis
+    with contextlib.redirect_stdout(io.StringIO()):
+        with uhr.stufe("etl"):
+            if etl.main(["--input-dir", str(csv_dir), "--force"]):
+                raise RuntimeError("etl.py ist fehlgeschlagen")
+        werte["csv_mb_pro_s"] = round(csv_bytes / 1e6 / uhr.zeiten["etl"], 2)
+
+        dateien = sorted(layer_dateien())
+        namen = [f.stem for f in dateien]
+        werte["layer"] = len(dateien)
+        werte["geojson_mb"] = round(sum(f.stat().st_size for f in dateien) / 1e6, 2)
+
+        with uhr.stufe("geojson_stream"):
+            werte["features"] = sum(1 for f in dateien for _ in lies_features(f))
+        with uhr.stufe("geojson_laden"):
+            for f in dateien:
+                lade_geojson(f)
+
+        with uhr.stufe("statistik"):
+            baue_statistik()
+        with uhr.stufe("trend"):
+            trend_dataframe(namen)
+        with uhr.stufe("trend_diagramm"):
+            trend_png(namen)
+        with uhr.stufe("spalten"):
+            baue_spalten()
+        with uhr.stufe("raster"):
+            lade_raster()
+
+        # Karte mit allen Layern des letzten Jahres – eine typische Auswahl
+        letztes_jahr = max(layer_info(name)[2] for name in namen)
+        auswahl = [name for name in namen if layer_info(name)[2] == letztes_jahr]
+        with uhr.stufe("karte_bauen"):
+            gruppen = [grenze_gruppe(12)] + layer_gruppen(auswahl, "Eingebettet", 12)
+        with uhr.stufe("karte_rendern"):
+            m = folium.Map(location=[51.05, 13.74], zoom_start=12)
+            for gruppe in gruppen:
+                gruppe.add_to(m)
+            folium.LayerControl().add_to(m)
+            html = m.get_root().render()
+        werte["html_mb"] = round(len(html.encode("utf-8")) / 1e6, 2)
+
+        with uhr.stufe("abfrage_index"):
+            index = lade_abfrageindex()
+        rng = np.random.default_rng(0)
+        punkte = np.column_stack((rng.uniform(13.6, 13.95, ABFRAGEN), rng.uniform(50.97, 51.15, ABFRAGEN)))
+        start = time.perf_counter()
+        for lon, lat in punkte:
+            index.punkt(lon, lat)
+        werte["abfrage_ms"] = round((time.perf_counter() - start) / ABFRAGEN * 1000, 3)
+
+    return {"zeiten": uhr.zeiten, "werte": werte}
+
+
+def _messlauf(daten_dir):
+    env = dict(os.environ, LUFTDATEN_DIR=str(daten_dir))
+    ergebnis = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--messen", str(Path(daten_dir) / "csv")],
+        env=env, cwd=Path(__file__).parent, capture_output=True, text=True,
+    )
+    if ergebnis.returncode:
+        raise RuntimeError(f"Messung in {daten_dir} fehlgeschlagen:\n{ergebnis.stderr}")
+    return json.loads(ergebnis.stdout.strip().splitlines()[-1])
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressionen(ergebnisse, basis, toleranz):
+    """Alle Stufen, die gegenüber der Basis mehr als toleranz (relativ) und MIN_DIFF_S langsamer sind."""
+    gefunden = []
+    for skala, messung in ergebnisse.items():
+        alt = basis.get(skala, {}).get("zeiten", {})
+        for stufe, sekunden in messung["zeiten"].items():
+            if stufe in alt and sekunden > alt[stufe] * (1 + toleranz) and sekunden - alt[stufe] > MIN_DIFF_S:
+                gefunden.append((skala, stufe, alt[stufe], sekunden))
+    return gefunden
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark der Datenpipeline mit synthetisch vergrößerten Daten")
+    parser.add_argument("--faktoren", type=int, nargs="+", default=[1, 10],
+                        help="Vervielfachung der Straßenabschnitte (z. B. 1 10 100)")
+    parser.add_argument("--jahre", type=int, default=0, help="Anzahl zusätzlicher synthetischer Jahre")
+    parser.add_argument("--toleranz", type=float, default=0.25,
+                        help="erlaubte Verlangsamung gegenüber der Basis (0.25 = 25 %%)")
+    parser.add_argument("--als-basis", action="store_true", help="Ergebnis als neue Basis speichern")
+    parser.add_argument("--messen", metavar="CSV_DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.messen:
+        print(json.dumps(messe(args.messen)))
+        return 0
+
+    ergebnisse = {}
+    for faktor in args.faktoren:
+        skala = f"{faktor}x+{args.jahre}j"
+        daten_dir = BENCHMARK_DIR / "daten" / skala
+        if not _daten_aktuell(daten_dir, faktor, args.jahre, 0):
+            print(f" Erzeuge synthetische Daten: {skala}")
+            erzeuge_daten(daten_dir, faktor, args.jahre)
+        ergebnisse[skala] = messung = _messlauf(daten_dir)
+        zeiten = ", ".join(f"{stufe} {s:.2f}s" for stufe, s in messung["zeiten"].items())
+        print(f" {skala}: {zeiten}")
+        print(f" {skala}: " + ", ".join(f"{k} {v}" for k, v in messung["werte"].items()))
+
+    BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+    with open(VERLAUF, "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "zeit": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _commit(),
+            "ergebnisse": ergebnisse,
+        }, ensure_ascii=False) + "\n")
+
+    if args.als_basis:
+        basis = {}
+        if BASIS.exists():
+            with open(BASIS, "r", encoding="utf-8") as f:
+                basis = json.load(f)
+        basis.update(ergebnisse)
+        with open(BASIS, "w", encoding="utf-8") as f:
+            json.dump(basis, f, ensure_ascii=False, indent=2)
+        print(f" Basis gespeichert: {BASIS}")
+        return 0
+
+    if not BASIS.exists():
+        print(" Keine Basis vorhanden – mit --als-basis anlegen.")
+        return 0
+    with open(BASIS, "r", encoding="utf-8") as f:
+        basis = json.load(f)
+    gefunden = regressionen(ergebnisse, basis, args.toleranz)
+    for skala, stufe, alt, neu in gefunden:
+        print(f" Regression {skala} {stufe}: {alt:.2f}s → {neu:.2f}s")
+    return 1 if gefunden else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+
+# Verzeichnis mit den GeoJSON-Dateien; LUFTDATEN_DIR setzt ein anderes
+# (z. B. die synthetischen Daten von benchmark.py)
+DATEN_DIR = Path(os.environ.get("LUFTDATEN_DIR") or Path(__file__).parent)
+BOUNDARY_FILE = "dresden_grenze.geojson"
+# Abgeleitete Dateien (Statistiken, Indizes, ...) – werden bei Bedarf neu erzeugt
+BUILD_DIR = DATEN_DIR / "build"
+
+# Wertspalte je Schadstoff und Layertyp
+WERT_FELDER = {
+    ("NO2", "Flächenbelastung"): "NO2",
+    ("NO2", "Straßenrandbelastung"): "no2_i1",
+    ("PM10", "Flächenbelastung"): "PM10",
+    ("PM10", "Straßenrandbelastung"): "pm10_ist",
+}
+
+# Jahresmittel-Grenzwert für NO2 und PM10 (µg/m³, EU-Luftqualitätsrichtlinie)
+GRENZWERT = 40
+
+_LAYER_RE = re.compile(r"^(NO2|PM10)-(Flächenbelastung|Straßenrandbelastung)\((\d{4})\)$")
+# Abgeleitete Kartenlayer: Veränderung zwischen zwei Jahren (segmente.py) und
+# Straßen-Kennzahlen je Rasterzelle (zonen.py)
+_AENDERUNG_RE = re.compile(r"^(NO2|PM10)-Veränderung\((\d{4})→(\d{4})\)$")
+_ZONEN_RE = re.compile(r"^(NO2|PM10)-Straßen je Zelle\((\d{4})\)$")
+
+# Geparste GeoJSON-Dateien liegen im gemeinsamen Zwischenspeicher aller
+# Sessions (zwischenspeicher.py, Bereich "geojson"), je aufgelöstem Pfad mit
+# der Signatur der Datei als Stand. Streamlit führt Main.py bei jeder
+# Interaktion neu aus, importierte Module bleiben aber geladen – der Cache
+# überlebt daher alle Reruns und Sessions.
+
+# Abgeleitete Datensätze in build/ (spalten.py, raster.py, zonen.py, segmente.py,
+# waben.py, strassennamen.py): je ein Ordner, dessen meta.json zuletzt
+# geschrieben wird und die Formatversion und den Stand der Quellen enthält.
+# Die daraus geladenen Objekte werden prozessweit geteilt: ziel -> (Stand, Objekt)
+_abgeleitet = {}
+_abgeleitet_lock = threading.Lock()
+# ziel -> Lock: Sessions und das Vorwärmen (vorwaermen.py) bauen dasselbe Ziel
+# nie gleichzeitig, der zweite Aufrufer wartet und findet es danach aktuell vor
+_bau_locks = {}
+
+
+def signatur(path):
+    """(mtime_ns, Größe) einer Datei – ändert sich, sobald die Datei neu geschrieben wird."""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _stabile_ids(data):
+    # folium ergänzt beim Stylen fehlende Feature-IDs direkt in den Daten.
+    # Wir vergeben sie einmalig beim Laden, damit die geteilten Objekte
+    # danach von niemandem mehr verändert werden.
+    for i, feature in enumerate(data.get("features", [])):
+        feature.setdefault("id", str(i))
+    return data
+
+
+def lade_geojson(path):
+    """Lädt eine GeoJSON-Datei über den prozessweiten Cache.
+
+    Jede Datei wird nur einmal geparst (solange sie nicht aus dem Zwischenspeicher
+    verdrängt wird); neu geparst wird sie auch, wenn sich mtime oder Größe der
+    Datei geändert haben. Das zurückgegebene Objekt wird
+    von allen Aufrufern geteilt und darf nicht verändert werden.
+    """
+    # Erst hier importiert: zwischenspeicher -> messung -> daten
+    import zwischenspeicher
+
+    path = Path(path).resolve()
+
+    def parsen():
+        with open(path, "r", encoding="utf-8") as f:
+            return _stabile_ids(json.load(f))
+
+    return zwischenspeicher.hole_oder_baue("geojson", str(path), parsen, stand=signatur(path))
+
+
+def ist_aktuell(ziel, version, stand):
+    """True, wenn die meta.json in ziel die Version und alle Einträge von stand hat."""
+    try:
+        with open(Path(ziel) / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta.get("version") == version and all(meta.get(k) == v for k, v in stand.items())
+
+
+def bau_lock(ziel):
+    """Lock für das Bauen nach ziel (Ordner oder Datei), je Ziel einer im Prozess."""
+    with _abgeleitet_lock:
+        return _bau_locks.setdefault(Path(ziel).resolve(), threading.Lock())
+
+
+def lade_abgeleitet(name, ziel, version, stand, bauen, laden):
+    """Geteiltes Objekt eines abgeleiteten Datensatzes; baut ihn vorher, falls er fehlt oder veraltet ist.
+
+    stand sind die Einträge der meta.json, die zu den Quellen passen müssen
+    (z. B. {"quellen": {layer: signatur}}); bauen() schreibt den Datensatz nach
+    ziel, laden() liest ihn. Treffer zählen in messung als Cache name, das
+    Bauen als Stufe bau_<name>. Gebaut und geladen wird unter bau_lock(ziel).
+    """
+    # Erst hier importiert: messung -> daten
+    import messung
+
+    ziel = Path(ziel)
+    key = json.dumps(stand, sort_keys=True)
+    with _abgeleitet_lock:
+        eintrag = _abgeleitet.get(ziel)
+        if eintrag is not None and eintrag[0] == key:
+            messung.cache(name, True)
+            return eintrag[1]
+    messung.cache(name, False)
+
+    with bau_lock(ziel):
+        # Inzwischen von einem anderen Thread geladen?
+        with _abgeleitet_lock:
+            eintrag = _abgeleitet.get(ziel)
+            if eintrag is not None and eintrag[0] == key:
+                return eintrag[1]
+        if not ist_aktuell(ziel, version, stand):
+            with messung.stufe(f"bau_{name}"):
+                bauen()
+        objekt = laden()
+        with _abgeleitet_lock:
+            _abgeleitet[ziel] = (key, objekt)
+    return objekt
+
+
+def layer_dateien():
+    """Alle Layer-Dateien im Datenverzeichnis (ohne Stadtgrenze)."""
+    return [f for f in DATEN_DIR.glob("*.geojson") if f.name != BOUNDARY_FILE]
+
+
+def strassen_dateien(schadstoff):
+    """Straßenrand-Layer eines Schadstoffs, sortiert nach Jahr."""
+    dateien = [
+        f for f in layer_dateien()
+        if layer_info(f.stem) and layer_info(f.stem)[:2] == (schadstoff, "Straßenrandbelastung")
+    ]
+    return sorted(dateien, key=lambda f: layer_info(f.stem)[2])
+
+
+def flaechen_dateien():
+    return sorted(
+        f for f in layer_dateien()
+        if layer_info(f.stem) and layer_info(f.stem)[1] == "Flächenbelastung"
+    )
+
+
+def aenderung_info(layer_name):
+    """Zerlegt z. B. "NO2-Veränderung(2011→2019)" in ("NO2", "2011", "2019"), sonst None."""
+    match = _AENDERUNG_RE.match(layer_name)
+    return match.groups() if match else None
+
+
+def aenderung_layer():
+    """Namen der Veränderungs-Layer (erstes → letztes Jahr) aller Schadstoffe mit mindestens zwei Jahren."""
+    namen = []
+    for schadstoff in ("NO2", "PM10"):
+        jahre = [layer_info(f.stem)[2] for f in strassen_dateien(schadstoff)]
+        if len(jahre) >= 2:
+            namen.append(f"{schadstoff}-Veränderung({jahre[0]}→{jahre[-1]})")
+    return namen
+
+
+def zonen_info(layer_name):
+    """Zerlegt z. B. "NO2-Straßen je Zelle(2019)" in ("NO2", "2019"), sonst None."""
+    match = _ZONEN_RE.match(layer_name)
+    return match.groups() if match else None
+
+
+def zonen_strassen_dateien():
+    """Alle Straßen-Layer mit einem Gitter im selben Jahr."""
+    jahre = {layer_info(f.stem)[2] for f in flaechen_dateien()}
+    return [
+        f for schadstoff in ("NO2", "PM10") for f in strassen_dateien(schadstoff)
+        if layer_info(f.stem)[2] in jahre
+    ]
+
+
+def zonen_layer():
+    return [
+        f"{layer_info(f.stem)[0]}-Straßen je Zelle({layer_info(f.stem)[2]})" for f in zonen_strassen_dateien()
+    ]
+
+
+def zonen_quellen(schadstoff, jahr):
+    """Dateien, von denen die Zellkennzahlen eines Schadstoffs und Jahres abhängen."""
+    return [DATEN_DIR / f"{schadstoff}-Straßenrandbelastung({jahr}).geojson"] + [
+        f for f in flaechen_dateien() if layer_info(f.stem)[2] == jahr
+    ]
+
+
+def quell_dateien(layer_name):
+    """Layerdateien, aus denen ein Kartenlayer entsteht."""
+    aenderung = aenderung_info(layer_name)
+    if aenderung:
+        schadstoff, von, bis = aenderung
+        return [f for f in strassen_dateien(schadstoff) if layer_info(f.stem)[2] in (von, bis)]
+    if zonen_info(layer_name):
+        return zonen_quellen(*zonen_info(layer_name))
+    return [DATEN_DIR / f"{layer_name}.geojson"]
+
+
+def layer_info(layer_name):
+    """Zerlegt z. B. "NO2-Flächenbelastung(2011)" in ("NO2", "Flächenbelastung", "2011").
+
+    Gibt None zurück, wenn der Name nicht dem Schema der Layerdateien entspricht.
+    """
+    match = _LAYER_RE.match(layer_name)
+    return match.groups() if match else None
+
+
+def layer_slug(layer_name):
+    """ASCII-Kurzname für Pfade und URLs, z. B. "no2_strasse_2019" (wie die ETL-Ausgaben)."""
+    schadstoff, typ, jahr = layer_info(layer_name)
+    art = "flaeche" if typ == "Flächenbelastung" else "strasse"
+    return f"{schadstoff.lower()}_{art}_{jahr}"
+
+
+def wert_feld(layer_name):
+    info = layer_info(layer_name)
+    return WERT_FELDER.get(info[:2]) if info else None
+
+
+def _schreibe_atomar(path, schreiben, binaer=False):
+    # Erst in eine temporäre Datei im Zielordner schreiben, dann umbenennen –
+    # Leser sehen so nie eine halb geschriebene Datei.
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with (os.fdopen(fd, "wb") if binaer else os.fdopen(fd, "w", encoding="utf-8")) as f:
+            schreiben(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def schreibe_json_atomar(path, obj, **kwargs):
+    _schreibe_atomar(path, lambda f: json.dump(obj, f, ensure_ascii=False, **kwargs))
+
+
+def schreibe_text_atomar(path, text):
+    _schreibe_atomar(path, lambda f: f.write(text))
+
+
+def schreibe_bytes_atomar(path, daten):
+    _schreibe_atomar(path, lambda f: f.write(daten), binaer=True)
@@ -0,0 +1,231 @@
+import hashlib
+import io
+import math
+import threading
+
+from daten import BUILD_DIR, GRENZWERT, schreibe_bytes_atomar
+import messung
+from statistik import ANTEIL_GRENZEN, KATEGORIEN, trend_dataframe, trend_version, verteilung_dataframe
+
+# Trenddiagramm für Abschnitt 2 aus den vorberechneten Jahresmitteln
+# (statistik.trend_dataframe). Beide Darstellungen werden je Datenversion
+# einmal erzeugt und prozessweit geteilt:
+#   trend_png  – matplotlib, als fertiges PNG (matplotlib wird erst hier importiert);
+#                zusätzlich als build/diagramm/trend_<version>.png, damit ein neuer
+#                Server-Prozess (nach vorwaermen.py) matplotlib gar nicht erst lädt
+#   trend_vega – Vega-Lite-Spezifikation für st.vega_lite_chart, ohne matplotlib
+# Aus den Perzentilen (statistik.verteilung_dataframe) ebenso, nur als Vega-Lite:
+#   perzentil_vega – Median je Kategorie mit Bändern P25–P75 und P10–P90, P98 gestrichelt
+#   boxplot_vega   – Box P25–P75, Median, Antennen P2–P98, Mittelwert als Punkt
+DIAGRAMM_DIR = BUILD_DIR / "diagramm"
+# Bei Änderungen an der Darstellung hochzählen, damit alte Bilder neu gezeichnet werden
+DIAGRAMM_VERSION = 1
+Y_BEREICH = (10, 40)
+# Farben der matplotlib-Standardpalette, damit beide Darstellungen gleich aussehen
+KATEGORIE_FARBEN = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728"]
+# Diese Linie bekommt ihre Beschriftung unter die Punkte, alle anderen darüber
+BESCHRIFTUNG_UNTEN = "NO2-Flächenbelastung"
+TITEL = "NO₂ und PM₁₀ – Durchschnittliche Jahresbelastung"
+TITEL_VERTEILUNG = "NO₂ und PM₁₀ – Verteilung der Jahresbelastung"
+
+# art -> (Datenversion, Diagramm)
+_cache = {}
+_lock = threading.Lock()
+
+
+def _memo(art, layer_names, bauen, daten=trend_dataframe):
+    version = trend_version(layer_names)
+    with _lock:
+        eintrag = _cache.get(art)
+        if eintrag is not None and eintrag[0] == version:
+            messung.cache(f"diagramm_{art}", True)
+            return eintrag[1]
+    messung.cache(f"diagramm_{art}", False)
+
+    with messung.stufe(f"bau_diagramm_{art}"):
+        diagramm = bauen(daten(layer_names))
+    with _lock:
+        _cache[art] = (version, diagramm)
+    return diagramm
+
+
+def _zeichne_png(df):
+    # Figure statt pyplot: kein globaler Zustand, nichts muss geschlossen werden
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    df.plot(ax=ax, marker="o")
+    ax.set_ylim(*Y_BEREICH)
+
+    for col, line in zip(df.columns, ax.get_lines()):
+        color = line.get_color()  # gleiche Farbe wie die Linie
+        unten = col == BESCHRIFTUNG_UNTEN
+        for x, y in zip(df.index, df[col]):
+            if math.isnan(y):
+                continue
+            ax.text(
+                x, y - 0.5 if unten else y + 0.5, f"{y:.2f}",
+                ha="center", va="top" if unten else "bottom", fontsize=8, color=color
+            )
+    ax.set_ylabel("Belastung (µg/m³)")
+    ax.set_xlabel("Jahr")
+    ax.set_title(TITEL)
+    ax.grid(True)
+    ax.legend(title="Kategorie")
+
+    puffer = io.BytesIO()
+    # Wie st.pyplot: PNG mit 200 dpi, Ränder beschnitten
+    fig.savefig(puffer, format="png", dpi=200, bbox_inches="tight")
+    return puffer.getvalue()
+
+
+def _vega_spec(df):
+    werte = [
+        {"Jahr": int(jahr), "Kategorie": kategorie, "Wert": float(wert)}
+        for kategorie in df.columns
+        for jahr, wert in df[kategorie].items()
+        if not math.isnan(wert)
+    ]
+    x = {"field": "Jahr", "type": "quantitative", "axis": {"format": "d", "tickMinStep": 1}}
+    y = {"field": "Wert", "type": "quantitative", "title": "Belastung (µg/m³)",
+         "scale": {"domain": list(Y_BEREICH)}}
+    farbe = {"field": "Kategorie", "type": "nominal",
+             "scale": {"domain": KATEGORIEN, "range": KATEGORIE_FARBEN},
+             "legend": {"orient": "top-right", "title": "Kategorie"}}
+    tooltip = [{"field": "Jahr", "type": "ordinal"}, {"field": "Kategorie"},
+               {"field": "Wert", "format": ".2f", "title": "µg/m³"}]
+    beschriftung = {"x": x, "y": y, "text": {"field": "Wert", "format": ".2f"}, "color": farbe}
+    return {
+        "title": TITEL,
+        "height": 400,
+        "data": {"values": werte},
+        "layer": [
+            {"mark": {"type": "line", "point": True, "clip": True},
+             "encoding": {"x": x, "y": y, "color": farbe, "tooltip": tooltip}},
+            {"transform": [{"filter": {"field": "Kategorie", "equal": BESCHRIFTUNG_UNTEN}}],
+             "mark": {"type": "text", "dy": 10, "fontSize": 8, "clip": True},
+             "encoding": beschriftung},
+            {"transform": [{"filter": {"not": {"field": "Kategorie", "equal": BESCHRIFTUNG_UNTEN}}}],
+             "mark": {"type": "text", "dy": -10, "fontSize": 8, "clip": True},
+             "encoding": beschriftung},
+        ],
+    }
+
+
+def _verteilung_werte(df):
+    return [
+        {k: (v if isinstance(v, str) else int(v) if k in ("Jahr", "Anzahl") else float(v)) for k, v in zeile.items()}
+        for zeile in df.to_dict("records")
+    ]
+
+
+def _verteilung_tooltip():
+    return [{"field": "Jahr", "type": "ordinal"}, {"field": "Kategorie"}, {"field": "Anzahl"}] + [
+        {"field": feld, "format": ".1f", "title": f"{feld} (µg/m³)"}
+        for feld in ("Mittel", "P2", "P10", "P25", "P50", "P75", "P90", "P98")
+    ] + [{"field": f"> {g}", "format": ".1f", "title": f"Anteil > {g} µg/m³ (%)"} for g in ANTEIL_GRENZEN]
+
+
+def _farbe():
+    return {"field": "Kategorie", "type": "nominal",
+            "scale": {"domain": KATEGORIEN, "range": KATEGORIE_FARBEN},
+            "legend": {"orient": "top", "title": None}}
+
+
+def _grenzwert_layer():
+    return {"data": {"values": [{"Grenzwert": GRENZWERT}]},
+            "mark": {"type": "rule", "strokeDash": [2, 2], "color": "gray"},
+            "encoding": {"y": {"field": "Grenzwert", "type": "quantitative"}}}
+
+
+def _perzentil_spec(df):
+    x = {"field": "Jahr", "type": "quantitative", "axis": {"format": "d", "tickMinStep": 1}}
+    y_titel = "Belastung (µg/m³)"
+    farbe = _farbe()
+
+    def band(unten, oben, deckkraft):
+        return {"mark": {"type": "area", "opacity": deckkraft},
+                "encoding": {"x": x, "y": {"field": unten, "type": "quantitative", "title": y_titel},
+                             "y2": {"field": oben}, "color": farbe}}
+
+    return {
+        "title": TITEL_VERTEILUNG,
+        "height": 400,
+        "data": {"values": _verteilung_werte(df)},
+        "layer": [
+            band("P10", "P90", 0.15),
+            band("P25", "P75", 0.3),
+            {"mark": {"type": "line", "strokeDash": [4, 3], "strokeWidth": 1},
+             "encoding": {"x": x, "y": {"field": "P98", "type": "quantitative"}, "color": farbe}},
+            {"mark": {"type": "line", "point": True},
+             "encoding": {"x": x, "y": {"field": "P50", "type": "quantitative"}, "color": farbe,
+                          "tooltip": _verteilung_tooltip()}},
+            _grenzwert_layer(),
+        ],
+    }
+
+
+def _boxplot_spec(df):
+    x = {"field": "Jahr", "type": "ordinal"}
+    versatz = {"field": "Kategorie", "sort": KATEGORIEN}
+    farbe = _farbe()
+    tooltip = _verteilung_tooltip()
+
+    def box(mark, y, y2=None):
+        encoding = {"x": x, "xOffset": versatz, "y": {"field": y, "type": "quantitative"},
+                    "color": farbe, "tooltip": tooltip}
+        if y2:
+            encoding["y2"] = {"field": y2}
+        return {"mark": mark, "encoding": encoding}
+
+    return {
+        "title": TITEL_VERTEILUNG,
+        "height": 400,
+        "data": {"values": _verteilung_werte(df)},
+        "encoding": {"y": {"type": "quantitative", "title": "Belastung (µg/m³)"}},
+        "layer": [
+            box({"type": "rule"}, "P2", "P98"),
+            box({"type": "bar", "width": {"band": 0.8}}, "P25", "P75"),
+            box({"type": "tick", "color": "white", "thickness": 2}, "P50"),
+            box({"type": "point", "filled": True, "color": "black", "size": 15}, "Mittel"),
+            _grenzwert_layer(),
+        ],
+    }
+
+
+def png_pfad(layer_names):
+    version = repr((DIAGRAMM_VERSION, trend_version(layer_names))).encode("utf-8")
+    return DIAGRAMM_DIR / f"trend_{hashlib.blake2b(version, digest_size=8).hexdigest()}.png"
+
+
+def trend_png(layer_names):
+    """Trenddiagramm als PNG-Bytes (für st.image); einmal je Datenversion gezeichnet."""
+    def bauen(df):
+        pfad = png_pfad(layer_names)
+        if pfad.exists():
+            return pfad.read_bytes()
+        png = _zeichne_png(df)
+        schreibe_bytes_atomar(pfad, png)
+        # Bilder älterer Datenversionen entfernen
+        for alt in DIAGRAMM_DIR.glob("trend_*.png"):
+            if alt != pfad:
+                alt.unlink(missing_ok=True)
+        return png
+
+    return _memo("png", layer_names, bauen)
+
+
+def trend_vega(layer_names):
+    """Trenddiagramm als Vega-Lite-Spezifikation (für st.vega_lite_chart)."""
+    return _memo("vega", layer_names, _vega_spec)
+
+
+def perzentil_vega(layer_names):
+    """Perzentilbänder je Kategorie als Vega-Lite-Spezifikation."""
+    return _memo("perzentile", layer_names, _perzentil_spec, verteilung_dataframe)
+
+
+def boxplot_vega(layer_names):
+    """Boxplots je Jahr und Kategorie als Vega-Lite-Spezifikation."""
+    return _memo("boxplot", layer_names, _boxplot_spec, verteilung_dataframe)
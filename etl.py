@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from daten import DATEN_DIR, WERT_FELDER, layer_slug, schreibe_json_atomar
+from geojson_stream import GeoJSONWriter
+import messung
+from statistik import Sammler, sidecar, speichere_statistik
+from utils import linestrings_to_coordinates, safe_float_series, linien_features
+
+# Ersetzt NO2_Fläche.py, PM10_Fläche.py, No2_Straße.py und PM10_Straße.py:
+# Alle CSV-Dateien im Eingabeordner werden anhand ihres Namens erkannt
+# (Schadstoff × Layertyp × Jahr) und parallel in die GeoJSON-Layer für
+# Main.py umgewandelt. Unveränderte Eingaben werden übersprungen.
+#
+#   python etl.py --input-dir <Ordner mit CSVs> [--output-dir .] [--jobs 4] [--force]
+
+# Bei Änderungen an der Umwandlung hochzählen – erzwingt einen Neuaufbau aller Layer
+ETL_VERSION = 1
+MANIFEST = "etl_manifest.json"
+# CSV-Zeilen pro Block beim Einlesen
+BLOCK_ZEILEN = 50_000
+# Koordinatensystem der Flächenlayer, wie es GDAL bisher geschrieben hat
+CRS84 = {"type": "name", "properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}}
+
+_CSV_RE = re.compile(r"^(NO2|PM10) - (flächenhafte Belastung|Straßenrandbelastung) \((\d{4})\)\.csv$")
+_TYPEN = {"flächenhafte Belastung": "Flächenbelastung", "Straßenrandbelastung": "Straßenrandbelastung"}
+
+
+def finde_jobs(input_dir):
+    """Alle erkannten CSV-Dateien als Jobs, sortiert nach Layername."""
+    jobs = []
+    for pfad in Path(input_dir).glob("*.csv"):
+        match = _CSV_RE.match(pfad.name)
+        if not match:
+            continue
+        schadstoff, typ, jahr = match.groups()
+        typ = _TYPEN[typ]
+        jobs.append({
+            "layer": f"{schadstoff}-{typ}({jahr})",
+            "schadstoff": schadstoff,
+            "typ": typ,
+            "jahr": jahr,
+            "eingabe": str(pfad),
+        })
+    return sorted(jobs, key=lambda job: job["layer"])
+
+
+def eingabe_hash(job):
+    h = hashlib.sha256(f"{ETL_VERSION}:{job['layer']}:".encode())
+    with open(job["eingabe"], "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _quellspalte(feld, jahr):
+    # Ab 2019 liefert die Stadt den Messwert in der Spalte "deskn1"
+    return feld if int(jahr) < 2019 else "deskn1"
+
+
+def _wertspalte(df, job, spalte):
+    # Fehlt die Spalte, bricht der Job ab – sonst entstünde ein Layer nur aus Nullen
+    if spalte not in df:
+        raise ValueError(f"'{spalte}' fehlt in Datei {Path(job['eingabe']).name}")
+    return safe_float_series(df[spalte])
+
+
+def _flaeche(df, job, feld):
+    from shapely import wkt
+    from shapely.geometry import mapping
+
+    def clean_wkt(wkt_str):
+        return wkt_str.split(";", 1)[-1] if isinstance(wkt_str, str) and wkt_str.startswith("SRID=") else wkt_str
+
+    werte = _wertspalte(df, job, "deskn1")
+    for shape, wert in zip(df['shape'].tolist(), werte):
+        yield {
+            "type": "Feature",
+            "properties": {feld: wert, "Jahr": job["jahr"]},
+            "geometry": mapping(wkt.loads(clean_wkt(shape))),
+        }
+
+
+def _strasse(df, job, feld):
+    coords, offsets = linestrings_to_coordinates(df['shape'])
+    werte = _wertspalte(df, job, _quellspalte(feld, job["jahr"]))
+    # Leere Zellen liest pandas als NaN – im GeoJSON wird daraus ""
+    strnamen = df["strname"].fillna("").astype(str).str.strip().tolist() if "strname" in df else [""] * len(df)
+    properties = [
+        {"strname": name, feld: wert, "jahr": job["jahr"]}
+        for name, wert in zip(strnamen, werte)
+    ]
+    return linien_features(coords, offsets, properties)
+
+
+def konvertiere(job, output_dir):
+    """Wandelt eine CSV-Datei in einen Layer um und schreibt ihn atomar. Läuft im Worker-Prozess.
+
+    Die CSV wird blockweise gelesen und jedes Feature sofort geschrieben,
+    der Speicherbedarf hängt also nicht von der Dateigröße ab. Die Kennzahlen
+    für statistik.py (Summen, Histogramme, Digests je Jahr) entstehen im selben
+    Durchlauf; ihr Sidecar wird geschrieben, wenn der Layer in DATEN_DIR liegt.
+    """
+    feld = WERT_FELDER[(job["schadstoff"], job["typ"])]
+    ziel = Path(output_dir) / f"{job['layer']}.geojson"
+
+    if job["typ"] == "Flächenbelastung":
+        umwandeln = _flaeche
+        members = {"name": layer_slug(job["layer"]), "crs": CRS84}
+    else:
+        umwandeln = _strasse
+        members = {}
+
+    sammler = Sammler(feld)
+    with GeoJSONWriter(ziel, **members) as writer:
+        for df in pd.read_csv(job["eingabe"], sep=';', encoding='utf-8', chunksize=BLOCK_ZEILEN):
+            writer.schreibe_alle(sammler.durchreichen(umwandeln(df, job, feld)))
+    if Path(output_dir).resolve() == DATEN_DIR.resolve():
+        speichere_statistik(job["layer"], sidecar(job["layer"], ziel, sammler.ergebnis()))
+    return writer.anzahl
+
+
+def _konvertiere_gemessen(job, output_dir):
+    # Dauer im Worker messen – im Hauptprozess überlappen sich die Jobs
+    start = time.perf_counter()
+    anzahl = konvertiere(job, output_dir)
+    return anzahl, time.perf_counter() - start
+
+
+def lade_manifest(output_dir):
+    try:
+        with open(Path(output_dir) / MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CSV-Daten der Stadt Dresden in GeoJSON-Layer umwandeln")
+    parser.add_argument("--input-dir", default=".", help="Ordner mit den CSV-Dateien")
+    parser.add_argument("--output-dir", default=str(DATEN_DIR), help="Zielordner der GeoJSON-Layer")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Anzahl paralleler Prozesse")
+    parser.add_argument("--force", action="store_true", help="auch unveränderte Eingaben neu umwandeln")
+    args = parser.parse_args(argv)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = lade_manifest(output_dir)
+
+    offen = []
+    for job in finde_jobs(args.input_dir):
+        with messung.stufe("etl_hash"):
+            job["hash"] = eingabe_hash(job)
+        aktuell = (
+            manifest.get(job["layer"], {}).get("hash") == job["hash"]
+            and (output_dir / f"{job['layer']}.geojson").exists()
+        )
+        if aktuell and not args.force:
+            print(f" Übersprungen (unverändert): {Path(job['eingabe']).name}")
+        else:
+            offen.append(job)
+
+    if not offen:
+        print(" Alle Layer sind aktuell.")
+        messung.exportiere("etl")
+        return 0
+
+    fehler = 0
+    with messung.stufe("etl_gesamt"), ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(_konvertiere_gemessen, job, output_dir): job for job in offen}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                anzahl, sekunden = future.result()
+            except Exception as e:
+                fehler += 1
+                print(f" Fehler bei {Path(job['eingabe']).name}: {e}")
+                continue
+            messung.erfasse("etl_konvertiere", sekunden)
+            messung.menge("etl_eingabe_bytes", os.path.getsize(job["eingabe"]))
+            messung.menge("etl_ausgabe_bytes", os.path.getsize(output_dir / f"{job['layer']}.geojson"))
+            messung.menge("etl_features", anzahl)
+            manifest[job["layer"]] = {"hash": job["hash"], "eingabe": Path(job["eingabe"]).name}
+            schreibe_json_atomar(output_dir / MANIFEST, manifest, indent=2)
+            print(f" Gespeichert: {job['layer']}.geojson ({anzahl} Features)")
+
+    messung.exportiere("etl")
+    return 1 if fehler else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
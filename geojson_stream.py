@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+# Streaming-Zugriff auf GeoJSON-FeatureCollections: Features werden einzeln
+# gelesen bzw. geschrieben, der Speicherbedarf hängt nicht von der Dateigröße ab.
+
+_decoder = json.JSONDecoder()
+_LEER = " \t\r\n"
+
+
+class GeoJSONWriter:
+    """Schreibt eine FeatureCollection Feature für Feature (kompakt, ein Feature pro Zeile).
+
+    Die Datei wird erst beim erfolgreichen Verlassen des with-Blocks an ihren
+    Platz verschoben; zusätzliche Top-Level-Einträge (z. B. name, crs) werden
+    als Schlüsselwortargumente übergeben.
+    """
+
+    def __init__(self, path, **members):
+        self.path = Path(path)
+        self.members = members
+        self.anzahl = 0
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".stream-", suffix=self.path.suffix)
+        self._f = os.fdopen(fd, "w", encoding="utf-8")
+        self._f.write('{"type":"FeatureCollection"')
+        for key, value in self.members.items():
+            self._f.write(f',{json.dumps(key)}:{_dumps(value)}')
+        self._f.write(',"features":[\n')
+        return self
+
+    def schreibe(self, feature):
+        if self.anzahl:
+            self._f.write(",\n")
+        self._f.write(_dumps(feature))
+        self.anzahl += 1
+
+    def schreibe_alle(self, features):
+        for feature in features:
+            self.schreibe(feature)
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._f.write("\n]}\n")
+            self._f.close()
+            if exc_type is None:
+                os.replace(self._tmp, self.path)
+        finally:
+            if os.path.exists(self._tmp):
+                os.unlink(self._tmp)
+        return False
+
+
+def _dumps(obj):
+    # allow_nan=False: NaN/Infinity sind kein JSON – lieber beim Schreiben scheitern
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+
+class _Puffer:
+    # Liest eine Textdatei blockweise und dekodiert einzelne JSON-Werte daraus
+
+    def __init__(self, f, blockgroesse):
+        self.f = f
+        self.blockgroesse = blockgroesse
+        self.text = ""
+        self.pos = 0
+        self.ende = False
+
+    def nachladen(self):
+        block = self.f.read(self.blockgroesse)
+        if not block:
+            self.ende = True
+            return False
+        self.text = self.text[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def zeichen(self):
+        """Nächstes Nicht-Leerzeichen (ohne es zu verbrauchen)."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _LEER:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.nachladen():
+                return ""
+
+    def erwarte(self, zeichen):
+        if self.zeichen() != zeichen:
+            raise ValueError(f"Ungültiges GeoJSON: '{zeichen}' erwartet")
+        self.pos += 1
+
+    def wert(self):
+        """Dekodiert den nächsten vollständigen JSON-Wert."""
+        self.zeichen()
+        while True:
+            try:
+                obj, ende = _decoder.raw_decode(self.text, self.pos)
+                # Zahlen am Pufferende könnten noch weitergehen
+                if ende < len(self.text) or self.ende:
+                    self.pos = ende
+                    return obj
+            except json.JSONDecodeError:
+                if self.ende:
+                    raise
+            self.nachladen()
+
+
+def lies_features(path, blockgroesse=1 << 16):
+    """Iteriert über die Features einer FeatureCollection, ohne die Datei ganz zu laden."""
+    with open(path, "r", encoding="utf-8") as f:
+        puffer = _Puffer(f, blockgroesse)
+        puffer.erwarte("{")
+        while puffer.zeichen() != "}":
+            key = puffer.wert()
+            puffer.erwarte(":")
+            if key != "features":
+                puffer.wert()
+            else:
+                puffer.erwarte("[")
+                while puffer.zeichen() != "]":
+                    yield puffer.wert()
+                    if puffer.zeichen() == ",":
+                        puffer.pos += 1
+                puffer.erwarte("]")
+            if puffer.zeichen() == ",":
+                puffer.pos += 1
+        puffer.erwarte("}")
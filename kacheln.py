@@ -0,0 +1,154 @@
+import json
+import math
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from daten import DATEN_DIR, bau_lock, lade_geojson, layer_dateien, layer_info, layer_slug, schreibe_json_atomar, signatur, wert_feld
+from klassen import farbklassen
+import messung
+from spalten import lade_strassen_layer
+from vereinfachung import LOD_STUFEN
+
+# GeoJSON-Kachelpyramide je Layer: static/kacheln/<slug>/<z>/<x>/<y>.json
+# Streamlit liefert den Ordner "static" aus (server.enableStaticServing), die
+# Karte holt sich damit nur die Kacheln des sichtbaren Ausschnitts.
+KACHEL_DIR = DATEN_DIR / "static" / "kacheln"
+# URL relativ zum iframe der Kartenkomponente (/component/<name>/index.html)
+KACHEL_URL = "../../app/static/kacheln"
+# Zoomstufen, für die Kacheln erzeugt werden; dazwischen wird die nächst
+# kleinere Stufe verwendet. Straßen-Kacheln enthalten die Geometrie der
+# gleichnamigen Detailstufe aus vereinfachung.py.
+ZOOMSTUFEN = LOD_STUFEN
+KACHEL_VERSION = 3
+
+
+def kachel_xy(lon, lat, z):
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    r = math.radians(lat)
+    y = int((1 - math.asinh(math.tan(r)) / math.pi) / 2 * n)
+    return x, y
+
+
+def _bbox(geometry):
+    xs, ys = [], []
+
+    def sammeln(coords):
+        if coords and isinstance(coords[0], (int, float)):
+            xs.append(coords[0])
+            ys.append(coords[1])
+        else:
+            for c in coords:
+                sammeln(c)
+
+    sammeln(geometry["coordinates"])
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def karten_features(filepath, zoom):
+    """Features eines Layers so, wie die Karte sie zeichnet (mit Farbklasse "klasse")."""
+    if layer_info(filepath.stem)[1] == "Straßenrandbelastung":
+        # wie im eingebetteten Modus: nur Abschnitte mit Messwert
+        strassen = lade_strassen_layer(filepath)
+        return strassen.feature_collection(strassen.gueltig(), zoom=zoom)["features"]
+    # Flächen: Farbklasse für alle Zellen auf einmal bestimmen (Cache-Daten nicht verändern)
+    features = lade_geojson(filepath)["features"]
+    feld = wert_feld(filepath.stem)
+    werte = [f["properties"].get(feld) for f in features]
+    klassen = farbklassen([w if isinstance(w, (int, float)) else np.nan for w in werte]).tolist()
+    return [
+        dict(f, properties=dict(f["properties"], klasse=k))
+        for f, k in zip(features, klassen)
+    ]
+
+
+def kachel_pfad(layer_name):
+    return KACHEL_DIR / layer_slug(layer_name)
+
+
+def kachel_url(layer_name):
+    return f"{KACHEL_URL}/{layer_slug(layer_name)}"
+
+
+def lade_index(layer_name):
+    try:
+        with open(kachel_pfad(layer_name) / "index.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _ist_aktuell(index, sig):
+    return bool(index) and index.get("version") == KACHEL_VERSION and index.get("signatur") == sig
+
+
+def _schreibe_kacheln(filepath, ziel, sig):
+    kacheln = {}
+    for z in ZOOMSTUFEN:
+        for feature in karten_features(filepath, z):
+            west, sued, ost, nord = _bbox(feature["geometry"])
+            x0, y0 = kachel_xy(west, nord, z)
+            x1, y1 = kachel_xy(ost, sued, z)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    kacheln.setdefault(f"{z}/{x}/{y}", []).append(feature)
+
+    # In einen Nachbarordner mit eigenem Namen schreiben und erst danach austauschen
+    ziel.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=ziel.parent, prefix=ziel.name, suffix=".tmp"))
+    index = {
+        "version": KACHEL_VERSION,
+        "signatur": sig,
+        "wert_feld": wert_feld(filepath.stem),
+        "zoomstufen": list(ZOOMSTUFEN),
+        "kacheln": sorted(kacheln),
+    }
+    try:
+        tmp.chmod(0o755)  # mkdtemp legt den Ordner nur für den Besitzer lesbar an
+        for key, features in kacheln.items():
+            pfad = tmp / f"{key}.json"
+            pfad.parent.mkdir(parents=True, exist_ok=True)
+            with open(pfad, "w", encoding="utf-8") as f:
+                json.dump({"type": "FeatureCollection", "features": features}, f,
+                          ensure_ascii=False, separators=(",", ":"))
+        schreibe_json_atomar(tmp / "index.json", index)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    shutil.rmtree(ziel, ignore_errors=True)
+    tmp.rename(ziel)
+    return index
+
+
+def baue_kacheln(filepath):
+    """Erzeugt die Kachelpyramide eines Layers, falls sie fehlt oder veraltet ist, und gibt den Index zurück."""
+    filepath = Path(filepath)
+    layer_name = filepath.stem
+    sig = list(signatur(filepath))
+    index = lade_index(layer_name)
+    if _ist_aktuell(index, sig):
+        messung.cache("kachelindex", True)
+        return index
+    messung.cache("kachelindex", False)
+
+    ziel = kachel_pfad(layer_name)
+    with bau_lock(ziel):
+        # Inzwischen von einem anderen Thread gebaut?
+        index = lade_index(layer_name)
+        if not _ist_aktuell(index, sig):
+            index = _schreibe_kacheln(filepath, ziel, sig)
+    return index
+
+
+def baue_alle():
+    for f in layer_dateien():
+        if layer_info(f.stem):
+            index = baue_kacheln(f)
+            print(f" Kacheln aktuell: {f.stem} ({len(index['kacheln'])} Kacheln)")
+
+
+if __name__ == "__main__":
+    baue_alle()
@@ -0,0 +1,251 @@
+import json
+
+from branca.element import MacroElement
+from folium import Map
+from folium.map import Layer
+from folium.utilities import JsCode
+from jinja2 import Template
+
+from daten import layer_info
+from klassen import AENDERUNG_FARBEN, FARBEN
+
+SCHADSTOFF_LABEL = {"NO2": "NO₂", "PM10": "PM10"}
+
+
+def tooltip_alias(layer_name):
+    schadstoff, typ, _ = layer_info(layer_name)
+    return f"{SCHADSTOFF_LABEL[schadstoff]}-{typ} (µg/m³):"
+
+
+def layer_stil(layer_name):
+    """Leaflet-Stil ohne Farbe – die Farbe wird pro Feature aus dem Wert bestimmt."""
+    _, typ, _ = layer_info(layer_name)
+    if typ == "Flächenbelastung":
+        return {"color": "black", "weight": 0.5, "fillOpacity": 0.6}
+    return {"weight": 3}
+
+
+def _klassen_js(stil, farbe, farben):
+    return JsCode(
+        "function(feature) {"
+        f" var stil = Object.assign({{}}, {json.dumps(stil)});"
+        " var k = feature.properties.klasse;"
+        f" if (k >= 0) {{ stil.{farbe} = {json.dumps(farben)}[k]; }}"
+        " else { stil.opacity = 0; stil.fillOpacity = 0; }"
+        " return stil; }"
+    )
+
+
+def klassen_stil(layer_name):
+    """Leaflet-Stilfunktion, die im Browser nach der vorberechneten Farbklasse einfärbt.
+
+    Ersetzt die style_function von folium, die für jedes Feature in Python
+    die Colormap aufruft: folium.GeoJson(..., style=klassen_stil(name)).
+    Features ohne Wert (klasse -1) werden nicht gezeichnet.
+    """
+    _, typ, _ = layer_info(layer_name)
+    farbe = "fillColor" if typ == "Flächenbelastung" else "color"
+    return _klassen_js(layer_stil(layer_name), farbe, FARBEN)
+
+
+def zellen_stil():
+    """Wie klassen_stil, für Straßen-Kennzahlen je Fläche (Rasterzellen aus zonen.py, Waben aus waben.py)."""
+    return _klassen_js({"color": "black", "weight": 0.5, "fillOpacity": 0.6}, "fillColor", FARBEN)
+
+
+def aenderung_stil():
+    """Wie klassen_stil, für die Veränderungs-Layer (Klassen nach aenderungsklassen)."""
+    return _klassen_js({"weight": 3}, "color", AENDERUNG_FARBEN)
+
+
+class KachelLayer(Layer):
+    """Lädt einen Layer kachelweise (GeoJSON-Kacheln aus kacheln.py) nur für den sichtbaren Ausschnitt.
+
+    Die Kacheln liegen im static-Ordner der App und werden vom Browser direkt
+    von Streamlit geholt, statt als Ganzes in die Seite eingebettet zu werden.
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var map = {{ this.karte().get_name() }};
+            var cfg = {{ this.config|tojson }};
+            var basis = new URL(cfg.url + "/", document.baseURI).href;
+            var vorhanden = {};
+            cfg.kacheln.forEach(function(k) { vorhanden[k] = true; });
+            var geladen = {}, angezeigt = {}, aktuelleStufe = null;
+
+            var layer = L.geoJson(null, {
+                style: {{ this.stil.js_code }},
+                filter: function(feature) {
+                    return cfg.grenze === null || feature.properties[cfg.feld] > cfg.grenze;
+                },
+                onEachFeature: function(feature, l) {
+                    var p = feature.properties;
+                    l.bindTooltip(cfg.alias + " " + p[cfg.feld] + "<br>Jahr: " + (p.Jahr || p.jahr));
+                }
+            });
+
+            function stufeFuer(zoom) {
+                var stufe = cfg.zoomstufen[0];
+                cfg.zoomstufen.forEach(function(z) { if (z <= zoom) stufe = z; });
+                return stufe;
+            }
+
+            function laden() {
+                if (!map.hasLayer(layer)) return;
+                var z = stufeFuer(map.getZoom());
+                if (z !== aktuelleStufe) {
+                    layer.clearLayers();
+                    geladen = {}; angezeigt = {};
+                    aktuelleStufe = z;
+                }
+                var b = map.getBounds(), n = Math.pow(2, z);
+                function kx(lon) { return Math.floor((lon + 180) / 360 * n); }
+                function ky(lat) {
+                    var r = lat * Math.PI / 180;
+                    return Math.floor((1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * n);
+                }
+                for (var x = kx(b.getWest()); x <= kx(b.getEast()); x++) {
+                    for (var y = ky(b.getNorth()); y <= ky(b.getSouth()); y++) {
+                        var key = z + "/" + x + "/" + y;
+                        if (!vorhanden[key] || geladen[key]) continue;
+                        geladen[key] = true;
+                        fetch(basis + key + ".json")
+                            .then(function(r) { return r.json(); })
+                            .then((function(stufe) { return function(fc) {
+                                if (stufe !== aktuelleStufe) return;
+                                // Features, die mehrere Kacheln schneiden, nur einmal zeichnen
+                                fc.features = fc.features.filter(function(f) {
+                                    if (angezeigt[f.id]) return false;
+                                    angezeigt[f.id] = true;
+                                    return true;
+                                });
+                                layer.addData(fc);
+                            }; })(z));
+                    }
+                }
+            }
+
+            map.on("moveend", laden);
+            map.on("overlayadd", function(e) { if (e.layer === layer) laden(); });
+            layer.on("add", function() { setTimeout(laden, 0); });
+            return layer;
+        })();
+        {% if this.show %}
+        {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endif %}
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer_name, url, index, name=None, show=True, grenze=None):
+        super().__init__(name=name or layer_name, overlay=True, control=True, show=show)
+        self._name = "KachelLayer"
+        self.stil = klassen_stil(layer_name)
+        self.config = {
+            "url": url,
+            "kacheln": index["kacheln"],
+            "zoomstufen": index["zoomstufen"],
+            "feld": index["wert_feld"],
+            "alias": tooltip_alias(layer_name),
+            # Nur Features mit Wert über grenze zeichnen (None = alle)
+            "grenze": grenze,
+        }
+
+    def karte(self):
+        # Die Leaflet-Karte – der Layer kann auch in einer FeatureGroup stecken
+        element = self._parent
+        while not isinstance(element, Map):
+            element = element._parent
+        return element
+
+
+class DateiLayer(Layer):
+    """Lädt einen ganzen Layer als statische Datei (layerdateien.py) per URL, statt ihn einzubetten.
+
+    Die Datei wird erst geholt, wenn der Layer sichtbar wird. Ihr Name enthält
+    einen Hash des Inhalts, daher darf der Browser sie ohne Nachfrage aus seinem
+    Cache nehmen (cache: "force-cache"). Mit DecompressionStream wird die
+    gzip-Fassung geladen und im Browser entpackt, sonst (oder wenn das
+    fehlschlägt) die unkomprimierte Datei.
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var cfg = {{ this.config|tojson }};
+            var url = new URL(cfg.url, document.baseURI).href;
+            var geladen = false;
+
+            var layer = L.geoJson(null, {
+                style: {{ this.stil.js_code }},
+                filter: function(feature) {
+                    return cfg.grenze === null || feature.properties[cfg.feld] > cfg.grenze;
+                },
+                onEachFeature: function(feature, l) {
+                    var p = feature.properties;
+                    l.bindTooltip(cfg.alias + " " + p[cfg.feld] + "<br>Jahr: " + (p.Jahr || p.jahr));
+                }
+            });
+
+            function holen(pfad) {
+                return fetch(pfad, {cache: "force-cache"}).then(function(r) {
+                    if (!r.ok) throw new Error(r.status);
+                    return r;
+                });
+            }
+
+            function laden() {
+                if (geladen) return;
+                geladen = true;
+                var daten;
+                if (cfg.gzip && typeof DecompressionStream !== "undefined") {
+                    daten = holen(url + ".gz").then(function(r) {
+                        return new Response(r.body.pipeThrough(new DecompressionStream("gzip"))).json();
+                    }).catch(function() {
+                        return holen(url).then(function(r) { return r.json(); });
+                    });
+                } else {
+                    daten = holen(url).then(function(r) { return r.json(); });
+                }
+                daten.then(function(fc) { layer.addData(fc); });
+            }
+
+            layer.on("add", laden);
+            return layer;
+        })();
+        {% if this.show %}
+        {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endif %}
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer_name, url, index, name=None, show=True, grenze=None):
+        super().__init__(name=name or layer_name, overlay=True, control=True, show=show)
+        self._name = "DateiLayer"
+        self.stil = klassen_stil(layer_name)
+        self.config = {
+            "url": url,
+            "gzip": "gz" in index["bytes"],
+            "feld": index["wert_feld"],
+            "alias": tooltip_alias(layer_name),
+            # Nur Features mit Wert über grenze zeichnen (None = alle)
+            "grenze": grenze,
+        }
+
+
+class MetricScaleControl(MacroElement):
+    """Nur metrischer Maßstab (statt des eingebauten Maßstabs von folium)."""
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+        var mapObj = {{this._parent.get_name()}};
+        mapObj.whenReady(function() {
+            L.control.scale({
+                metric: true,
+                imperial: false,
+                position: 'bottomleft'
+            }).addTo(mapObj);
+        });
+        {% endmacro %}
+    """)
@@ -0,0 +1,297 @@
+import json
+import math
+
+import folium
+import numpy as np
+
+from daten import DATEN_DIR, GRENZWERT, aenderung_info, layer_info, quell_dateien, signatur, wert_feld, zonen_info
+from kacheln import baue_kacheln, kachel_url, kachel_xy
+from layerdateien import baue_layerdatei, layer_url
+from karte import DateiLayer, KachelLayer, aenderung_stil, klassen_stil, tooltip_alias, zellen_stil
+import messung
+from raster import lade_raster
+from segmente import lade_segmente
+from spalten import lade_strassen_layer
+from strassennamen import lade_katalog
+from vereinfachung import lade_grenze
+from waben import WABEN_STUFEN, lade_waben
+from zonen import lade_zonen
+import zwischenspeicher
+
+# Daten der Kartenlayer je Layerauswahl, Modus und Detailstufe, im gemeinsamen
+# Zwischenspeicher aller Sessions (zwischenspeicher.py, Bereich "kartendaten",
+# LRU nach Größe). Zwischengespeichert werden nur die fertigen Eingaben
+# (FeatureCollections, Rasterbilder, Kachelindex). Die folium-Objekte werden bei
+# jedem Lauf neu erzeugt: st_folium benennt sie beim Rendern um und hängt sie an
+# die jeweilige Karte, ein zweites Rendern desselben Objekts erzeugt ungültiges JavaScript.
+
+# Straßen-Layer werden nur für den sichtbaren Ausschnitt geladen. Der Ausschnitt
+# wird auf Kacheln eine Zoomstufe unter der Karte gerundet und um RAND_KACHELN
+# erweitert – kleine Verschiebungen ändern ihn (und damit die Karte) nicht.
+RAND_KACHELN = 1
+
+def sichtbarer_ausschnitt(bounds, zoom):
+    """Kachelbereich (z, x0, y0, x1, y1) für die von st_folium gemeldeten bounds; None = alles."""
+    if not bounds or zoom is None:
+        return None
+    sw, no = bounds.get("_southWest") or {}, bounds.get("_northEast") or {}
+    if None in (sw.get("lat"), sw.get("lng"), no.get("lat"), no.get("lng")):
+        return None
+    z = max(int(zoom) - 1, 0)
+    n = 2 ** z
+    x0, y0 = kachel_xy(max(sw["lng"], -180), min(no["lat"], 85), z)
+    x1, y1 = kachel_xy(min(no["lng"], 180), max(sw["lat"], -85), z)
+    return (
+        z,
+        max(x0 - RAND_KACHELN, 0), max(y0 - RAND_KACHELN, 0),
+        min(x1 + RAND_KACHELN, n - 1), min(y1 + RAND_KACHELN, n - 1),
+    )
+
+
+def _kachel_ecke(x, y, z):
+    n = 2 ** z
+    return x / n * 360 - 180, math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+
+def ausschnitt_grenzen(ausschnitt):
+    """(west, süd, ost, nord) eines Kachelbereichs."""
+    z, x0, y0, x1, y1 = ausschnitt
+    west, nord = _kachel_ecke(x0, y0, z)
+    ost, sued = _kachel_ecke(x1 + 1, y1 + 1, z)
+    return west, sued, ost, nord
+
+
+def _layer_daten(layer_name, modus, stufe, ausschnitt, grenze):
+    # Veränderungs-Layer aus dem Segmentindex (segmente.py), auch im Kachelmodus eingebettet;
+    # die Grenze gilt für absolute Werte und wird hier nicht angewendet
+    aenderung = aenderung_info(layer_name)
+    if aenderung:
+        schadstoff, von, bis = aenderung
+        grenzen = ausschnitt_grenzen(ausschnitt) if ausschnitt is not None else None
+        fc = lade_segmente(schadstoff).feature_collection(von, bis, zoom=stufe, ausschnitt=grenzen)
+        return ("aenderung", (fc,)) if fc["features"] else None
+
+    # Straßen-Kennzahlen je Rasterzelle (zonen.py), vorberechnet
+    if zonen_info(layer_name):
+        schadstoff, jahr = zonen_info(layer_name)
+        fc = lade_zonen().feature_collection(jahr, schadstoff, grenze)
+        return ("zonen", (fc,)) if fc["features"] else None
+
+    filepath = DATEN_DIR / f"{layer_name}.geojson"
+    schadstoff, typ, jahr = layer_info(layer_name)
+    if modus == "Vektorkacheln":
+        return "kacheln", (kachel_url(layer_name), baue_kacheln(filepath))
+    if modus == "Dateien":
+        index = baue_layerdatei(filepath)
+        return "datei", (layer_url(layer_name, index), index)
+    if typ == "Flächenbelastung":
+        return "bild", lade_raster().bild(jahr, schadstoff, grenze)
+    # Bei kleinen Zoomstufen Waben mit Mittel und Maximum statt der einzelnen Abschnitte
+    if stufe in WABEN_STUFEN:
+        grenzen = ausschnitt_grenzen(ausschnitt) if ausschnitt is not None else None
+        fc = lade_waben().feature_collection(layer_name, stufe, grenzen, grenze)
+        return ("waben", (fc,)) if fc["features"] else None
+    # Nur Abschnitte mit gültigem Wert (und über der Grenze) anzeigen
+    strassen = lade_strassen_layer(filepath)
+    gueltig = strassen.gueltig() if grenze is None else np.sort(strassen.ueber(grenze))
+    if ausschnitt is not None:
+        gueltig = np.intersect1d(gueltig, strassen.im_ausschnitt(*ausschnitt_grenzen(ausschnitt)))
+    if not len(gueltig):
+        return None
+    return "geojson", (strassen.feature_collection(gueltig, zoom=stufe),)
+
+
+def kartendaten(auswahl, modus, stufe, ausschnitt=None, grenze=None, nutzlast_messen=False):
+    """Daten aller gewählten Layer: {layer_name: (art, daten)}, sortiert nach Name.
+
+    Schlüssel ist die Auswahl als frozenset zusammen mit Detailstufe, Ausschnitt
+    (siehe sichtbarer_ausschnitt), Grenze (nur Werte darüber, None = alle) und
+    den Signaturen der Dateien; geänderte Quellen ergeben damit automatisch
+    einen neuen Eintrag. nutzlast_messen misst die Größe des eingebetteten JSON
+    auch ohne LUFTDATEN_MESSUNG=ausfuehrlich (z. B. für das Performance-Panel).
+    """
+    auswahl = frozenset(auswahl)
+    if modus in ("Vektorkacheln", "Dateien"):
+        # Kacheln und Layerdateien filtern im Browser nach der Grenze (KachelLayer,
+        # DateiLayer); Detailstufe und Ausschnitt wählen Kacheln selbst, Dateien
+        # enthalten den ganzen Layer
+        stufe = ausschnitt = None
+    key = (
+        auswahl,
+        modus,
+        stufe,
+        ausschnitt,
+        grenze,
+        tuple(sorted((name, tuple(signatur(f) for f in quell_dateien(name))) for name in auswahl)),
+    )
+    # Die Größe des eingebetteten JSON nur bei ausführlicher Messung oder auf
+    # Wunsch des Aufrufers – das Serialisieren dauert länger als das
+    # Zusammenstellen der Daten. Sie wird einmal je Eintrag beim Bauen bestimmt.
+    messen = nutzlast_messen or messung.ausfuehrlich()
+    def bauen():
+        daten = {}
+        with messung.stufe("kartendaten"):
+            for name in sorted(auswahl):
+                layer = _layer_daten(name, modus, stufe, ausschnitt, grenze)
+                if layer is not None:
+                    daten[name] = layer
+        return {"daten": daten, "bytes": _nutzlast_bytes(daten) if messen else None}
+
+    eintrag = zwischenspeicher.hole_oder_baue("kartendaten", key, bauen)
+    if messen and eintrag["bytes"] is None:
+        # Ohne Messung gebaut: geteilte Einträge nicht verändern, sondern ersetzen
+        eintrag = zwischenspeicher.lege_ab(
+            "kartendaten", key, {"daten": eintrag["daten"], "bytes": _nutzlast_bytes(eintrag["daten"])}
+        )
+    _zaehle_nutzlast(eintrag, messen)
+    return eintrag["daten"]
+
+
+def _nutzlast_bytes(daten):
+    return sum(_nutzlast(art, werte) for art, werte in daten.values())
+
+
+def _zaehle_nutzlast(eintrag, messen):
+    # Features immer zählen, die Nutzlast nur, wenn sie gemessen wird
+    messung.menge("karte_features", sum(
+        len(werte[0]["features"]) for art, werte in eintrag["daten"].values()
+        if art in ("geojson", "zonen", "aenderung", "waben")
+    ))
+    if messen:
+        messung.menge("karte_nutzlast_bytes", eintrag["bytes"])
+
+
+def _nutzlast(art, werte):
+    # Größe, mit der ein Layer in die Seite eingebettet wird (Bytes)
+    if art == "bild":
+        return len(werte[0])
+    if art == "kacheln":
+        return len(json.dumps(werte[1]["kacheln"]))
+    if art == "datei":
+        # Nur die URL; die Daten holt der Browser selbst (und aus seinem Cache)
+        return len(werte[0])
+    return len(json.dumps(werte[0], ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def grenze_gruppe(stufe):
+    gruppe = folium.FeatureGroup(name="Stadtgrenze Dresden", control=False)
+    folium.GeoJson(
+        lade_grenze(stufe),
+        style_function=lambda feature: {
+            "color": "black",
+            "weight": 2,
+            "fillOpacity": 0,
+        },
+    ).add_to(gruppe)
+    return gruppe
+
+
+def strassen_gruppe(name, auswahl):
+    """Hebt die Abschnitte eines Straßennamens (Index im Katalog, strassennamen.py) hervor.
+
+    Geometrie aus dem neuesten gewählten Straßen-Layer mit diesem Namen, sonst
+    aus dem neuesten Straßen-Layer überhaupt; None, wenn der Name in keinem vorkommt.
+    """
+    katalog = lade_katalog()
+    vorhanden = katalog.layer_mit(name)
+    if not vorhanden:
+        return None
+    layer_name = max([l for l in vorhanden if l in auswahl] or vorhanden, key=lambda l: layer_info(l)[2])
+    gruppe = folium.FeatureGroup(name=f"Suche: {katalog.namen[name]}")
+    folium.GeoJson(
+        katalog.feature_collection(name, layer_name),
+        style_function=lambda feature: {"color": "#00BFFF", "weight": 10, "opacity": 0.6},
+        tooltip=folium.GeoJsonTooltip(fields=["strname", "jahr"], aliases=["Straße:", "Jahr:"]),
+    ).add_to(gruppe)
+    return gruppe
+
+
+def layer_gruppen(auswahl, modus, stufe, ausschnitt=None, grenze=None, nutzlast_messen=False):
+    """Eine FeatureGroup je gewähltem Layer, für st_folium(feature_group_to_add=...)."""
+    gruppen = []
+    for name, (art, daten) in kartendaten(auswahl, modus, stufe, ausschnitt, grenze, nutzlast_messen).items():
+        gruppe = folium.FeatureGroup(name=name)
+        if art == "kacheln":
+            url, index = daten
+            KachelLayer(name, url, index, grenze=grenze).add_to(gruppe)
+        elif art == "datei":
+            url, index = daten
+            DateiLayer(name, url, index, grenze=grenze).add_to(gruppe)
+        elif art == "bild":
+            # Flächen-Layer: das 1-km-Raster als ein eingefärbtes Bild (build/raster)
+            bild, grenzen = daten
+            folium.raster_layers.ImageOverlay(bild, bounds=grenzen, opacity=0.6).add_to(gruppe)
+        elif art == "zonen":
+            folium.GeoJson(
+                daten[0],
+                tooltip=folium.GeoJsonTooltip(
+                    fields=["mittel", "max", "ueberschreitung_m", "laenge_m"],
+                    aliases=["Straßenrand-Mittel (µg/m³):", "Straßenrand-Maximum (µg/m³):",
+                             f"Länge über {GRENZWERT} µg/m³ (m):", "Straßenlänge (m):"]
+                ),
+                style=zellen_stil()
+            ).add_to(gruppe)
+        elif art == "waben":
+            folium.GeoJson(
+                daten[0],
+                tooltip=folium.GeoJsonTooltip(
+                    fields=["mittel", "max", "laenge_m", "jahr"],
+                    aliases=["Straßenrand-Mittel (µg/m³):", "Straßenrand-Maximum (µg/m³):",
+                             "Straßenlänge (m):", "Jahr:"]
+                ),
+                style=zellen_stil()
+            ).add_to(gruppe)
+        elif art == "aenderung":
+            _, von, bis = aenderung_info(name)
+            folium.GeoJson(
+                daten[0],
+                tooltip=folium.GeoJsonTooltip(
+                    fields=["strname", "von", "bis", "aenderung", "trend"],
+                    aliases=["Straße:", f"{von} (µg/m³):", f"{bis} (µg/m³):",
+                             "Veränderung (µg/m³):", "Trend (µg/m³ pro Jahr):"]
+                ),
+                style=aenderung_stil()
+            ).add_to(gruppe)
+        else:
+            # Straßenrand-Layer: eingefärbt wird im Browser nach properties.klasse
+            folium.GeoJson(
+                daten[0],
+                tooltip=folium.GeoJsonTooltip(
+                    fields=[wert_feld(name), "jahr"],
+                    aliases=[tooltip_alias(name), "Jahr:"]
+                ),
+                style=klassen_stil(name)
+            ).add_to(gruppe)
+        gruppen.append(gruppe)
+    return gruppen
+
+
+def ueber_grenze(auswahl, grenze):
+    """Umfang der Werte über grenze je Layer: {layer_name: (menge, gesamt, einheit)}.
+
+    Straßen-Layer in km (StrassenLayer.laenge_ueber), Flächen-Layer und
+    Straßen je Zelle in km² (eine Zelle = 1 km²); Veränderungs-Layer fehlen.
+    Alle Abfragen sind binäre Suchen in vorsortierten Werten.
+    """
+    ergebnis = {}
+    for name in sorted(auswahl):
+        if aenderung_info(name):
+            continue
+        if zonen_info(name):
+            schadstoff, jahr = zonen_info(name)
+            ergebnis[name] = (*lade_zonen().zellen_ueber(jahr, schadstoff, grenze), "km²")
+            continue
+        filepath = DATEN_DIR / f"{name}.geojson"
+        if not filepath.exists():
+            continue
+        schadstoff, typ, jahr = layer_info(name)
+        if typ == "Flächenbelastung":
+            ergebnis[name] = (*lade_raster().zellen_ueber(jahr, schadstoff, grenze), "km²")
+        else:
+            strassen = lade_strassen_layer(filepath)
+            ergebnis[name] = (
+                strassen.laenge_ueber(grenze) / 1000,
+                strassen.laenge_ueber(-np.inf) / 1000,
+                "km",
+            )
+    return ergebnis
@@ -0,0 +1,29 @@
+import numpy as np
+
+# Farbstufen der Karte (entspricht der Legende neben der Karte). Ohne folium,
+# damit ETL, Abfrage und Vorwärmen die Klassen berechnen können, ohne die Karte zu laden.
+FARBEN = ["#008000", "#ADFF2F", "#FFFF00", "#FFA500", "#FF0000"]
+SCHWELLEN = [0, 15, 20, 27, 40, 41]
+
+# Farbstufen der Veränderungs-Layer (µg/m³): deutliche Abnahme … deutliche Zunahme
+AENDERUNG_FARBEN = ["#1A9641", "#A6D96A", "#D9D9D9", "#FDAE61", "#D7191C"]
+AENDERUNG_SCHWELLEN = [-5, -1, 1, 5]
+
+
+def farbklassen(werte):
+    """Index in FARBEN je Wert – dieselbe Einteilung wie StepColormap(FARBEN, SCHWELLEN).
+
+    Werte ≤ SCHWELLEN[0] bekommen die erste, Werte ≥ SCHWELLEN[-1] die letzte Farbe;
+    NaN ergibt -1.
+    """
+    werte = np.asarray(werte, dtype=np.float64)
+    klassen = np.searchsorted(SCHWELLEN, werte, side="right") - 1
+    klassen = np.clip(klassen, 0, len(FARBEN) - 1)
+    return np.where(np.isnan(werte), -1, klassen)
+
+
+def aenderungsklassen(aenderungen):
+    """Index in AENDERUNG_FARBEN je Veränderung; Grenzwerte zählen zur höheren Stufe, NaN ergibt -1."""
+    aenderungen = np.asarray(aenderungen, dtype=np.float64)
+    klassen = np.searchsorted(AENDERUNG_SCHWELLEN, aenderungen, side="right")
+    return np.where(np.isnan(aenderungen), -1, klassen)
@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import json
+import math
+from pathlib import Path
+
+from daten import DATEN_DIR, bau_lock, layer_dateien, layer_info, layer_slug, schreibe_bytes_atomar, schreibe_json_atomar, signatur, wert_feld
+from kacheln import karten_features
+import messung
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Ganze Layer als statische Dateien für den Kartenmodus "Dateien":
+#   static/layer/<slug>/<hash>.json      – kompaktes GeoJSON (ohne Leerzeichen,
+#                                          Koordinaten auf NACHKOMMA Stellen, nur
+#                                          die Eigenschaften für Karte und Tooltip)
+#   static/layer/<slug>/<hash>.json.gz   – gzip (Stufe 9)
+#   static/layer/<slug>/<hash>.json.br   – brotli, falls das Paket installiert ist
+#   static/layer/<slug>/index.json       – Datei, Signatur der Quelle, Größen
+# Der Name enthält einen Hash des Inhalts; die Karte (karte.DateiLayer) lädt
+# die Datei mit cache: "force-cache" und entpackt .gz im Browser
+# (DecompressionStream) – ein erneut gewählter Layer kommt so ohne Anfrage aus
+# dem Browser-Cache, auch in einer neuen Session. Streamlit selbst liefert die
+# Dateien unverändert aus; .gz und .br neben der .json kann ein vorgeschalteter
+# Webserver direkt ausliefern (nginx: gzip_static/brotli_static).
+LAYER_DIR = DATEN_DIR / "static" / "layer"
+# URL relativ zum iframe der Kartenkomponente (wie kacheln.KACHEL_URL)
+LAYER_URL = "../../app/static/layer"
+LAYER_VERSION = 2
+# Nachkommastellen der Koordinaten (1e-6 Grad ≈ 0,1 m)
+NACHKOMMA = 6
+
+
+def _runde(coords):
+    if coords and isinstance(coords[0], (int, float)):
+        return [round(c, NACHKOMMA) for c in coords]
+    return [_runde(c) for c in coords]
+
+
+def _eigenschaft(key, wert):
+    # NaN ist kein JSON (r.json() im Browser scheitert daran): fehlende Straßennamen
+    # werden "", nicht endliche Zahlen None
+    if key == "strname":
+        return wert.strip() if isinstance(wert, str) else ""
+    if isinstance(wert, float) and not math.isfinite(wert):
+        return None
+    return wert
+
+
+def kompakt(filepath):
+    """Kompaktes GeoJSON eines Layers als Bytes (Features mit Wert wie im Kachelmodus)."""
+    layer_name = Path(filepath).stem
+    feld = wert_feld(layer_name)
+    behalten = {feld, "klasse", "strname", "jahr", "Jahr"}
+    features = [
+        {
+            "type": "Feature",
+            "id": f.get("id", str(i)),
+            "geometry": {"type": f["geometry"]["type"], "coordinates": _runde(f["geometry"]["coordinates"])},
+            "properties": {k: _eigenschaft(k, v) for k, v in f["properties"].items() if k in behalten},
+        }
+        for i, f in enumerate(karten_features(Path(filepath), None))
+    ]
+    return json.dumps(
+        {"type": "FeatureCollection", "features": features},
+        ensure_ascii=False, separators=(",", ":"), allow_nan=False,
+    ).encode("utf-8")
+
+
+def layer_pfad(layer_name):
+    return LAYER_DIR / layer_slug(layer_name)
+
+
+def layer_url(layer_name, index):
+    return f"{LAYER_URL}/{layer_slug(layer_name)}/{index['datei']}"
+
+
+def lade_index(layer_name):
+    try:
+        with open(layer_pfad(layer_name) / "index.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _ist_aktuell(layer_name, index, sig):
+    return (
+        bool(index) and index.get("version") == LAYER_VERSION and index.get("signatur") == sig
+        and (layer_pfad(layer_name) / index["datei"]).exists()
+    )
+
+
+def _schreibe_layerdatei(filepath, ordner, sig):
+    with messung.stufe("bau_layerdatei"):
+        daten = kompakt(filepath)
+        datei = f"{hashlib.blake2b(daten, digest_size=8).hexdigest()}.json"
+        varianten = {"json": daten, "gz": gzip.compress(daten, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            varianten["br"] = brotli.compress(daten, quality=11)
+        # Komprimierte Fassungen zuerst: die .json ist erst sichtbar, wenn alle da sind
+        for endung in ("br", "gz", "json"):
+            if endung in varianten:
+                schreibe_bytes_atomar(ordner / (datei if endung == "json" else f"{datei}.{endung}"), varianten[endung])
+
+    index = {
+        "version": LAYER_VERSION,
+        "signatur": sig,
+        "datei": datei,
+        "wert_feld": wert_feld(filepath.stem),
+        "quelle_bytes": filepath.stat().st_size,
+        "bytes": {endung: len(inhalt) for endung, inhalt in varianten.items()},
+    }
+    # index.json zuletzt schreiben, danach die Dateien älterer Stände entfernen
+    schreibe_json_atomar(ordner / "index.json", index)
+    for alt in ordner.glob("*.json*"):
+        if alt.name != "index.json" and not alt.name.startswith(datei):
+            alt.unlink(missing_ok=True)
+    return index
+
+
+def baue_layerdatei(filepath):
+    """Schreibt die Dateien eines Layers, falls sie fehlen oder veraltet sind, und gibt den Index zurück."""
+    filepath = Path(filepath)
+    layer_name = filepath.stem
+    sig = list(signatur(filepath))
+    index = lade_index(layer_name)
+    if _ist_aktuell(layer_name, index, sig):
+        messung.cache("layerdatei", True)
+        return index
+    messung.cache("layerdatei", False)
+
+    ordner = layer_pfad(layer_name)
+    with bau_lock(ordner):
+        # Inzwischen von einem anderen Thread gebaut?
+        index = lade_index(layer_name)
+        if not _ist_aktuell(layer_name, index, sig):
+            index = _schreibe_layerdatei(filepath, ordner, sig)
+    return index
+
+
+def baue_alle():
+    for f in sorted(layer_dateien()):
+        if layer_info(f.stem):
+            index = baue_layerdatei(f)
+            b = index["bytes"]
+            print(f" Layerdatei aktuell: {f.stem} ({index['quelle_bytes'] / 1024:.0f} KB Quelle, "
+                  f"{b['json'] / 1024:.0f} KB kompakt, {b['gz'] / 1024:.0f} KB gzip"
+                  + (f", {b['br'] / 1024:.0f} KB brotli)" if "br" in b else ")"))
+
+
+if __name__ == "__main__":
+    baue_alle()
@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from daten import BUILD_DIR, schreibe_text_atomar
+
+# Leichte Laufzeitmessung ohne Profiler: Dauer je Stufe (stufe),
+# Mengen wie Nutzlast in Bytes oder Anzahl Features (menge) und Treffer der
+# prozessweiten Caches (cache). Die Werte werden je Prozess aufsummiert und von
+# exportiere() geschrieben:
+#   metriken_<quelle>.prom – Prometheus-Textformat (z. B. für den Textfile-Collector)
+#   messung.jsonl          – eine Zeile je Export, für den Verlauf
+MESSUNG_DIR = BUILD_DIR / "messung"
+LOG = MESSUNG_DIR / "messung.jsonl"
+PREFIX = "luftdaten"
+# Die App exportiert höchstens so oft (Sekunden), nicht bei jedem Rerun
+EXPORT_INTERVALL_S = 60
+
+# Teure Messungen (die Nutzlast der Kartenlayer als serialisiertes JSON) nur
+# auf Wunsch: prozessweit mit LUFTDATEN_MESSUNG=ausfuehrlich oder ausfuehrlich(True),
+# für einzelne Aufrufe mit kartenlayer.kartendaten(..., nutzlast_messen=True)
+_ausfuehrlich = os.environ.get("LUFTDATEN_MESSUNG") == "ausfuehrlich"
+
+# name -> [anzahl, summe_s, max_s, letzte_s]
+_stufen = {}
+# name -> [anzahl, summe, letzter]
+_mengen = {}
+# name -> [treffer, fehlschlaege]
+_caches = {}
+# quelle -> time.monotonic() des letzten Exports
+_exportiert = {}
+_lock = threading.Lock()
+
+
+def ausfuehrlich(an=None):
+    """Schaltet die teuren Messungen ein oder aus (an=None: nur abfragen)."""
+    global _ausfuehrlich
+    if an is not None:
+        _ausfuehrlich = bool(an)
+    return _ausfuehrlich
+
+
+def erfasse(name, sekunden):
+    with _lock:
+        s = _stufen.setdefault(name, [0, 0.0, 0.0, 0.0])
+        s[0] += 1
+        s[1] += sekunden
+        s[2] = max(s[2], sekunden)
+        s[3] = sekunden
+
+
+@contextmanager
+def stufe(name):
+    """Misst die Dauer des with-Blocks als Stufe name (auch bei Ausnahmen)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        erfasse(name, time.perf_counter() - start)
+
+
+def menge(name, wert):
+    """Erfasst eine Menge (Bytes, Features, ...); aufsummiert und zuletzt gemeldeter Wert."""
+    with _lock:
+        m = _mengen.setdefault(name, [0, 0, 0])
+        m[0] += 1
+        m[1] += wert
+        m[2] = wert
+
+
+def cache(name, treffer):
+    """Zählt einen Treffer (True) oder Fehlschlag (False) des Caches name."""
+    with _lock:
+        c = _caches.setdefault(name, [0, 0])
+        c[0 if treffer else 1] += 1
+
+
+def stand():
+    """Momentaufnahme aller Messwerte als dict (für Anzeige und Export)."""
+    with _lock:
+        return {
+            "stufen": {
+                name: {"anzahl": n, "summe_s": summe, "max_s": maximum, "letzte_s": letzte}
+                for name, (n, summe, maximum, letzte) in sorted(_stufen.items())
+            },
+            "mengen": {
+                name: {"anzahl": n, "summe": summe, "letzter": letzter}
+                for name, (n, summe, letzter) in sorted(_mengen.items())
+            },
+            "caches": {
+                name: {"treffer": treffer, "fehlschlaege": fehl}
+                for name, (treffer, fehl) in sorted(_caches.items())
+            },
+        }
+
+
+def _label(wert):
+    return str(wert).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def als_prometheus(daten=None):
+    """Messwerte im Prometheus-Textformat."""
+    daten = daten or stand()
+    zeilen = []
+
+    def metrik(name, typ, hilfe, werte):
+        zeilen.append(f"# HELP {PREFIX}_{name} {hilfe}")
+        zeilen.append(f"# TYPE {PREFIX}_{name} {typ}")
+        for labels, wert in werte:
+            label = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            zeilen.append(f"{PREFIX}_{name}{{{label}}} {wert:.9g}")
+
+    stufen, mengen, caches = daten["stufen"], daten["mengen"], daten["caches"]
+    metrik("stufe_seconds_sum", "counter", "Gesamtdauer je Stufe in Sekunden.",
+           [({"stufe": n}, s["summe_s"]) for n, s in stufen.items()])
+    metrik("stufe_seconds_count", "counter", "Anzahl Messungen je Stufe.",
+           [({"stufe": n}, s["anzahl"]) for n, s in stufen.items()])
+    metrik("stufe_seconds_max", "gauge", "Längste gemessene Dauer je Stufe in Sekunden.",
+           [({"stufe": n}, s["max_s"]) for n, s in stufen.items()])
+    metrik("stufe_seconds_last", "gauge", "Zuletzt gemessene Dauer je Stufe in Sekunden.",
+           [({"stufe": n}, s["letzte_s"]) for n, s in stufen.items()])
+    metrik("menge_sum", "counter", "Aufsummierte Menge (Bytes, Features, ...).",
+           [({"name": n}, m["summe"]) for n, m in mengen.items()])
+    metrik("menge_last", "gauge", "Zuletzt gemeldete Menge.",
+           [({"name": n}, m["letzter"]) for n, m in mengen.items()])
+    metrik("cache_total", "counter", "Zugriffe auf die prozessweiten Caches.",
+           [({"cache": n, "ergebnis": ergebnis}, c[ergebnis])
+            for n, c in caches.items() for ergebnis in ("treffer", "fehlschlaege")])
+    return "\n".join(zeilen) + "\n"
+
+
+def exportiere(quelle="app", ziel=MESSUNG_DIR):
+    """Schreibt metriken_<quelle>.prom (atomar) und hängt eine Zeile an messung.jsonl an."""
+    daten = stand()
+    schreibe_text_atomar(ziel / f"metriken_{quelle}.prom", als_prometheus(daten))
+    zeile = {
+        "zeit": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "quelle": quelle,
+        "pid": os.getpid(),
+        **daten,
+    }
+    with open(ziel / LOG.name, "a", encoding="utf-8") as f:
+        f.write(json.dumps(zeile, ensure_ascii=False) + "\n")
+
+
+
+def exportiere_periodisch(quelle="app", intervall_s=EXPORT_INTERVALL_S):
+    """Wie exportiere(), aber höchstens alle intervall_s Sekunden je Quelle und Prozess."""
+    jetzt = time.monotonic()
+    with _lock:
+        if jetzt - _exportiert.get(quelle, -intervall_s) < intervall_s:
+            return False
+        _exportiert[quelle] = jetzt
+    exportiere(quelle)
+    return True
+
+
+if __name__ == "__main__":
+    # Zuletzt exportierte Werte je Quelle anzeigen
+    letzte = {}
+    if LOG.exists():
+        with open(LOG, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    eintrag = json.loads(line)
+                    letzte[eintrag["quelle"]] = eintrag
+    for quelle, eintrag in sorted(letzte.items()):
+        print(f" {quelle} ({eintrag['zeit']}):")
+        for name, s in eintrag["stufen"].items():
+            print(f"   {name:<28} {s['anzahl']:>6}×  Ø {1000 * s['summe_s'] / s['anzahl']:8.1f} ms"
+                  f"  max {1000 * s['max_s']:8.1f} ms")
+        for name, c in eintrag["caches"].items():
+            print(f"   Cache {name:<22} {c['treffer']:>6} Treffer  {c['fehlschlaege']:>4} Fehlschläge")
@@ -0,0 +1,249 @@
+import base64
+import json
+import math
+import threading
+
+import numpy as np
+from pyproj import Transformer
+
+from daten import BUILD_DIR, flaechen_dateien, lade_abgeleitet, layer_info, schreibe_json_atomar, signatur, wert_feld
+from geojson_stream import lies_features
+from klassen import FARBEN, farbklassen
+from spalten import speichere_array
+import zwischenspeicher
+
+# Die Flächenbelastung liegt als regelmäßiges 1-km-Raster vor – bis 2015 im
+# Gauß-Krüger-System (DHDN, 4. Streifen), ab 2019 in UTM 33N. Alle Flächen-Layer
+# werden in einen Würfel
+#   werte.npy   float64 (Jahr, Schadstoff, Zeile, Spalte), NaN = keine Zelle
+# übertragen; meta.json enthält je Jahr das Koordinatensystem des Gitters und
+# die affine Transformation (GDAL-Reihenfolge). Die Zelle eines Punktes ergibt
+# sich damit rein rechnerisch.
+RASTER_DIR = BUILD_DIR / "raster"
+RASTER_VERSION = 1
+# Mögliche Koordinatensysteme der Gitter; gewählt wird das, in dem die
+# Zellecken auf ganzen Kilometern liegen
+GITTER_CRS = ("EPSG:31468", "EPSG:25833")
+ZELLE_M = 1000
+SCHADSTOFFE = ("NO2", "PM10")
+# Auflösung der Kartenbilder (Bildpunkte je Rasterzelle und Richtung)
+PIXEL_PRO_ZELLE = 8
+
+_lokal = threading.local()
+
+
+def _transformer(quelle, ziel):
+    # pyproj-Transformer sind nicht threadsicher – einer pro Thread
+    if not hasattr(_lokal, "transformer"):
+        _lokal.transformer = {}
+    key = (quelle, ziel)
+    if key not in _lokal.transformer:
+        _lokal.transformer[key] = Transformer.from_crs(quelle, ziel, always_xy=True)
+    return _lokal.transformer[key]
+
+
+def datenversion():
+    return {f.stem: list(signatur(f)) for f in flaechen_dateien()}
+
+
+class Rasterwuerfel:
+    """Alle Flächen-Layer als Würfel (Jahr × Schadstoff × Zeile × Spalte)."""
+
+    def __init__(self, verzeichnis=RASTER_DIR):
+        with open(verzeichnis / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.werte = np.load(verzeichnis / "werte.npy", mmap_mode="r")
+        self.jahre = self.meta["jahre"]
+        self.schadstoffe = self.meta["schadstoffe"]
+        self.gitter = self.meta["gitter"]
+        self._sortiert = {}
+        # Stand für die Bilder im Zwischenspeicher: die Signaturen der Quellen
+        self._stand = tuple(sorted((name, tuple(sig)) for name, sig in self.meta["quellen"].items()))
+
+    @property
+    def zeilen(self):
+        return self.werte.shape[2]
+
+    @property
+    def spalten(self):
+        return self.werte.shape[3]
+
+    def _zellindex(self, j, lon, lat):
+        # Zeile/Spalte im Gitter des Jahres j (auch für Arrays)
+        gitter = self.gitter[j]
+        x, y = _transformer("EPSG:4326", gitter["crs"]).transform(lon, lat)
+        x0, dx, _, y0, _, dy = gitter["transform"]
+        return np.floor((y - y0) / dy).astype(np.int64), np.floor((x - x0) / dx).astype(np.int64)
+
+    def gitterkoordinaten(self, jahr, lon, lat):
+        """(Spalte, Zeile) als Gleitkommazahlen im Gitter eines Jahres – Zelle (z, s) ist [s, s+1) × [z, z+1)."""
+        gitter = self.gitter[self.jahre.index(str(jahr))]
+        x, y = _transformer("EPSG:4326", gitter["crs"]).transform(lon, lat)
+        x0, dx, _, y0, _, dy = gitter["transform"]
+        return (np.asarray(x) - x0) / dx, (np.asarray(y) - y0) / dy
+
+    def zellpolygone(self, jahr, zeilen, spalten):
+        """Ecken (n, 5, 2) in WGS84 (lon, lat) der Zellen (zeilen[i], spalten[i]) eines Jahres."""
+        gitter = self.gitter[self.jahre.index(str(jahr))]
+        x0, dx, _, y0, _, dy = gitter["transform"]
+        ecken = np.array([(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)])
+        x = x0 + (np.asarray(spalten)[:, None] + ecken[:, 0]) * dx
+        y = y0 + (np.asarray(zeilen)[:, None] + ecken[:, 1]) * dy
+        lon, lat = _transformer(gitter["crs"], "EPSG:4326").transform(x.ravel(), y.ravel())
+        return np.stack([lon, lat], axis=-1).reshape(-1, 5, 2)
+
+    def zelle(self, lon, lat, jahr):
+        """(Zeile, Spalte) der Rasterzelle am Punkt oder None außerhalb des Rasters."""
+        zeile, spalte = (int(i) for i in self._zellindex(self.jahre.index(str(jahr)), lon, lat))
+        if 0 <= zeile < self.zeilen and 0 <= spalte < self.spalten:
+            return zeile, spalte
+        return None
+
+    def wert(self, lon, lat, jahr, schadstoff):
+        zelle = self.zelle(lon, lat, jahr)
+        if zelle is None:
+            return None
+        wert = float(self.werte[self.jahre.index(str(jahr)), self.schadstoffe.index(schadstoff), zelle[0], zelle[1]])
+        return None if math.isnan(wert) else wert
+
+    def grenzen(self, jahr):
+        """[[süd, west], [nord, ost]] des Gitters eines Jahres in WGS84."""
+        gitter = self.gitter[self.jahre.index(str(jahr))]
+        x0, dx, _, y0, _, dy = gitter["transform"]
+        # Kanten abtasten – im Gitter gerade Linien sind in WGS84 leicht gedreht
+        t = np.linspace(0, 1, 17)
+        x1, y1 = x0 + dx * self.spalten, y0 + dy * self.zeilen
+        kx = np.concatenate([x0 + t * (x1 - x0), np.full(17, x1), x0 + t * (x1 - x0), np.full(17, x0)])
+        ky = np.concatenate([np.full(17, y0), y0 + t * (y1 - y0), np.full(17, y1), y0 + t * (y1 - y0)])
+        lon, lat = _transformer(gitter["crs"], "EPSG:4326").transform(kx, ky)
+        return [[float(lat.min()), float(lon.min())], [float(lat.max()), float(lon.max())]]
+
+    def zellen_ueber(self, jahr, schadstoff, grenze):
+        """(Zellen mit Wert > grenze, Zellen mit Wert) – binäre Suche in den sortierten Werten des Layers."""
+        key = (str(jahr), schadstoff)
+        if key not in self._sortiert:
+            werte = np.asarray(self.werte[self.jahre.index(key[0]), self.schadstoffe.index(schadstoff)]).ravel()
+            self._sortiert[key] = np.sort(werte[~np.isnan(werte)])
+        sortiert = self._sortiert[key]
+        return len(sortiert) - int(np.searchsorted(sortiert, grenze, side="right")), len(sortiert)
+
+    def bild(self, jahr, schadstoff, grenze=None):
+        """Farbiges PNG (data-URL) eines Layers und seine Grenzen für folium.raster_layers.ImageOverlay.
+
+        Die Bildzeilen werden gleichabständig in Web-Mercator abgetastet, das
+        Bild passt damit ohne weitere Umrechnung auf die Leaflet-Karte. Mit
+        grenze bleiben Zellen mit Wert ≤ grenze transparent.
+        """
+        key = (str(jahr), schadstoff, grenze)
+        return zwischenspeicher.hole_oder_baue("raster_bild", key, lambda: self._zeichne(*key), stand=self._stand)
+
+    def _zeichne(self, jahr, schadstoff, grenze=None):
+        grenzen = self.grenzen(jahr)
+        (sued, west), (nord, ost) = grenzen
+        breite = self.spalten * PIXEL_PRO_ZELLE
+        hoehe = self.zeilen * PIXEL_PRO_ZELLE
+
+        lon = west + (np.arange(breite) + 0.5) / breite * (ost - west)
+        y_nord, y_sued = _mercator_y(nord), _mercator_y(sued)
+        lat = _mercator_lat(y_nord + (np.arange(hoehe) + 0.5) / hoehe * (y_sued - y_nord))
+        lon, lat = np.meshgrid(lon, lat)
+
+        j = self.jahre.index(jahr)
+        zeile, spalte = self._zellindex(j, lon.ravel(), lat.ravel())
+        innen = (zeile >= 0) & (zeile < self.zeilen) & (spalte >= 0) & (spalte < self.spalten)
+        werte = np.full(len(zeile), np.nan)
+        werte[innen] = self.werte[j, self.schadstoffe.index(schadstoff)][zeile[innen], spalte[innen]]
+        if grenze is not None:
+            werte[werte <= grenze] = np.nan
+
+        palette = np.zeros((len(FARBEN) + 1, 4), dtype=np.uint8)  # letzter Eintrag: transparent
+        for i, farbe in enumerate(FARBEN):
+            palette[i] = [int(farbe[k:k + 2], 16) for k in (1, 3, 5)] + [255]
+        rgba = palette[farbklassen(werte)].reshape(hoehe, breite, 4)
+
+        # branca erst hier laden – Abfrage und ETL brauchen den Würfel, aber keine Bilder
+        from branca.utilities import write_png
+
+        url = "data:image/png;base64," + base64.b64encode(write_png(rgba)).decode("ascii")
+        return url, grenzen
+
+
+def _mercator_y(lat):
+    return np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+
+
+def _mercator_lat(y):
+    return np.degrees(2 * np.arctan(np.exp(y)) - np.pi / 2)
+
+
+def _gitter_crs(ecken):
+    # Koordinatensystem, in dem die Zellecken am genauesten auf ganzen Kilometern liegen
+    def abweichung(crs):
+        x, y = _transformer("EPSG:4326", crs).transform(ecken[:, 0], ecken[:, 1])
+        return np.abs(np.concatenate([x, y]) / ZELLE_M - np.round(np.concatenate([x, y]) / ZELLE_M)).mean()
+    return min(GITTER_CRS, key=abweichung)
+
+
+def baue_raster(dateien=None, ziel=RASTER_DIR):
+    """Überträgt alle Flächen-Layer in den Würfel."""
+    dateien = flaechen_dateien() if dateien is None else sorted(dateien)
+    layer = {}
+    for filepath in dateien:
+        schadstoff, _, jahr = layer_info(filepath.stem)
+        feld = wert_feld(filepath.stem)
+        ringe, werte = [], []
+        for feature in lies_features(filepath):
+            ringe.append(np.asarray(feature["geometry"]["coordinates"][0], dtype=np.float64)[:4])
+            wert = feature.get("properties", {}).get(feld)
+            werte.append(wert if isinstance(wert, (int, float)) else np.nan)
+        layer.setdefault(jahr, []).append((schadstoff, np.asarray(ringe).reshape(-1, 4, 2), np.asarray(werte, dtype=np.float64)))
+
+    jahre = sorted(layer)
+    gitter, zellen = [], []
+    for jahr in jahre:
+        alle_ecken = np.concatenate([ringe.reshape(-1, 2) for _, ringe, _ in layer[jahr]])
+        crs = _gitter_crs(alle_ecken[:200])
+        mitten = []
+        for schadstoff, ringe, werte in layer[jahr]:
+            zentren = ringe.mean(axis=1)
+            x, y = _transformer("EPSG:4326", crs).transform(zentren[:, 0], zentren[:, 1])
+            mitten.append((schadstoff, x, y, werte))
+        alle_x = np.concatenate([x for _, x, _, _ in mitten])
+        alle_y = np.concatenate([y for _, _, y, _ in mitten])
+        x0 = math.floor(alle_x.min() / ZELLE_M) * ZELLE_M
+        y0 = math.ceil(alle_y.max() / ZELLE_M) * ZELLE_M
+        gitter.append({"crs": crs, "transform": [x0, ZELLE_M, 0, y0, 0, -ZELLE_M]})
+        for schadstoff, x, y, werte in mitten:
+            spalte = np.floor((x - x0) / ZELLE_M).astype(np.int64)
+            zeile = np.floor((y0 - y) / ZELLE_M).astype(np.int64)
+            zellen.append((jahre.index(jahr), SCHADSTOFFE.index(schadstoff), zeile, spalte, werte))
+
+    zeilen = max(int(z.max()) for _, _, z, _, _ in zellen) + 1
+    spalten = max(int(s.max()) for _, _, _, s, _ in zellen) + 1
+    wuerfel = np.full((len(jahre), len(SCHADSTOFFE), zeilen, spalten), np.nan)
+    for j, s, zeile, spalte, werte in zellen:
+        wuerfel[j, s, zeile, spalte] = werte
+
+    ziel.mkdir(parents=True, exist_ok=True)
+    speichere_array(ziel / "werte.npy", wuerfel)
+    schreibe_json_atomar(ziel / "meta.json", {
+        "version": RASTER_VERSION,
+        "quellen": {f.stem: list(signatur(f)) for f in dateien},
+        "jahre": jahre,
+        "schadstoffe": list(SCHADSTOFFE),
+        "gitter": gitter,
+    }, indent=2)
+
+
+def lade_raster():
+    """Rasterwürfel der aktuellen Flächen-Layer; wird bei Änderungen neu erzeugt und prozessweit geteilt."""
+    return lade_abgeleitet(
+        "raster", RASTER_DIR, RASTER_VERSION, {"quellen": datenversion()},
+        baue_raster, lambda: Rasterwuerfel(RASTER_DIR),
+    )
+
+
+if __name__ == "__main__":
+    wuerfel = lade_raster()
+    print(f" Raster aktuell: {len(wuerfel.jahre)} Jahre × {len(wuerfel.schadstoffe)} Schadstoffe × "
+          f"{wuerfel.zeilen} × {wuerfel.spalten} Zellen")
@@ -0,0 +1,228 @@
+import hashlib
+import json
+
+import numpy as np
+import shapely
+
+from abfrage import projiziere
+from daten import BUILD_DIR, lade_abgeleitet, layer_info, schreibe_json_atomar, signatur, strassen_dateien
+from klassen import aenderungsklassen
+from spalten import lade_strassen_layer, speichere_array
+
+# Segment-Identitäten über die Jahre der Straßenrand-Layer. Die Jahresdateien
+# haben keinen gemeinsamen Schlüssel; Abschnitte werden über einen Hash der
+# (gerundeten, richtungsunabhängigen) Geometrie zugeordnet, übrige über einen
+# STRtree mit Hausdorff-Abstand ≤ TOLERANZ_M. Je Schadstoff:
+#   ids_<jahr>.npy  int32   (n_jahr,)              – Segment-ID je Feature des Jahres
+#   werte.npy       float64 (n_segmente, n_jahre)  – Messwert, NaN = fehlt/kein Wert
+#   trend.npy       float64 (n_segmente,)          – Steigung in µg/m³ pro Jahr (≥ 2 Werte)
+#   delta.npy       float64 (n_segmente,)          – letztes minus erstes Jahr
+#   meta.json       Jahre, Signaturen der Quellen, Anzahl der Zuordnungen
+SEGMENT_DIR = BUILD_DIR / "segmente"
+SEGMENT_VERSION = 1
+# Nachkommastellen der Koordinaten im Geometrie-Hash (1e-6 Grad ≈ 0,1 m)
+HASH_NACHKOMMA = 6
+# Größter Hausdorff-Abstand für die Zuordnung über den STRtree
+TOLERANZ_M = 5
+
+
+def _geometrie_hash(coords):
+    coords = np.round(np.asarray(coords, dtype=np.float64), HASH_NACHKOMMA) + 0.0
+    # Richtungsunabhängig: immer vom lexikographisch kleineren Endpunkt aus
+    if len(coords) and tuple(coords[-1]) < tuple(coords[0]):
+        coords = coords[::-1]
+    return hashlib.blake2b(np.ascontiguousarray(coords).tobytes(), digest_size=8).digest()
+
+
+def _linien(layer):
+    return shapely.linestrings(
+        projiziere(layer.coords), indices=np.repeat(np.arange(len(layer)), np.diff(layer.offsets))
+    )
+
+
+def _trend(werte, jahre):
+    # Steigung der Ausgleichsgeraden je Zeile über die vorhandenen Werte
+    x = np.broadcast_to(np.asarray(jahre, dtype=np.float64), werte.shape)
+    gueltig = ~np.isnan(werte)
+    n = gueltig.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mittel = np.where(gueltig, x, 0).sum(axis=1) / n
+        w_mittel = np.where(gueltig, werte, 0).sum(axis=1) / n
+        dx = np.where(gueltig, x - x_mittel[:, None], 0)
+        dw = np.where(gueltig, werte - w_mittel[:, None], 0)
+        trend = (dx * dw).sum(axis=1) / (dx * dx).sum(axis=1)
+    return np.where(n >= 2, trend, np.nan)
+
+
+def baue_segmente(schadstoff, ziel=None):
+    """Ordnet die Abschnitte aller Jahre eines Schadstoffs einander zu und schreibt den Index."""
+    ziel = ziel or SEGMENT_DIR / schadstoff.lower()
+    dateien = strassen_dateien(schadstoff)
+    jahre = [layer_info(f.stem)[2] for f in dateien]
+
+    hashes = {}        # Geometrie-Hash -> Segment-IDs
+    vertreter = []     # Geometrie (projiziert) je Segment, aus dem letzten Jahr mit dem Segment
+    ids_je_jahr, werte_je_jahr = [], []
+    zuordnung = {"exakt": 0, "toleranz": 0, "neu": 0}
+
+    for filepath in dateien:
+        layer = lade_strassen_layer(filepath)
+        linien = _linien(layer)
+        ids = np.full(len(layer), -1, dtype=np.int32)
+        vergeben = set()
+
+        # 1. Gleiche Geometrie
+        eigene = [_geometrie_hash(layer.koordinaten(i)) for i in range(len(layer))]
+        for i, h in enumerate(eigene):
+            for sid in hashes.get(h, ()):
+                if sid not in vergeben:
+                    ids[i] = sid
+                    vergeben.add(sid)
+                    zuordnung["exakt"] += 1
+                    break
+
+        # 2. Nächster noch freier Abschnitt innerhalb der Toleranz (kleinster Abstand zuerst)
+        offen = np.flatnonzero(ids < 0)
+        frei = np.array([sid for sid in range(len(vertreter)) if sid not in vergeben], dtype=np.int64)
+        if len(offen) and len(frei):
+            baum = shapely.STRtree(np.asarray(vertreter, dtype=object)[frei])
+            i, j = baum.query(linien[offen], predicate="dwithin", distance=TOLERANZ_M)
+            abstand = shapely.hausdorff_distance(linien[offen[i]], baum.geometries[j])
+            for k in np.argsort(abstand, kind="stable"):
+                if abstand[k] > TOLERANZ_M:
+                    break
+                feature, sid = int(offen[i[k]]), int(frei[j[k]])
+                if ids[feature] < 0 and sid not in vergeben:
+                    ids[feature] = sid
+                    vergeben.add(sid)
+                    zuordnung["toleranz"] += 1
+
+        # 3. Alle übrigen sind neue Segmente
+        for i in np.flatnonzero(ids < 0):
+            ids[i] = len(vertreter)
+            vertreter.append(None)
+            zuordnung["neu"] += 1
+
+        for i, h in enumerate(eigene):
+            sid = int(ids[i])
+            vertreter[sid] = linien[i]
+            if sid not in hashes.get(h, ()):
+                hashes.setdefault(h, []).append(sid)
+        ids_je_jahr.append(ids)
+        werte_je_jahr.append(np.asarray(layer.werte, dtype=np.float64))
+
+    werte = np.full((len(vertreter), len(jahre)), np.nan)
+    for j, (ids, w) in enumerate(zip(ids_je_jahr, werte_je_jahr)):
+        werte[ids, j] = w
+
+    ziel.mkdir(parents=True, exist_ok=True)
+    for jahr, ids in zip(jahre, ids_je_jahr):
+        speichere_array(ziel / f"ids_{jahr}.npy", ids)
+    speichere_array(ziel / "werte.npy", werte)
+    speichere_array(ziel / "trend.npy", _trend(werte, [int(j) for j in jahre]))
+    speichere_array(ziel / "delta.npy", werte[:, -1] - werte[:, 0])
+    # meta.json zuletzt schreiben – sie markiert einen vollständigen Index
+    schreibe_json_atomar(ziel / "meta.json", {
+        "version": SEGMENT_VERSION,
+        "schadstoff": schadstoff,
+        "quellen": {f.stem: list(signatur(f)) for f in dateien},
+        "jahre": jahre,
+        "zuordnung": zuordnung,
+    }, indent=2)
+
+
+class Segmentindex:
+    """Segment-Identitäten eines Schadstoffs über alle Jahre."""
+
+    def __init__(self, verzeichnis):
+        with open(verzeichnis / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.schadstoff = self.meta["schadstoff"]
+        self.jahre = self.meta["jahre"]
+        self.werte = np.load(verzeichnis / "werte.npy", mmap_mode="r")
+        self.trend = np.load(verzeichnis / "trend.npy", mmap_mode="r")
+        self.delta = np.load(verzeichnis / "delta.npy", mmap_mode="r")
+        self.ids = {jahr: np.load(verzeichnis / f"ids_{jahr}.npy", mmap_mode="r") for jahr in self.jahre}
+
+    def __len__(self):
+        return len(self.werte)
+
+    def aenderung(self, von, bis):
+        """(Features im Jahr bis, Wert von, Wert bis) für alle Abschnitte mit Wert in beiden Jahren."""
+        ids = np.asarray(self.ids[bis])
+        w_von = self.werte[ids, self.jahre.index(von)]
+        w_bis = self.werte[ids, self.jahre.index(bis)]
+        features = np.flatnonzero(~np.isnan(w_von) & ~np.isnan(w_bis))
+        return features, w_von[features], w_bis[features]
+
+    def feature_collection(self, von, bis, zoom=None, ausschnitt=None):
+        """Veränderungs-Layer von → bis auf der Geometrie des Jahres bis.
+
+        properties: strname, von, bis, aenderung (µg/m³), trend (µg/m³ pro Jahr über
+        alle Jahre) und klasse (Index in klassen.AENDERUNG_FARBEN). ausschnitt
+        (west, süd, ost, nord) beschränkt auf die Abschnitte in diesem Bereich.
+        """
+        layer = lade_strassen_layer(strassen_datei(self.schadstoff, bis))
+        features, w_von, w_bis = self.aenderung(von, bis)
+        if ausschnitt is not None:
+            im_ausschnitt = np.isin(features, layer.im_ausschnitt(*ausschnitt))
+            features, w_von, w_bis = features[im_ausschnitt], w_von[im_ausschnitt], w_bis[im_ausschnitt]
+        segmente = np.asarray(self.ids[bis])[features]
+        if (von, bis) == (self.jahre[0], self.jahre[-1]):
+            aenderung = self.delta[segmente]
+        else:
+            aenderung = w_bis - w_von
+        trend = self.trend[segmente]
+        klassen = aenderungsklassen(aenderung).tolist()
+        coords, offsets = layer.geometrie(zoom)
+        offsets = offsets.tolist()
+        codes = layer.strname_codes.tolist()
+        return {"type": "FeatureCollection", "features": [
+            {
+                "type": "Feature",
+                "id": str(i),
+                "geometry": {"type": "LineString", "coordinates": coords[offsets[i]:offsets[i + 1]].tolist()},
+                "properties": {
+                    "strname": layer.strnamen[codes[i]],
+                    "von": v0,
+                    "bis": v1,
+                    "aenderung": round(d, 1),
+                    "trend": None if t != t else round(t, 2),
+                    "klasse": k,
+                },
+            }
+            for i, v0, v1, d, t, k in zip(
+                features.tolist(), w_von.tolist(), w_bis.tolist(), aenderung.tolist(), trend.tolist(), klassen
+            )
+        ]}
+
+
+def strassen_datei(schadstoff, jahr):
+    for f in strassen_dateien(schadstoff):
+        if layer_info(f.stem)[2] == jahr:
+            return f
+    raise KeyError(f"Kein Straßenrand-Layer {schadstoff} {jahr}")
+
+
+def lade_segmente(schadstoff):
+    """Segmentindex eines Schadstoffs; wird bei geänderten Quellen neu gebaut und prozessweit geteilt."""
+    ziel = SEGMENT_DIR / schadstoff.lower()
+    return lade_abgeleitet(
+        "segmente", ziel, SEGMENT_VERSION,
+        {"quellen": {f.stem: list(signatur(f)) for f in strassen_dateien(schadstoff)}},
+        lambda: baue_segmente(schadstoff, ziel), lambda: Segmentindex(ziel),
+    )
+
+
+def baue_alle():
+    for schadstoff in ("NO2", "PM10"):
+        if len(strassen_dateien(schadstoff)) < 2:
+            continue
+        index = lade_segmente(schadstoff)
+        z = index.meta["zuordnung"]
+        print(f" Segmente aktuell: {schadstoff} ({len(index)} Segmente über {len(index.jahre)} Jahre; "
+              f"{z['exakt']} exakt, {z['toleranz']} über Toleranz zugeordnet)")
+
+
+if __name__ == "__main__":
+    baue_alle()
@@ -0,0 +1,254 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+from daten import BUILD_DIR, lade_abgeleitet, layer_dateien, layer_info, schreibe_json_atomar, signatur, wert_feld
+from geojson_stream import lies_features
+from klassen import farbklassen
+from vereinfachung import LOD_STUFEN, lod_stufe, vereinfache_linien
+
+# Spaltenformat für die Straßenrand-Layer:
+#   coords.npy    float64 (n_punkte, 2)  – alle Stützpunkte hintereinander (lon, lat)
+#   offsets.npy   int64   (n + 1,)       – Feature i = coords[offsets[i]:offsets[i + 1]]
+#   werte.npy     float64 (n,)           – Messwert, NaN = kein Wert
+#   strname.npy   int32   (n,)           – Index in meta["strnamen"] (Texte, "" = ohne Namen)
+#   klasse.npy    int8    (n,)           – Farbklasse (Index in klassen.FARBEN), -1 = kein Wert
+#   laenge.npy    float64 (n,)           – Länge des Abschnitts in m
+#   sortierung.npy int64  (n_gueltig,)   – Features mit Wert, aufsteigend nach Wert (Schwellenabfragen)
+#   kum_laenge.npy float64 (n_gueltig,)  – aufsummierte Länge in dieser Reihenfolge
+#   meta.json     Jahr, Wertspalte, Straßennamen-Wörterbuch, Signatur der Quelle
+#   z<zoom>/      coords.npy + offsets.npy je Detailstufe (vereinfacht, gerundet)
+SPALTEN_DIR = BUILD_DIR / "spalten"
+SPALTEN_VERSION = 5
+# Meter pro Grad Breite (für die Abschnittslängen)
+M_PRO_GRAD = 111_320
+
+
+class StrassenLayer:
+    """Straßenrand-Layer im Spaltenformat; die Geometriepuffer werden per mmap gelesen."""
+
+    def __init__(self, verzeichnis, mmap=True):
+        verzeichnis = Path(verzeichnis)
+        modus = "r" if mmap else None
+        self.verzeichnis = verzeichnis
+        self._modus = modus
+        self._lod = {}
+        self._baum = None
+        with open(verzeichnis / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.coords = np.load(verzeichnis / "coords.npy", mmap_mode=modus)
+        self.offsets = np.load(verzeichnis / "offsets.npy", mmap_mode=modus)
+        self.werte = np.load(verzeichnis / "werte.npy", mmap_mode=modus)
+        self.strname_codes = np.load(verzeichnis / "strname.npy", mmap_mode=modus)
+        self.klassen = np.load(verzeichnis / "klasse.npy", mmap_mode=modus)
+        self.laengen = np.load(verzeichnis / "laenge.npy", mmap_mode=modus)
+        self.sortierung = np.load(verzeichnis / "sortierung.npy", mmap_mode=modus)
+        self.kum_laenge = np.load(verzeichnis / "kum_laenge.npy", mmap_mode=modus)
+        self.sortierte_werte = np.asarray(self.werte)[self.sortierung]
+        self.strnamen = self.meta["strnamen"]
+        self.jahr = self.meta["jahr"]
+        self.wert_feld = self.meta["wert_feld"]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def geometrie(self, zoom=None):
+        """(coords, offsets) der zur Zoomstufe passenden Detailstufe."""
+        stufe = lod_stufe(zoom)
+        if stufe is None:
+            return self.coords, self.offsets
+        if stufe not in self._lod:
+            ordner = self.verzeichnis / f"z{stufe}"
+            self._lod[stufe] = (
+                np.load(ordner / "coords.npy", mmap_mode=self._modus),
+                np.load(ordner / "offsets.npy", mmap_mode=self._modus),
+            )
+        return self._lod[stufe]
+
+    def koordinaten(self, i, zoom=None):
+        coords, offsets = self.geometrie(zoom)
+        return coords[offsets[i]:offsets[i + 1]]
+
+    def im_ausschnitt(self, west, sued, ost, nord):
+        """Indizes (sortiert) der Features, deren Begrenzungsrechteck den Ausschnitt schneidet.
+
+        Der STRtree über die Originalgeometrie wird beim ersten Aufruf gebaut.
+        """
+        if self._baum is None:
+            linien = shapely.linestrings(
+                self.coords, indices=np.repeat(np.arange(len(self)), np.diff(self.offsets))
+            )
+            self._baum = shapely.STRtree(linien)
+        return np.sort(self._baum.query(shapely.box(west, sued, ost, nord)))
+
+    def ueber(self, grenze):
+        """Indizes der Features mit Wert > grenze (aufsteigend nach Wert) – binäre Suche im sortierten Index."""
+        return self.sortierung[np.searchsorted(self.sortierte_werte, grenze, side="right"):]
+
+    def laenge_ueber(self, grenze):
+        """Gesamtlänge (m) der Abschnitte mit Wert > grenze, in O(log n)."""
+        start = np.searchsorted(self.sortierte_werte, grenze, side="right")
+        if start == len(self.kum_laenge):
+            return 0.0
+        return float(self.kum_laenge[-1] - (self.kum_laenge[start - 1] if start else 0.0))
+
+    def gueltig(self):
+        """Indizes aller Features mit Messwert."""
+        return np.flatnonzero(~np.isnan(self.werte))
+
+    def feature_collection(self, indices=None, zoom=None):
+        """Baut eine FeatureCollection (wie in der GeoJSON-Quelle) für folium.GeoJson.
+
+        Zusätzlich trägt jedes Feature seine Farbklasse ("klasse"), nach der die
+        Karte im Browser einfärbt. Mit zoom wird die passende vereinfachte Detailstufe der Geometrie verwendet.
+        """
+        if indices is None:
+            indices = range(len(self))
+        coords, offsets = self.geometrie(zoom)
+        offsets = offsets.tolist()
+        werte = self.werte.tolist()
+        codes = self.strname_codes.tolist()
+        klassen = self.klassen.tolist()
+        features = []
+        for i in indices:
+            wert = werte[i]
+            features.append({
+                "type": "Feature",
+                "id": str(i),
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": coords[offsets[i]:offsets[i + 1]].tolist(),
+                },
+                "properties": {
+                    "strname": self.strnamen[codes[i]],
+                    self.wert_feld: None if wert != wert else wert,
+                    "jahr": self.jahr,
+                    "klasse": klassen[i],
+                },
+            })
+        return {"type": "FeatureCollection", "features": features}
+
+
+def spalten_pfad(layer_name):
+    return SPALTEN_DIR / layer_name
+
+
+def schreibe_spalten(features, ziel, feld, quelle_signatur=None):
+    """Schreibt LineString-Features (beliebiges Iterable, z. B. gestreamt) ins Spaltenformat."""
+    ziel = Path(ziel)
+    ziel.mkdir(parents=True, exist_ok=True)
+
+    offsets = [0]
+    werte = []
+    codes = []
+    strnamen, strname_index = [], {}
+    teile = []
+    jahr = None
+    for feature in features:
+        coords = feature["geometry"]["coordinates"]
+        teile.append(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+        offsets.append(offsets[-1] + len(coords))
+
+        props = feature.get("properties", {})
+        val = props.get(feld)
+        werte.append(val if isinstance(val, (int, float)) else np.nan)
+        # Fehlende Namen (None, NaN aus älteren ETL-Ausgaben, ...) werden zu "" –
+        # NaN wäre sonst bei jedem Abschnitt ein neuer Eintrag im Wörterbuch
+        name = props.get("strname")
+        name = name.strip() if isinstance(name, str) else ""
+        if name not in strname_index:
+            strname_index[name] = len(strnamen)
+            strnamen.append(name)
+        codes.append(strname_index[name])
+        jahr = props.get("jahr", jahr)
+
+    offsets = np.asarray(offsets, dtype=np.int64)
+    werte = np.asarray(werte, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int32)
+    coords = np.concatenate(teile) if teile else np.zeros((0, 2))
+    speichere_array(ziel / "coords.npy", coords)
+    speichere_array(ziel / "offsets.npy", offsets)
+    speichere_array(ziel / "werte.npy", werte)
+    speichere_array(ziel / "strname.npy", codes)
+    speichere_array(ziel / "klasse.npy", farbklassen(werte).astype(np.int8))
+    laengen = laengen_m(coords, offsets)
+    sortierung = np.flatnonzero(~np.isnan(werte))
+    sortierung = sortierung[np.argsort(werte[sortierung], kind="stable")]
+    speichere_array(ziel / "laenge.npy", laengen)
+    speichere_array(ziel / "sortierung.npy", sortierung)
+    speichere_array(ziel / "kum_laenge.npy", np.cumsum(laengen[sortierung]))
+    for stufe in LOD_STUFEN:
+        lod_coords, lod_offsets = vereinfache_linien(coords, offsets, stufe)
+        (ziel / f"z{stufe}").mkdir(exist_ok=True)
+        speichere_array(ziel / f"z{stufe}" / "coords.npy", lod_coords)
+        speichere_array(ziel / f"z{stufe}" / "offsets.npy", lod_offsets)
+    # meta.json zuletzt schreiben – sie markiert einen vollständigen Satz Spalten
+    schreibe_json_atomar(ziel / "meta.json", {
+        "version": SPALTEN_VERSION,
+        "signatur": list(quelle_signatur) if quelle_signatur else None,
+        "jahr": jahr,
+        "wert_feld": feld,
+        "strnamen": strnamen,
+    })
+
+
+def laengen_m(coords, offsets):
+    """Länge jeder Linie in m (Kugelnäherung, für Stadtgebiete ausreichend genau)."""
+    if len(coords) < 2:
+        return np.zeros(len(offsets) - 1)
+    d = np.diff(coords, axis=0)
+    breite = np.radians((coords[1:, 1] + coords[:-1, 1]) / 2)
+    stuecke = np.hypot(d[:, 0] * np.cos(breite), d[:, 1]) * M_PRO_GRAD
+    # Stücke zwischen zwei Linien gehören zu keiner
+    grenzen = offsets[1:-1] - 1
+    stuecke[grenzen[(grenzen >= 0) & (grenzen < len(stuecke))]] = 0
+    summe = np.concatenate([[0.0], np.cumsum(stuecke)])
+    summe = np.append(summe, summe[-1])  # leere Linien am Ende
+    ende = np.maximum(offsets[1:] - 1, offsets[:-1])
+    return summe[ende] - summe[offsets[:-1]]
+
+
+def speichere_array(pfad, arr):
+    # Nicht in die alte Datei schreiben: andere Prozesse haben sie evtl. gemappt.
+    # Eigener Name für die temporäre Datei wie in daten._schreibe_atomar
+    fd, tmp = tempfile.mkstemp(dir=pfad.parent, prefix=pfad.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, pfad)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def lade_strassen_layer(filepath):
+    """Lädt einen Straßenrand-Layer über das Spaltenformat.
+
+    Ist das Spaltenformat nicht vorhanden oder älter als die GeoJSON-Quelle,
+    wird es zuerst neu erzeugt. Die Objekte werden prozessweit geteilt.
+    """
+    filepath = Path(filepath)
+    layer_name = filepath.stem
+    sig = signatur(filepath)
+    ziel = spalten_pfad(layer_name)
+    return lade_abgeleitet(
+        "spalten", ziel, SPALTEN_VERSION, {"signatur": list(sig)},
+        lambda: schreibe_spalten(lies_features(filepath), ziel, wert_feld(layer_name), sig),
+        lambda: StrassenLayer(ziel),
+    )
+
+
+def baue_alle():
+    for f in layer_dateien():
+        info = layer_info(f.stem)
+        if info and info[1] == "Straßenrandbelastung":
+            layer = lade_strassen_layer(f)
+            print(f" Spaltenformat aktuell: {f.stem} ({len(layer)} Abschnitte)")
+
+
+if __name__ == "__main__":
+    baue_alle()
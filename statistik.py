@@ -0,0 +1,361 @@
+import json
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from daten import BUILD_DIR, DATEN_DIR, GRENZWERT, bau_lock, layer_dateien, layer_info, schreibe_json_atomar, signatur, wert_feld
+from geojson_stream import lies_features
+import messung
+
+# Sidecar-Dateien mit den Kennzahlen je Layerdatei
+STATS_DIR = BUILD_DIR / "stats"
+# Bei Änderungen am Sidecar-Format hochzählen, damit alte Dateien neu erzeugt werden
+STATS_VERSION = 2
+
+# Verteilung der gültigen Werte je Jahr, neben Summe, Minimum und Maximum:
+#   histogramm – Anzahl Werte je Klasse (k, k+1] µg/m³ für k = 0 … HISTOGRAMM_MAX-1,
+#                die letzte Klasse nimmt alles über HISTOGRAMM_MAX auf; der Anteil
+#                über einer ganzzahligen Grenze ist damit exakt
+#   digest     – t-Digest: höchstens etwa DIGEST_KOMPRESSION Zentren [Mittel, Gewicht],
+#                an den Rändern fein, in der Mitte grob; Quantile auf Bruchteile
+#                eines µg/m³ genau, P98 und höher fast exakt
+# Beide lassen sich ohne die Layerdateien über Layer und Jahre zusammenfassen
+# (verschmelze): Histogramme durch Addieren, Digests durch erneutes Verdichten.
+HISTOGRAMM_MAX = 200
+DIGEST_KOMPRESSION = 100
+# Werte, die beim Streamen gesammelt werden, bevor sie in den Digest verdichtet werden
+DIGEST_PUFFER = 5000
+# Quantile (%) und Grenzen (µg/m³) für verteilung_dataframe
+PERZENTILE = (2, 10, 25, 50, 75, 90, 98)
+ANTEIL_GRENZEN = (20, 29, GRENZWERT)
+
+KATEGORIEN = [
+    "NO2-Flächenbelastung",
+    "NO2-Straßenrandbelastung",
+    "PM10-Flächenbelastung",
+    "PM10-Straßenrandbelastung",
+]
+
+# Zuletzt berechneter Trend und Verteilung: {Signaturen aller Quellen: DataFrame}
+_trend_cache = {}
+_verteilung_cache = {}
+_lock = threading.Lock()
+
+
+def sidecar_pfad(layer_name):
+    return STATS_DIR / f"{layer_name}.json"
+
+
+def _k(q):
+    # Skalenfunktion k1 des t-Digest: je Zentrum höchstens eine Einheit von k,
+    # die Zentren werden zu den Rändern (q -> 0, 1) hin kleiner
+    return DIGEST_KOMPRESSION / (2 * math.pi) * math.asin(2 * q - 1)
+
+
+def _k_umkehr(k):
+    return (math.sin(2 * math.pi * k / DIGEST_KOMPRESSION) + 1) / 2
+
+
+def _verdichte(zentren):
+    """Fasst nach Mittel sortierte Zentren (Mittel, Gewicht) zu einem t-Digest zusammen."""
+    gesamt = sum(g for _, g in zentren)
+    if not gesamt:
+        return []
+    digest = []
+    q_links = 0.0
+    q_grenze = _k_umkehr(_k(q_links) + 1)
+    mittel, gewicht = zentren[0]
+    for m, g in zentren[1:]:
+        if q_links + (gewicht + g) / gesamt <= q_grenze:
+            gewicht += g
+            mittel += (m - mittel) * g / gewicht
+        else:
+            digest.append([mittel, gewicht])
+            q_links += gewicht / gesamt
+            q_grenze = _k_umkehr(_k(q_links) + 1)
+            mittel, gewicht = m, g
+    digest.append([mittel, gewicht])
+    return digest
+
+
+def _histogramm_index(val):
+    return min(max(math.ceil(val) - 1, 0), HISTOGRAMM_MAX)
+
+
+class Sammler:
+    """Fasst die Werte eines Layers je Jahr zusammen, während die Features durchlaufen.
+
+    Zählt alle Features je Jahr; gültig sind Zahlen > 0. Der Speicherbedarf
+    hängt nicht von der Anzahl Features ab (der Digest wird alle DIGEST_PUFFER
+    Werte verdichtet).
+    """
+
+    def __init__(self, feld):
+        self.feld = feld
+        self.jahre = {}
+        self._puffer = {}
+
+    def fuege_hinzu(self, feature):
+        props = feature.get("properties", {})
+        jahr = str(props.get("Jahr") or props.get("jahr") or "unbekannt")
+        s = self.jahre.get(jahr)
+        if s is None:
+            s = self.jahre[jahr] = {
+                "count": 0, "valid": 0, "sum": 0.0, "min": None, "max": None,
+                "histogramm": [0] * (HISTOGRAMM_MAX + 1), "digest": [],
+            }
+            self._puffer[jahr] = []
+        s["count"] += 1
+
+        val = props.get(self.feld)
+        if isinstance(val, (int, float)) and val > 0:
+            s["valid"] += 1
+            s["sum"] += val
+            s["min"] = val if s["min"] is None else min(s["min"], val)
+            s["max"] = val if s["max"] is None else max(s["max"], val)
+            s["histogramm"][_histogramm_index(val)] += 1
+            puffer = self._puffer[jahr]
+            puffer.append(val)
+            if len(puffer) >= DIGEST_PUFFER:
+                self._leere_puffer(jahr)
+
+    def durchreichen(self, features):
+        """Gibt die Features unverändert weiter und erfasst sie dabei (für etl.py)."""
+        for feature in features:
+            self.fuege_hinzu(feature)
+            yield feature
+
+    def _leere_puffer(self, jahr):
+        s = self.jahre[jahr]
+        zentren = s["digest"] + [[val, 1] for val in self._puffer[jahr]]
+        s["digest"] = _verdichte(sorted(zentren))
+        self._puffer[jahr] = []
+
+    def ergebnis(self):
+        """{jahr: Kennzahlen} im Sidecar-Format."""
+        for jahr in self.jahre:
+            self._leere_puffer(jahr)
+            s = self.jahre[jahr]
+            s["digest"] = [[round(m, 4), g] for m, g in s["digest"]]
+            s["histogramm"] = _kuerze(s["histogramm"])
+        return self.jahre
+
+
+def _kuerze(histogramm):
+    # Leere Klassen am Ende weglassen, die Sidecars bleiben klein
+    ende = len(histogramm)
+    while ende and not histogramm[ende - 1]:
+        ende -= 1
+    return histogramm[:ende]
+
+
+def sidecar(layer_name, filepath, jahre):
+    """Sidecar-Inhalt für die Layerdatei filepath mit den Kennzahlen jahre (Sammler.ergebnis)."""
+    info = layer_info(layer_name)
+    return {
+        "version": STATS_VERSION,
+        "quelle": filepath.name,
+        "signatur": list(signatur(filepath)),
+        "kategorie": f"{info[0]}-{info[1]}",
+        "jahre": jahre,
+    }
+
+
+def berechne_statistik(layer_name):
+    """Liest eine Layerdatei einmal (gestreamt) und fasst die Werte je Jahr zusammen."""
+    filepath = DATEN_DIR / f"{layer_name}.geojson"
+    sammler = Sammler(wert_feld(layer_name))
+    for feature in lies_features(filepath):
+        sammler.fuege_hinzu(feature)
+    return sidecar(layer_name, filepath, sammler.ergebnis())
+
+
+def speichere_statistik(layer_name, stats):
+    schreibe_json_atomar(sidecar_pfad(layer_name), stats)
+
+
+def lade_statistik(layer_name):
+    """Kennzahlen einer Layerdatei aus dem Sidecar; wird neu erzeugt, wenn die Quelle sich geändert hat."""
+    pfad = sidecar_pfad(layer_name)
+    sig = list(signatur(DATEN_DIR / f"{layer_name}.geojson"))
+    stats = _lies_sidecar(pfad, sig)
+    if stats is not None:
+        messung.cache("statistik_sidecar", True)
+        return stats
+    messung.cache("statistik_sidecar", False)
+
+    with bau_lock(pfad):
+        # Inzwischen von einem anderen Thread geschrieben?
+        stats = _lies_sidecar(pfad, sig)
+        if stats is None:
+            with messung.stufe("bau_statistik"):
+                stats = berechne_statistik(layer_name)
+            speichere_statistik(layer_name, stats)
+    return stats
+
+
+def _lies_sidecar(pfad, sig):
+    try:
+        with open(pfad, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return stats if stats.get("version") == STATS_VERSION and stats.get("signatur") == sig else None
+
+
+def verschmelze(kennzahlen):
+    """Fasst Kennzahlen eines Jahres (aus mehreren Layern oder Jahren) zu einem Satz zusammen.
+
+    Anzahl, Summe, Minimum, Maximum und Histogramm sind danach exakt wie bei
+    einem gemeinsamen Durchlauf, der Digest bleibt innerhalb seiner Genauigkeit.
+    """
+    kennzahlen = list(kennzahlen)
+    gueltig = [s for s in kennzahlen if s["valid"]]
+    histogramm = [0] * (HISTOGRAMM_MAX + 1)
+    for s in gueltig:
+        for i, anzahl in enumerate(s["histogramm"]):
+            histogramm[i] += anzahl
+    return {
+        "count": sum(s["count"] for s in kennzahlen),
+        "valid": sum(s["valid"] for s in gueltig),
+        "sum": sum(s["sum"] for s in gueltig),
+        "min": min((s["min"] for s in gueltig), default=None),
+        "max": max((s["max"] for s in gueltig), default=None),
+        "histogramm": _kuerze(histogramm),
+        "digest": _verdichte(sorted(z for s in gueltig for z in s["digest"])),
+    }
+
+
+def quantile(s, anteile):
+    """Quantile (anteile in [0, 1]) der gültigen Werte aus dem Digest von s.
+
+    Zwischen den Zentren wird linear interpoliert, an den Rändern bis zu Minimum und Maximum.
+    """
+    if not s["valid"]:
+        return [math.nan] * len(anteile)
+    mittel = np.array([m for m, _ in s["digest"]])
+    gewicht = np.array([g for _, g in s["digest"]], dtype=np.float64)
+    # Ein Zentrum steht für seine Werte um die Mitte seines Gewichtsanteils
+    lage = np.cumsum(gewicht) - gewicht / 2
+    x = np.concatenate(([0.0], lage, [gewicht.sum()]))
+    y = np.concatenate(([s["min"]], mittel, [s["max"]]))
+    return np.interp(np.asarray(anteile) * gewicht.sum(), x, y).tolist()
+
+
+def anteil_ueber(s, grenze):
+    """Anteil der gültigen Werte über grenze (ganzzahlig, µg/m³) aus dem Histogramm von s."""
+    if not s["valid"]:
+        return math.nan
+    return sum(s["histogramm"][min(int(grenze), HISTOGRAMM_MAX):]) / s["valid"]
+
+
+def trend_version(layer_names):
+    """Datenversion des Trends: Layernamen mit den Signaturen ihrer Dateien."""
+    return tuple(
+        (name, signatur(DATEN_DIR / f"{name}.geojson")) for name in sorted(layer_names) if layer_info(name)
+    )
+
+
+def trend_dataframe(layer_names):
+    """Mittelwert je Kategorie (Spalten) und Jahr (Index), zusammengesetzt aus den Sidecars.
+
+    Mehrere Dateien derselben Kategorie und desselben Jahres werden über Summe und
+    Anzahl exakt zusammengefasst. Werte ohne Jahr ("unbekannt") fließen nicht ein.
+    """
+    layer_names = [name for name in layer_names if layer_info(name)]
+    key = trend_version(layer_names)
+    with _lock:
+        if key in _trend_cache:
+            messung.cache("trend", True)
+            return _trend_cache[key]
+    messung.cache("trend", False)
+
+    summen = {kategorie: {} for kategorie in KATEGORIEN}
+    for name in layer_names:
+        stats = lade_statistik(name)
+        for jahr, s in stats["jahre"].items():
+            if s["valid"] and jahr.isdigit():
+                summe, anzahl = summen[stats["kategorie"]].get(jahr, (0.0, 0))
+                summen[stats["kategorie"]][jahr] = (summe + s["sum"], anzahl + s["valid"])
+
+    df = pd.DataFrame({
+        name: {jahr: round(summe / anzahl, 2) for jahr, (summe, anzahl) in jahres.items()}
+        for name, jahres in summen.items()
+    })
+    df = df.sort_index(key=_sort_key).round(2)
+    df.index = df.index.astype(int)
+    df.index.name = "Jahr"  # nur kosmetisch für die Achsenbeschriftung
+
+    with _lock:
+        _trend_cache.clear()
+        _trend_cache[key] = df
+    return df
+
+
+def verteilung_dataframe(layer_names):
+    """Verteilung je Kategorie und Jahr, eine Zeile je Paar, zusammengesetzt aus den Sidecars.
+
+    Spalten: Kategorie, Jahr, Anzahl, Mittel, Min, P2 … P98 (PERZENTILE), Max und
+    der Anteil (%) über jeder Grenze in ANTEIL_GRENZEN ("> 40"). Der Aufwand hängt
+    nur von der Anzahl Layer ab, nicht von der Anzahl Features. Werte ohne Jahr
+    ("unbekannt") fließen nicht ein.
+    """
+    layer_names = [name for name in layer_names if layer_info(name)]
+    key = trend_version(layer_names)
+    with _lock:
+        if key in _verteilung_cache:
+            messung.cache("verteilung", True)
+            return _verteilung_cache[key]
+    messung.cache("verteilung", False)
+
+    gruppen = {}
+    for name in layer_names:
+        stats = lade_statistik(name)
+        for jahr, s in stats["jahre"].items():
+            if s["valid"] and jahr.isdigit():
+                gruppen.setdefault((stats["kategorie"], int(jahr)), []).append(s)
+
+    zeilen = []
+    for (kategorie, jahr), kennzahlen in gruppen.items():
+        s = verschmelze(kennzahlen)
+        zeile = {"Kategorie": kategorie, "Jahr": jahr, "Anzahl": s["valid"],
+                 "Mittel": s["sum"] / s["valid"], "Min": s["min"]}
+        zeile.update(zip((f"P{p}" for p in PERZENTILE), quantile(s, [p / 100 for p in PERZENTILE])))
+        zeile["Max"] = s["max"]
+        zeile.update((f"> {g}", 100 * anteil_ueber(s, g)) for g in ANTEIL_GRENZEN)
+        zeilen.append(zeile)
+
+    df = pd.DataFrame(zeilen, columns=(
+        ["Kategorie", "Jahr", "Anzahl", "Mittel", "Min"] + [f"P{p}" for p in PERZENTILE]
+        + ["Max"] + [f"> {g}" for g in ANTEIL_GRENZEN]
+    ))
+    df = df.sort_values(["Kategorie", "Jahr"], key=lambda spalte: (
+        spalte.map(KATEGORIEN.index) if spalte.name == "Kategorie" else spalte
+    ))
+    df = df.reset_index(drop=True).round(2)
+
+    with _lock:
+        _verteilung_cache.clear()
+        _verteilung_cache[key] = df
+    return df
+
+
+def _sort_key(idx):
+    out = []
+    for x in idx:
+        s = str(x)
+        out.append(int(s) if s.isdigit() else 10**9)  # Nicht-Zahlen ganz ans Ende
+    return out
+
+
+def baue_alle():
+    for f in layer_dateien():
+        if layer_info(f.stem):
+            lade_statistik(f.stem)
+            print(f" Statistik aktuell: {sidecar_pfad(f.stem).name}")
+
+
+if __name__ == "__main__":
+    baue_alle()
@@ -0,0 +1,217 @@
+import bisect
+import json
+import math
+import re
+import unicodedata
+
+import numpy as np
+
+from daten import BUILD_DIR, lade_abgeleitet, layer_slug, schreibe_json_atomar, signatur, strassen_dateien
+from spalten import lade_strassen_layer, speichere_array
+
+# Straßennamen-Katalog über alle Straßenrand-Layer (beide Schadstoffe, alle
+# Jahre). Die Layer haben je ein eigenes Wörterbuch (spalten.py, meta["strnamen"]),
+# in dem dieselben Namen je Jahr wiederkehren.
+# Hier steht jeder Name genau einmal:
+#   meta.json                  namen (sortiert nach Suchschlüssel), Layer, Signaturen der Quellen
+#   ausdehnung.npy             float64 (n_namen, 4) – west, süd, ost, nord über alle Layer
+#   <slug>/name.npy            int32 (n,)           – Name je Feature (Index in namen), -1 = ohne Namen
+#   <slug>/abschnitte.npy      int32                – Features nach Name gruppiert
+#   <slug>/start.npy           int64 (n_namen + 1,) – Name k = abschnitte[start[k]:start[k + 1]]
+# Die Präfixsuche (suche) läuft über eine sortierte Liste aller Wortanfänge
+# der Namen mit binärer Suche und wird beim Laden aufgebaut.
+NAMEN_DIR = BUILD_DIR / "strassennamen"
+NAMEN_VERSION = 2
+# Trennzeichen zwischen Wörtern eines Namens; nach jedem beginnt ein Suchpräfix
+_WORTANFANG_RE = re.compile(r"[\s\-/(.]+")
+# Höchste Zoomstufe beim Heranzoomen an eine Straße (kurze Plätze nicht formatfüllend)
+MAX_ZOOM = 17
+
+
+def suchschluessel(text):
+    """Vergleichsform für die Suche: Unicode-normalisiert, ohne Groß/Klein (ß = ss)."""
+    return unicodedata.normalize("NFKC", text).casefold().strip()
+
+
+def _name(name):
+    # Namen ohne Leerzeichen am Rand; alles andere als Text (None, NaN) gilt als ohne Namen
+    return name.strip() if isinstance(name, str) else ""
+
+
+def _gruppiere(codes, n_namen):
+    # Indizes nach Code sortiert (stabil) und Anfang jeder Gruppe; Code -1 fällt weg
+    codes = np.asarray(codes)
+    reihenfolge = np.argsort(codes, kind="stable")
+    reihenfolge = reihenfolge[codes[reihenfolge] >= 0]
+    start = np.concatenate([[0], np.cumsum(np.bincount(codes[reihenfolge], minlength=n_namen))])
+    return reihenfolge.astype(np.int32), start.astype(np.int64)
+
+
+def baue_katalog(ziel=NAMEN_DIR):
+    dateien = _dateien()
+    layers = {f.stem: lade_strassen_layer(f) for f in dateien}
+
+    # Ein Eintrag je Name ohne Leerzeichen am Rand; leere Namen bekommen keinen
+    namen = sorted(
+        {_name(name) for layer in layers.values() for name in layer.strnamen} - {""},
+        key=lambda name: (suchschluessel(name), name),
+    )
+    name_id = {name: i for i, name in enumerate(namen)}
+    ausdehnung = np.tile([np.inf, np.inf, -np.inf, -np.inf], (len(namen), 1))
+
+    for layer_name, layer in layers.items():
+        # Layer-Wörterbuch -> Katalog, dann je Feature
+        umsetzung = np.array([name_id.get(_name(name), -1) for name in layer.strnamen], dtype=np.int32)
+        codes = umsetzung[np.asarray(layer.strname_codes)]
+        abschnitte, start = _gruppiere(codes, len(namen))
+
+        ordner = ziel / layer_slug(layer_name)
+        ordner.mkdir(parents=True, exist_ok=True)
+        speichere_array(ordner / "name.npy", codes)
+        speichere_array(ordner / "abschnitte.npy", abschnitte)
+        speichere_array(ordner / "start.npy", start)
+
+        # Begrenzungsrechteck je Name über alle Stützpunkte seiner Abschnitte
+        punkte = np.repeat(codes, np.diff(np.asarray(layer.offsets)))
+        benannt = punkte >= 0
+        coords = np.asarray(layer.coords)[benannt]
+        punkte = punkte[benannt]
+        np.minimum.at(ausdehnung[:, 0], punkte, coords[:, 0])
+        np.minimum.at(ausdehnung[:, 1], punkte, coords[:, 1])
+        np.maximum.at(ausdehnung[:, 2], punkte, coords[:, 0])
+        np.maximum.at(ausdehnung[:, 3], punkte, coords[:, 1])
+
+    speichere_array(ziel / "ausdehnung.npy", ausdehnung)
+    # meta.json zuletzt schreiben – sie markiert einen vollständigen Katalog
+    schreibe_json_atomar(ziel / "meta.json", {
+        "version": NAMEN_VERSION,
+        "quellen": _quellen(),
+        "layer": sorted(layers),
+        "namen": namen,
+    }, indent=2)
+
+
+def _dateien():
+    return strassen_dateien("NO2") + strassen_dateien("PM10")
+
+
+def _quellen():
+    return {f.stem: list(signatur(f)) for f in sorted(_dateien())}
+
+
+class Strassenkatalog:
+    """Straßennamen aller Straßenrand-Layer mit Präfixsuche und Abschnitten je Name."""
+
+    def __init__(self, verzeichnis=NAMEN_DIR):
+        with open(verzeichnis / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.namen = self.meta["namen"]
+        self.ausdehnung = np.load(verzeichnis / "ausdehnung.npy", mmap_mode="r")
+        self._verzeichnis = verzeichnis
+        self._gruppen = {}
+
+        # Präfixindex: (Suchschlüssel ab einem Wortanfang, Name) sortiert
+        self._schluessel = [suchschluessel(name) for name in self.namen]
+        eintraege = []
+        for i, schluessel in enumerate(self._schluessel):
+            eintraege.append((schluessel, i))
+            for wort in _WORTANFANG_RE.finditer(schluessel):
+                if wort.end() < len(schluessel):
+                    eintraege.append((schluessel[wort.end():], i))
+        eintraege.sort()
+        self._praefixe = [schluessel for schluessel, _ in eintraege]
+        self._praefix_namen = [i for _, i in eintraege]
+
+    def __len__(self):
+        return len(self.namen)
+
+    def suche(self, text, anzahl=10):
+        """Bis zu anzahl Namen (Indizes), bei denen ein Wort mit text beginnt.
+
+        Namen, die insgesamt mit text beginnen, stehen vorn; sonst alphabetisch.
+        """
+        praefix = suchschluessel(text)
+        if not praefix:
+            return []
+        vorn, hinten = [], []
+        gesehen = set()
+        k = bisect.bisect_left(self._praefixe, praefix)
+        while k < len(self._praefixe) and self._praefixe[k].startswith(praefix):
+            i = self._praefix_namen[k]
+            if i not in gesehen:
+                gesehen.add(i)
+                (vorn if self._schluessel[i].startswith(praefix) else hinten).append(i)
+            k += 1
+        # Die Namen sind nach Suchschlüssel sortiert, der Index also alphabetisch
+        return (sorted(vorn) + sorted(hinten))[:anzahl]
+
+    def ansicht(self, name, breite_px, hoehe_px, max_zoom=MAX_ZOOM):
+        """(Mittelpunkt (lat, lon), Zoomstufe), mit der der ganze Straßenzug in die Karte passt."""
+        west, sued, ost, nord = (float(w) for w in self.ausdehnung[name])
+
+        def y(lat):
+            # Web-Mercator, in Einheiten der Weltbreite
+            return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) / (2 * math.pi)
+
+        dx = (ost - west) / 360
+        dy = y(nord) - y(sued)
+        zoom = min(
+            math.log2(breite_px / 256 / dx) if dx > 0 else max_zoom,
+            math.log2(hoehe_px / 256 / dy) if dy > 0 else max_zoom,
+        )
+        return ((sued + nord) / 2, (west + ost) / 2), max(0, min(max_zoom, math.floor(zoom)))
+
+    def _gruppe(self, ordner, datei):
+        key = (ordner, datei)
+        if key not in self._gruppen:
+            pfad = self._verzeichnis / ordner
+            self._gruppen[key] = (np.load(pfad / datei, mmap_mode="r"), np.load(pfad / "start.npy", mmap_mode="r"))
+        return self._gruppen[key]
+
+    def abschnitte(self, name, layer_name):
+        """Indizes der Features mit diesem Namen im Straßen-Layer layer_name."""
+        if layer_name not in self.meta["layer"]:
+            return np.empty(0, dtype=np.int32)
+        abschnitte, start = self._gruppe(layer_slug(layer_name), "abschnitte.npy")
+        return np.asarray(abschnitte[start[name]:start[name + 1]])
+
+    def layer_mit(self, name):
+        """Straßen-Layer, in denen der Name vorkommt."""
+        return [
+            layer_name for layer_name in self.meta["layer"]
+            if len(self.abschnitte(name, layer_name))
+        ]
+
+    def feature_collection(self, name, layer_name):
+        """Abschnitte des Namens im Layer als FeatureCollection (properties: strname, jahr)."""
+        layer = lade_strassen_layer(next(f for f in _dateien() if f.stem == layer_name))
+        coords, offsets = layer.geometrie()
+        offsets = offsets.tolist()
+        return {"type": "FeatureCollection", "features": [
+            {
+                "type": "Feature",
+                "id": str(i),
+                "geometry": {"type": "LineString", "coordinates": coords[offsets[i]:offsets[i + 1]].tolist()},
+                "properties": {"strname": self.namen[name], "jahr": layer.jahr},
+            }
+            for i in self.abschnitte(name, layer_name).tolist()
+        ]}
+
+
+def lade_katalog():
+    """Straßennamen-Katalog; wird bei geänderten Quellen neu gebaut und prozessweit geteilt."""
+    return lade_abgeleitet(
+        "strassennamen", NAMEN_DIR, NAMEN_VERSION, {"quellen": _quellen()},
+        baue_katalog, lambda: Strassenkatalog(NAMEN_DIR),
+    )
+
+
+def baue_alle():
+    katalog = lade_katalog()
+    eintraege = sum(len(layer) for layer in map(lade_strassen_layer, _dateien()))
+    print(f" Straßennamen aktuell: {len(katalog)} Namen für {eintraege} Abschnitte "
+          f"in {len(katalog.meta['layer'])} Layern")
+
+
+if __name__ == "__main__":
+    baue_alle()
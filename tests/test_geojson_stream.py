@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import etl
+from geojson_stream import GeoJSONWriter, lies_features
+
+
+def test_rundreise(tmp_path):
+    pfad = tmp_path / "layer.geojson"
+    features = [
+        {"type": "Feature", "properties": {"strname": "Wiener Platz", "no2_i1": 31.4, "jahr": "2015"},
+         "geometry": {"type": "LineString", "coordinates": [[13.73, 51.04], [13.74, 51.05]]}},
+        {"type": "Feature", "properties": {"strname": "Münchner Straße", "no2_i1": None, "jahr": "2015"},
+         "geometry": {"type": "LineString", "coordinates": [[13.72, 51.03], [13.73, 51.03]]}},
+    ]
+    with GeoJSONWriter(pfad, name="test") as writer:
+        writer.schreibe_alle(features)
+
+    assert writer.anzahl == 2
+    assert list(lies_features(pfad)) == features
+    # Kleine Blöcke: Werte über Blockgrenzen hinweg
+    assert list(lies_features(pfad, blockgroesse=7)) == features
+    assert json.loads(pfad.read_text(encoding="utf-8"))["name"] == "test"
+
+
+def test_nan_wird_nicht_geschrieben(tmp_path):
+    pfad = tmp_path / "layer.geojson"
+    with pytest.raises(ValueError):
+        with GeoJSONWriter(pfad) as writer:
+            writer.schreibe({"type": "Feature", "properties": {"wert": float("nan")}, "geometry": None})
+    assert not pfad.exists()
+    assert not list(tmp_path.iterdir())
+
+
+def test_etl_leerer_strassenname(tmp_path):
+    eingabe = tmp_path / "NO2 - Straßenrandbelastung (2015).csv"
+    eingabe.write_text(
+        "strname;no2_i1;shape\n"
+        'Wiener Platz ;31,4;"SRID=4326;LINESTRING (13.73 51.04, 13.74 51.05)"\n'
+        ';28,1;"SRID=4326;LINESTRING (13.72 51.03, 13.73 51.03)"\n',
+        encoding="utf-8",
+    )
+    [job] = etl.finde_jobs(tmp_path)
+    ausgabe = tmp_path / "ausgabe"
+
+    assert etl.konvertiere(job, ausgabe) == 2
+    text = (ausgabe / "NO2-Straßenrandbelastung(2015).geojson").read_text(encoding="utf-8")
+
+    def kein_nan(wert):
+        raise ValueError(wert)
+
+    # Striktes JSON: NaN/Infinity würden hier scheitern
+    features = json.loads(text, parse_constant=kein_nan)["features"]
+    assert [f["properties"]["strname"] for f in features] == ["Wiener Platz", ""]
+    assert [f["properties"]["no2_i1"] for f in features] == [31.4, 28.1]
+    assert list(lies_features(ausgabe / "NO2-Straßenrandbelastung(2015).geojson")) == features
@@ -0,0 +1,34 @@
+import numpy as np
+
+from statistik import Sammler, anteil_ueber, quantile, verschmelze
+
+
+def _kennzahlen(werte):
+    sammler = Sammler("wert")
+    for wert in werte:
+        sammler.fuege_hinzu({"properties": {"wert": wert, "Jahr": "2019"}})
+    return sammler.ergebnis()["2019"]
+
+
+def test_verschmelze_und_quantile():
+    werte = np.round(np.random.default_rng(42).lognormal(3, 0.4, 20_000), 2)
+    teile = [_kennzahlen(teil.tolist()) for teil in np.array_split(werte, 3)]
+    s = verschmelze(teile)
+
+    assert s["count"] == s["valid"] == len(werte)
+    assert np.isclose(s["sum"], werte.sum())
+    assert s["min"] == werte.min() and s["max"] == werte.max()
+    assert sum(s["histogramm"]) == len(werte)
+    assert anteil_ueber(s, 40) == np.mean(werte > 40)
+
+    anteile = [0.02, 0.1, 0.25, 0.5, 0.75, 0.9, 0.98]
+    erwartet = np.percentile(werte, [a * 100 for a in anteile])
+    np.testing.assert_allclose(quantile(s, anteile), erwartet, atol=0.5)
+    assert quantile(s, [0, 1]) == [werte.min(), werte.max()]
+
+
+def test_verschmelze_ohne_gueltige_werte():
+    s = verschmelze([_kennzahlen([None, 0, "x"])])
+    assert s["count"] == 3 and s["valid"] == 0
+    assert s["min"] is None and s["digest"] == []
+    assert np.isnan(quantile(s, [0.5])).all()
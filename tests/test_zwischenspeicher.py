@@ -0,0 +1,48 @@
+import pytest
+
+import zwischenspeicher
+
+
+@pytest.fixture
+def speicher(monkeypatch):
+    zwischenspeicher.leeren()
+    monkeypatch.setattr(zwischenspeicher, "_budget", 300)
+    yield zwischenspeicher
+    zwischenspeicher.leeren()
+
+
+def test_verdraengt_am_laengsten_unbenutzten(speicher):
+    for key in "abc":
+        speicher.lege_ab("test", key, key, groesse_bytes=100)
+    # a wird benutzt, b ist danach der älteste Eintrag
+    assert speicher.hole("test", "a") == (True, "a")
+    speicher.lege_ab("test", "d", "d", groesse_bytes=100)
+
+    assert speicher.hole("test", "b") == (False, None)
+    assert [speicher.hole("test", key)[0] for key in "acd"] == [True, True, True]
+    assert speicher.statistik()["test"]["verdraengt"] == 1
+    assert speicher.statistik()["gesamt"]["bytes"] == 300
+
+
+def test_zu_grosser_eintrag_wird_nicht_abgelegt(speicher):
+    speicher.lege_ab("test", "a", "a", groesse_bytes=100)
+    assert speicher.lege_ab("test", "riesig", "r", groesse_bytes=301) == "r"
+    assert speicher.hole("test", "riesig") == (False, None)
+    assert speicher.hole("test", "a") == (True, "a")
+
+
+def test_anderer_stand_ersetzt_eintrag(speicher):
+    gebaut = []
+
+    def bauen():
+        gebaut.append(len(gebaut))
+        return f"wert{len(gebaut)}"
+
+    assert speicher.hole_oder_baue("test", "k", bauen, stand=("datei", 1)) == "wert1"
+    assert speicher.hole_oder_baue("test", "k", bauen, stand=("datei", 1)) == "wert1"
+    # Geänderte Signatur: kein Treffer, der alte Eintrag wird ersetzt statt verdrängt
+    assert speicher.hole("test", "k", stand=("datei", 2)) == (False, None)
+    assert speicher.hole_oder_baue("test", "k", bauen, stand=("datei", 2)) == "wert2"
+    assert len(gebaut) == 2
+    assert speicher.hole("test", "k", stand=("datei", 1)) == (False, None)
+    assert speicher.statistik()["test"]["eintraege"] == 1
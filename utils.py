@@ -22,4 +22,99 @@ def linestring_to_coordinates(linestring):
                 coords.append([lon, lat])
             except Exception:
                 continue
-    return coords
\ No newline at end of file
+    return coords
+
+
+# --- Spaltenweise Varianten für ganze CSV-Spalten ---
+# Liefern exakt dieselben Werte wie safe_float / linestring_to_coordinates,
+# arbeiten aber auf der ganzen Spalte statt Zeile für Zeile.
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 – nur für die schnellere String-Verarbeitung
+    _STRING = "string[pyarrow]"
+except ImportError:
+    _STRING = "string"
+
+_ZAHL = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_PAAR = rf'\s*{_ZAHL}\s+{_ZAHL}\s*'
+# Koordinatenliste ohne Sonderfälle: nur "lon lat"-Paare, durch Kommas getrennt
+_EINFACHE_LISTE = rf'{_PAAR}(?:,{_PAAR})*'
+
+
+def safe_float_series(values):
+    """safe_float für eine ganze Spalte; gibt eine Liste zurück."""
+    s = pd.Series(values, dtype=object)
+    text = s.astype(str).str.replace(",", ".", regex=False)
+    nums = pd.to_numeric(text, errors="coerce").to_numpy(dtype=float)
+
+    # Schnellpfad für alle normalen Zahlen, Rest (leer, Text, nan, inf ...) einzeln
+    result = [None] * len(nums)
+    normal = np.isfinite(nums)
+    for i in np.flatnonzero(normal & (nums > 0)).tolist():
+        result[i] = round(float(nums[i]), 2)
+    for i in np.flatnonzero(~normal).tolist():
+        result[i] = safe_float(s.iat[i])
+    return result
+
+
+def linestrings_to_coordinates(values):
+    """linestring_to_coordinates für eine ganze Spalte.
+
+    Gibt (coords, offsets) zurück: coords ist ein float64-Array (n_punkte, 2),
+    die Koordinaten von Zeile i stehen in coords[offsets[i]:offsets[i + 1]].
+    """
+    s = pd.Series(values, dtype=object)
+    # Mit pyarrow laufen die Regex-Operationen komplett in C++
+    texte = s.where(s.map(lambda v: isinstance(v, str)), None).astype(_STRING)
+    inner = texte.str.extract(r'LINESTRING\s*\(([^)]+)\)', expand=False)
+    einfach = inner.str.fullmatch(_EINFACHE_LISTE).eq(True).to_numpy(dtype=bool, na_value=False)
+
+    anzahl = np.zeros(len(s), dtype=np.int64)
+    anzahl[einfach] = inner[einfach].str.count(",").to_numpy(dtype=np.int64) + 1
+
+    # Sonderfälle (Klammern, ungültige Paare, kein LINESTRING ...) wie bisher einzeln
+    sonderfaelle = {}
+    for i in np.flatnonzero(~einfach).tolist():
+        value = s.iat[i]
+        coords = linestring_to_coordinates(value) if isinstance(value, str) else []
+        sonderfaelle[i] = coords
+        anzahl[i] = len(coords)
+
+    offsets = np.zeros(len(s) + 1, dtype=np.int64)
+    np.cumsum(anzahl, out=offsets[1:])
+    coords = np.empty((offsets[-1], 2), dtype=np.float64)
+
+    # Schnellpfad: alle einfachen Zeilen in einem Stück parsen
+    if einfach.any():
+        zahlen = np.fromstring(inner[einfach].str.cat(sep=",").replace(",", " "), sep=" ")
+        zeile = np.repeat(np.arange(len(s)), anzahl)
+        coords[einfach[zeile]] = zahlen.reshape(-1, 2)
+    for i, werte in sonderfaelle.items():
+        if werte:
+            coords[offsets[i]:offsets[i + 1]] = werte
+    return coords, offsets
+
+
+def linien_features(coords, offsets, properties):
+    """Erzeugt LineString-Features für alle Zeilen mit Koordinaten (Zeilen ohne werden übersprungen).
+
+    Die Features werden einzeln erzeugt (Generator), damit sie direkt
+    gestreamt geschrieben werden können.
+    """
+    koordinaten = coords.tolist()
+    offsets = offsets.tolist()
+    return (
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "LineString",
+                "coordinates": koordinaten[offsets[i]:offsets[i + 1]]
+            },
+            "properties": props
+        }
+        for i, props in enumerate(properties)
+        if offsets[i + 1] > offsets[i]
+    )
@@ -0,0 +1,113 @@
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+from daten import BUILD_DIR, DATEN_DIR, BOUNDARY_FILE, lade_geojson, schreibe_json_atomar, signatur
+
+# Detailstufen (Zoomstufen), für die vereinfachte Geometrien erzeugt werden.
+# Ab ZOOM_VOLL wird die Originalgeometrie verwendet.
+LOD_STUFEN = (10, 12, 14)
+ZOOM_VOLL = 16
+LOD_DIR = BUILD_DIR / "lod"
+
+
+def pixel_grad(zoom):
+    """Breite eines 256er-Kachelpixels in Grad Länge bei der gegebenen Zoomstufe."""
+    return 360 / (256 * 2 ** zoom)
+
+
+def toleranz(zoom):
+    # Abweichungen unter einem halben Pixel sind auf der Karte nicht sichtbar
+    return pixel_grad(zoom) / 2
+
+
+def nachkommastellen(zoom):
+    # Koordinaten auf ein Zehntel Pixel runden
+    return math.ceil(-math.log10(pixel_grad(zoom) / 10))
+
+
+def lod_stufe(zoom):
+    """Passende Detailstufe für eine Kartenzoomstufe; None = Originalgeometrie."""
+    if zoom is None:
+        return None
+    if zoom >= ZOOM_VOLL:
+        return None
+    stufe = LOD_STUFEN[0]
+    for z in LOD_STUFEN:
+        if z <= zoom:
+            stufe = z
+    return stufe
+
+
+def vereinfache_linien(coords, offsets, zoom):
+    """Vereinfacht und quantisiert LineStrings im Spaltenformat (coords + offsets).
+
+    Douglas-Peucker mit preserve_topology behält Anfangs- und Endpunkte jeder
+    Linie, Knotenpunkte zwischen Abschnitten bleiben also erhalten. Nach dem
+    Runden doppelte Punkte werden entfernt; jede Linie behält mindestens zwei Punkte.
+    """
+    coords = np.asarray(coords)
+    offsets = np.asarray(offsets)
+    n = len(offsets) - 1
+    laengen = np.diff(offsets)
+    linien = shapely.linestrings(coords, indices=np.repeat(np.arange(n), laengen))
+    linien = shapely.simplify(linien, toleranz(zoom), preserve_topology=True)
+    neu, index = shapely.get_coordinates(linien, return_index=True)
+    neu = np.round(neu, nachkommastellen(zoom))
+
+    behalten = np.ones(len(neu), dtype=bool)
+    behalten[1:] = ~((neu[1:] == neu[:-1]).all(axis=1) & (index[1:] == index[:-1]))
+    neu, index = neu[behalten], index[behalten]
+
+    # Zu einem Punkt geschrumpfte Linien bekommen ihren Punkt doppelt
+    anzahl = np.bincount(index, minlength=n)
+    wiederholen = np.where(anzahl[index] == 1, 2, 1)
+    neu = np.repeat(neu, wiederholen, axis=0)
+    anzahl = np.maximum(anzahl, 2)
+
+    neue_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(anzahl, out=neue_offsets[1:])
+    return neu, neue_offsets
+
+
+def vereinfache_geometrie(geometry, zoom):
+    """Vereinfacht eine einzelne GeoJSON-Geometrie (z. B. die Stadtgrenze)."""
+    g = shapely.geometry.shape(geometry)
+    g = shapely.simplify(g, toleranz(zoom), preserve_topology=True)
+    stellen = nachkommastellen(zoom)
+    g = shapely.transform(g, lambda c: np.round(c, stellen))
+    return shapely.geometry.mapping(g)
+
+
+def grenze_pfad(zoom):
+    return LOD_DIR / f"{Path(BOUNDARY_FILE).stem}.z{zoom}.geojson"
+
+
+def lade_grenze(zoom=None):
+    """Stadtgrenze in der zur Zoomstufe passenden Detailstufe (über den GeoJSON-Cache)."""
+    quelle = DATEN_DIR / BOUNDARY_FILE
+    stufe = lod_stufe(zoom)
+    if stufe is None:
+        return lade_geojson(quelle)
+
+    pfad = grenze_pfad(stufe)
+    sig = list(signatur(quelle))
+    aktuell = False
+    if pfad.exists():
+        with open(pfad, "r", encoding="utf-8") as f:
+            aktuell = json.load(f).get("quelle_signatur") == sig
+    if not aktuell:
+        data = lade_geojson(quelle)
+        features = [
+            dict(feature, geometry=vereinfache_geometrie(feature["geometry"], stufe))
+            for feature in data["features"]
+        ]
+        schreibe_json_atomar(pfad, {
+            "type": "FeatureCollection",
+            "quelle_signatur": sig,
+            "features": features,
+        }, separators=(",", ":"))
+    return lade_geojson(pfad)
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import messung
+from daten import BOUNDARY_FILE, DATEN_DIR, layer_dateien, layer_info, strassen_dateien
+
+# Vorwärmen: alle Ableitungen in build/ erzeugen und die prozessweiten Caches
+# füllen, bevor ein Besucher darauf wartet.
+#   python vorwaermen.py            – vor "streamlit run" (z. B. im devcontainer)
+#   python vorwaermen.py --pruefen  – misst zusätzlich den ersten Lauf von Main.py
+#                                     in einem frischen Prozess gegen ERSTE_ANZEIGE_ZIEL_S
+# Main.py ruft nach jedem Lauf nach_erstem_lauf() auf; beim ersten Lauf eines
+# Server-Prozesses startet sie vorwaermen() in einem Hintergrund-Thread:
+# Module und Daten der noch nicht benutzten Teile (Kacheln, Punktabfrage, ...)
+# werden dann geladen, während der Besucher schon die Seite sieht. Der Thread
+# baut dieselben Dateien wie die Sessions; jedes Ziel wird unter daten.bau_lock
+# gebaut und über temporäre Dateien mit eigenem Namen geschrieben.
+# LUFTDATEN_VORWAERMEN=0 schaltet das Vorwärmen in der App ab.
+ERSTE_ANZEIGE_ZIEL_S = 5.0
+
+_gestartet = False
+_lock = threading.Lock()
+
+
+def _statistik():
+    from diagramm import boxplot_vega, perzentil_vega, trend_png, trend_vega
+    from statistik import lade_statistik
+
+    namen = sorted(f.stem for f in layer_dateien() if layer_info(f.stem))
+    for name in namen:
+        lade_statistik(name)
+    trend_png(namen)
+    trend_vega(namen)
+    perzentil_vega(namen)
+    boxplot_vega(namen)
+
+
+def _spalten():
+    from spalten import lade_strassen_layer
+
+    for schadstoff in ("NO2", "PM10"):
+        for f in strassen_dateien(schadstoff):
+            lade_strassen_layer(f)
+
+
+def _raster():
+    from raster import lade_raster
+
+    lade_raster()
+
+
+def _zonen():
+    from zonen import lade_zonen
+
+    lade_zonen()
+
+
+def _segmente():
+    from segmente import lade_segmente
+
+    for schadstoff in ("NO2", "PM10"):
+        if len(strassen_dateien(schadstoff)) >= 2:
+            lade_segmente(schadstoff)
+
+
+def _strassennamen():
+    from strassennamen import lade_katalog
+
+    lade_katalog()
+
+
+def _waben():
+    from waben import lade_waben
+
+    lade_waben()
+
+
+def _karte():
+    # Module der Karte und die Stadtgrenze der Startansicht
+    import streamlit_folium  # noqa: F401
+    from vereinfachung import lade_grenze
+
+    if (DATEN_DIR / BOUNDARY_FILE).exists():
+        lade_grenze(12)
+
+
+def _abfrage():
+    from abfrage import lade_abfrageindex
+
+    lade_abfrageindex()
+
+
+def _kacheln():
+    from kacheln import baue_kacheln
+
+    for f in layer_dateien():
+        if layer_info(f.stem):
+            baue_kacheln(f)
+
+
+def _layerdateien():
+    from layerdateien import baue_layerdatei
+
+    for f in layer_dateien():
+        if layer_info(f.stem):
+            baue_layerdatei(f)
+
+
+# In der Reihenfolge, in der die App sie braucht
+SCHRITTE = [
+    ("karte", _karte),
+    ("statistik", _statistik),
+    ("spalten", _spalten),
+    ("raster", _raster),
+    ("waben", _waben),
+    ("zonen", _zonen),
+    ("segmente", _segmente),
+    ("strassennamen", _strassennamen),
+    ("abfrage", _abfrage),
+    ("kacheln", _kacheln),
+    ("layerdateien", _layerdateien),
+]
+
+
+def vorwaermen(melden=print):
+    """Führt alle SCHRITTE aus; Fehler eines Schritts werden gemeldet und brechen nicht ab."""
+    fehler = 0
+    for name, schritt in SCHRITTE:
+        start = time.perf_counter()
+        try:
+            with messung.stufe(f"vorwaermen_{name}"):
+                schritt()
+        except Exception as e:
+            fehler += 1
+            melden(f" Vorwärmen {name} fehlgeschlagen: {e}")
+            continue
+        melden(f" Vorgewärmt: {name} ({time.perf_counter() - start:.2f} s)")
+    return fehler
+
+
+def nach_erstem_lauf():
+    """True nur beim ersten Aufruf je Prozess; startet dann vorwaermen() in einem Hintergrund-Thread."""
+    global _gestartet
+    with _lock:
+        if _gestartet:
+            return False
+        _gestartet = True
+    if os.environ.get("LUFTDATEN_VORWAERMEN") == "0":
+        return True
+    threading.Thread(
+        target=vorwaermen, kwargs={"melden": lambda text: None}, name="vorwaermen", daemon=True
+    ).start()
+    return True
+
+
+def _erster_lauf():
+    # Läuft im frischen Messprozess: Main.py einmal ausführen wie beim ersten Besucher
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["LUFTDATEN_VORWAERMEN"] = "0"
+    start = time.perf_counter()
+    app = AppTest.from_file(str(Path(__file__).with_name("Main.py")), default_timeout=600)
+    app.run()
+    sekunden = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return sekunden
+
+
+def miss_erste_anzeige():
+    """Dauer des ersten Laufs von Main.py in einem frischen Prozess (Sekunden)."""
+    ergebnis = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--erster-lauf"],
+        cwd=Path(__file__).parent, capture_output=True, text=True,
+    )
+    if ergebnis.returncode:
+        raise RuntimeError(f"Erster Lauf fehlgeschlagen:\n{ergebnis.stderr}")
+    return json.loads(ergebnis.stdout.strip().splitlines()[-1])["sekunden"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ableitungen und Caches vor dem Serverstart erzeugen")
+    parser.add_argument("--pruefen", action="store_true",
+                        help=f"ersten Lauf von Main.py messen (Ziel: {ERSTE_ANZEIGE_ZIEL_S} s)")
+    parser.add_argument("--erster-lauf", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.erster_lauf:
+        print(json.dumps({"sekunden": round(_erster_lauf(), 3)}))
+        return 0
+
+    fehler = vorwaermen()
+    messung.exportiere("vorwaermen")
+    if fehler:
+        return 1
+    if args.pruefen:
+        sekunden = miss_erste_anzeige()
+        print(f" Erster Lauf von Main.py: {sekunden:.2f} s (Ziel {ERSTE_ANZEIGE_ZIEL_S} s)")
+        if sekunden > ERSTE_ANZEIGE_ZIEL_S:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
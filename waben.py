@@ -0,0 +1,212 @@
+import json
+import math
+
+import numpy as np
+
+from abfrage import entprojiziere, projiziere
+from daten import BUILD_DIR, lade_abgeleitet, layer_info, layer_slug, schreibe_json_atomar, signatur, strassen_dateien
+from klassen import farbklassen
+from spalten import lade_strassen_layer, speichere_array
+import zwischenspeicher
+
+# Straßenrand-Layer bei kleinen Zoomstufen als Sechseck-Waben statt als
+# tausende sich überdeckende Linien. Je Layer und Detailstufe (vereinfachung.py)
+# ein Wabengitter in der lokalen Projektion von abfrage.py:
+#   <slug>/z<stufe>/q.npy, r.npy  int32       – axiale Koordinaten der belegten Waben
+#   <slug>/z<stufe>/werte.npy     float64 (n, 3) – längengewichtetes Mittel, Maximum, Straßenlänge (m)
+# Jede Linie wird in Stücke von höchstens einem Viertel Wabenbreite geteilt und
+# das Stück der Wabe seines Mittelpunkts zugeschlagen. Die Wabenbreite wächst
+# mit der Detailstufe wie die Pixelgröße – eine Wabe ist auf der Karte immer
+# etwa gleich groß, die Anzahl Waben im Kartenausschnitt bleibt damit begrenzt,
+# egal wie dicht das Straßennetz ist.
+WABEN_DIR = BUILD_DIR / "waben"
+WABEN_VERSION = 1
+# Detailstufe -> Abstand benachbarter Wabenmittelpunkte (m); etwa 16–32 px auf
+# der Karte. Ab der ersten Detailstufe ohne Eintrag zeigt die Karte die Abschnitte.
+WABEN_STUFEN = {10: 1600, 12: 400}
+KENNZAHLEN = ("mittel", "max", "laenge_m")
+
+
+def _radius(abstand):
+    # Umkreisradius der Sechsecke (Spitze oben) aus dem Mittelpunktabstand
+    return abstand / math.sqrt(3)
+
+
+def wabe(xy, abstand):
+    """Axiale Koordinaten (q, r) der Waben, in denen die Punkte xy (m) liegen."""
+    s = _radius(abstand)
+    q = (math.sqrt(3) / 3 * xy[:, 0] - xy[:, 1] / 3) / s
+    r = (2 / 3 * xy[:, 1]) / s
+    # Runden in Würfelkoordinaten: die Komponente mit der größten Abweichung ergibt sich aus den anderen
+    w = -q - r
+    rq, rr, rw = np.round(q), np.round(r), np.round(w)
+    dq, dr, dw = np.abs(rq - q), np.abs(rr - r), np.abs(rw - w)
+    q_fix = (dq > dr) & (dq > dw)
+    r_fix = ~q_fix & (dr > dw)
+    rq = np.where(q_fix, -rr - rw, rq)
+    rr = np.where(r_fix, -rq - rw, rr)
+    return rq.astype(np.int32), rr.astype(np.int32)
+
+
+def mittelpunkte(q, r, abstand):
+    """Mittelpunkte (m) der Waben (q, r)."""
+    s = _radius(abstand)
+    q, r = np.asarray(q, dtype=np.float64), np.asarray(r, dtype=np.float64)
+    return np.column_stack((s * math.sqrt(3) * (q + r / 2), s * 1.5 * r))
+
+
+def sechsecke(q, r, abstand):
+    """Ecken (n, 7, 2) der Waben in WGS84 (lon, lat), geschlossene Ringe."""
+    s = _radius(abstand)
+    winkel = np.radians(30 + 60 * np.arange(7))
+    mitte = mittelpunkte(q, r, abstand)
+    ecken = mitte[:, None, :] + s * np.stack([np.cos(winkel), np.sin(winkel)], axis=-1)
+    return entprojiziere(ecken.reshape(-1, 2)).reshape(-1, 7, 2)
+
+
+def binne(strassen, abstand):
+    """(q, r, Kennzahlen (n, 3)) der belegten Waben eines Straßen-Layers."""
+    gueltig = ~np.isnan(np.asarray(strassen.werte))
+    offsets = np.asarray(strassen.offsets)
+    xy = projiziere(strassen.coords)
+    # Stücke zwischen aufeinanderfolgenden Stützpunkten derselben Linie mit Wert
+    feature = np.repeat(np.arange(len(strassen)), np.diff(offsets))
+    stueck = (feature[1:] == feature[:-1]) & gueltig[feature[:-1]]
+    a, b, feature = xy[:-1][stueck], xy[1:][stueck], feature[:-1][stueck]
+    laenge = np.hypot(*(b - a).T)
+
+    # In Teilstücke von höchstens abstand / 4 zerlegen, Mittelpunkte bestimmen
+    teile = np.maximum(np.ceil(laenge / (abstand / 4)), 1).astype(np.int64)
+    i = np.repeat(np.arange(len(a)), teile)
+    k = np.arange(len(i)) - np.repeat(np.cumsum(teile) - teile, teile)
+    t = ((k + 0.5) / teile[i])[:, None]
+    q, r = wabe(a[i] + t * (b[i] - a[i]), abstand)
+    l = laenge[i] / teile[i]
+    w = np.asarray(strassen.werte)[feature[i]]
+
+    belegt, zelle = np.unique(np.column_stack((q, r)), axis=0, return_inverse=True)
+    zelle = zelle.ravel()
+    n = len(belegt)
+    summe_l = np.bincount(zelle, weights=l, minlength=n)
+    maximum = np.full(n, -np.inf)
+    np.maximum.at(maximum, zelle, w)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mittel = np.bincount(zelle, weights=w * l, minlength=n) / summe_l
+    return belegt[:, 0], belegt[:, 1], np.column_stack((mittel, maximum, summe_l))
+
+
+def baue_waben(ziel=WABEN_DIR):
+    for filepath in _dateien():
+        strassen = lade_strassen_layer(filepath)
+        for stufe, abstand in WABEN_STUFEN.items():
+            q, r, werte = binne(strassen, abstand)
+            ordner = ziel / layer_slug(filepath.stem) / f"z{stufe}"
+            ordner.mkdir(parents=True, exist_ok=True)
+            speichere_array(ordner / "q.npy", q)
+            speichere_array(ordner / "r.npy", r)
+            speichere_array(ordner / "werte.npy", werte)
+    # meta.json zuletzt schreiben – sie markiert einen vollständigen Satz
+    schreibe_json_atomar(ziel / "meta.json", {
+        "version": WABEN_VERSION,
+        "quellen": _quellen(),
+        "stufen": _stufen(),
+        "kennzahlen": list(KENNZAHLEN),
+    }, indent=2)
+
+
+def _dateien():
+    return strassen_dateien("NO2") + strassen_dateien("PM10")
+
+
+def _quellen():
+    return {f.stem: list(signatur(f)) for f in sorted(_dateien())}
+
+
+def _stufen():
+    return {str(stufe): abstand for stufe, abstand in WABEN_STUFEN.items()}
+
+
+class Waben:
+    """Wabenkennzahlen aller Straßenrand-Layer je Detailstufe."""
+
+    def __init__(self, verzeichnis=WABEN_DIR):
+        with open(verzeichnis / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.verzeichnis = verzeichnis
+        self.stufen = {int(stufe): abstand for stufe, abstand in self.meta["stufen"].items()}
+        self._stand = tuple(sorted((name, tuple(sig)) for name, sig in self.meta["quellen"].items()))
+        self._gitter = {}
+
+    def gitter(self, layer_name, stufe):
+        """(q, r, Kennzahlen, Mittelpunkte (lon, lat)) eines Layers und einer Detailstufe."""
+        key = (layer_name, stufe)
+        if key not in self._gitter:
+            ordner = self.verzeichnis / layer_slug(layer_name) / f"z{stufe}"
+            q, r = np.load(ordner / "q.npy"), np.load(ordner / "r.npy")
+            self._gitter[key] = (
+                q, r, np.load(ordner / "werte.npy"),
+                entprojiziere(mittelpunkte(q, r, self.stufen[stufe])),
+            )
+        return self._gitter[key]
+
+    def feature_collection(self, layer_name, stufe, ausschnitt=None, grenze=None):
+        """Waben als Polygone; properties: KENNZAHLEN (gerundet), jahr und klasse (nach dem Maximum).
+
+        ausschnitt (west, süd, ost, nord) beschränkt auf Waben mit Mittelpunkt darin,
+        mit grenze bleiben nur Waben, deren höchster Abschnitt darüber liegt.
+        """
+        key = (layer_name, stufe, ausschnitt, grenze)
+        return zwischenspeicher.hole_oder_baue(
+            "waben_collection", key, lambda: self._baue_collection(*key), stand=self._stand
+        )
+
+    def _baue_collection(self, layer_name, stufe, ausschnitt, grenze):
+        q, r, werte, mitte = self.gitter(layer_name, stufe)
+        auswahl = np.ones(len(q), dtype=bool)
+        if ausschnitt is not None:
+            west, sued, ost, nord = ausschnitt
+            auswahl &= (mitte[:, 0] >= west) & (mitte[:, 0] <= ost) & (mitte[:, 1] >= sued) & (mitte[:, 1] <= nord)
+        if grenze is not None:
+            auswahl &= werte[:, 1] > grenze
+        q, r, werte = q[auswahl], r[auswahl], werte[auswahl]
+        ecken = sechsecke(q, r, self.stufen[stufe]).round(6).tolist()
+        jahr = layer_info(layer_name)[2]
+        return {"type": "FeatureCollection", "features": [
+            {
+                "type": "Feature",
+                "id": f"{a}/{b}",
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+                "properties": {
+                    "mittel": round(m, 1),
+                    "max": round(x, 1),
+                    "laenge_m": round(l),
+                    "jahr": jahr,
+                    "klasse": k,
+                },
+            }
+            for a, b, ring, (m, x, l), k in zip(
+                q.tolist(), r.tolist(), ecken, werte.tolist(), farbklassen(werte[:, 1]).tolist()
+            )
+        ]}
+
+
+def lade_waben():
+    """Waben aller Straßenrand-Layer; werden bei geänderten Quellen neu berechnet und prozessweit geteilt."""
+    return lade_abgeleitet(
+        "waben", WABEN_DIR, WABEN_VERSION,
+        {"quellen": _quellen(), "stufen": _stufen()},
+        baue_waben, lambda: Waben(WABEN_DIR),
+    )
+
+
+def baue_alle():
+    waben = lade_waben()
+    for f in _dateien():
+        anzahl = ", ".join(
+            f"z{stufe}: {len(waben.gitter(f.stem, stufe)[0])}" for stufe in waben.stufen
+        )
+        print(f" Waben aktuell: {f.stem} ({anzahl})")
+
+
+if __name__ == "__main__":
+    baue_alle()
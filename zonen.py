@@ -0,0 +1,179 @@
+import json
+
+import numpy as np
+import shapely
+
+from daten import BUILD_DIR, GRENZWERT, flaechen_dateien, lade_abgeleitet, layer_info, layer_slug, schreibe_json_atomar, signatur, zonen_strassen_dateien
+from klassen import farbklassen
+from raster import ZELLE_M, lade_raster
+from spalten import lade_strassen_layer, speichere_array
+import zwischenspeicher
+
+# Räumlicher Join der Straßenrand-Abschnitte mit den 1-km-Zellen der
+# Flächenbelastung. Jeder Abschnitt wird an den Zellgrenzen geteilt:
+#   <slug>/feature.npy  int32   – Abschnitt (Index im Straßen-Layer)
+#   <slug>/zeile.npy    int16   – Zelle im Gitter des Jahres (raster.py)
+#   <slug>/spalte.npy   int16
+#   <slug>/laenge.npy   float64 – Länge des Teilstücks in der Zelle (m)
+# und daraus je Zelle
+#   zonen.npy  float64 (Jahr, Schadstoff, Kennzahl, Zeile, Spalte), NaN = keine Straße
+# mit Jahren und Schadstoffen wie im Rasterwürfel und den KENNZAHLEN.
+ZONEN_DIR = BUILD_DIR / "zonen"
+ZONEN_VERSION = 1
+KENNZAHLEN = ("mittel", "max", "ueberschreitung_m", "laenge_m")
+
+
+def verschneide(strassen, wuerfel, jahr):
+    """Teilt die Abschnitte an den Zellgrenzen: (feature, zeile, spalte, laenge_m) als Arrays."""
+    # In Zelleinheiten rechnen – jede Zelle ist dort ein Einheitsquadrat
+    spalte_f, zeile_f = wuerfel.gitterkoordinaten(jahr, strassen.coords[:, 0], strassen.coords[:, 1])
+    linien = shapely.linestrings(
+        np.column_stack((spalte_f, zeile_f)),
+        indices=np.repeat(np.arange(len(strassen)), np.diff(strassen.offsets)),
+    )
+    zeilen, spalten = np.divmod(np.arange(wuerfel.zeilen * wuerfel.spalten), wuerfel.spalten)
+    zellen = shapely.box(spalten, zeilen, spalten + 1, zeilen + 1)
+    feature, zelle = shapely.STRtree(zellen).query(linien, predicate="intersects")
+    laenge = shapely.length(shapely.intersection(linien[feature], zellen[zelle])) * ZELLE_M
+    # Nur auf der Zellgrenze liegende Berührungen zählen nicht
+    teil = laenge > 0
+    return feature[teil], zeilen[zelle[teil]], spalten[zelle[teil]], laenge[teil]
+
+
+def kennzahlen(werte, zeile, spalte, laenge, form):
+    """Längengewichtetes Mittel, Maximum, Länge über GRENZWERT und Straßenlänge je Zelle."""
+    gueltig = ~np.isnan(werte)
+    zelle = np.ravel_multi_index((zeile[gueltig], spalte[gueltig]), form)
+    w, l = werte[gueltig], laenge[gueltig]
+    n = form[0] * form[1]
+    summe_l = np.bincount(zelle, weights=l, minlength=n)
+    summe_wl = np.bincount(zelle, weights=w * l, minlength=n)
+    ueber = np.bincount(zelle, weights=np.where(w > GRENZWERT, l, 0), minlength=n)
+    maximum = np.full(n, -np.inf)
+    np.maximum.at(maximum, zelle, w)
+
+    leer = summe_l == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ergebnis = np.stack([summe_wl / summe_l, maximum, ueber, summe_l])
+    ergebnis[:, leer] = np.nan
+    return ergebnis.reshape(len(KENNZAHLEN), *form)
+
+
+def baue_zonen(ziel=ZONEN_DIR):
+    wuerfel = lade_raster()
+    form = (wuerfel.zeilen, wuerfel.spalten)
+    zonen = np.full((len(wuerfel.jahre), len(wuerfel.schadstoffe), len(KENNZAHLEN)) + form, np.nan)
+    dateien = zonen_strassen_dateien()
+    for filepath in dateien:
+        schadstoff, _, jahr = layer_info(filepath.stem)
+        strassen = lade_strassen_layer(filepath)
+        feature, zeile, spalte, laenge = verschneide(strassen, wuerfel, jahr)
+
+        ordner = ziel / layer_slug(filepath.stem)
+        ordner.mkdir(parents=True, exist_ok=True)
+        speichere_array(ordner / "feature.npy", feature.astype(np.int32))
+        speichere_array(ordner / "zeile.npy", zeile.astype(np.int16))
+        speichere_array(ordner / "spalte.npy", spalte.astype(np.int16))
+        speichere_array(ordner / "laenge.npy", laenge)
+
+        werte = np.asarray(strassen.werte)[feature]
+        zonen[wuerfel.jahre.index(jahr), wuerfel.schadstoffe.index(schadstoff)] = kennzahlen(
+            werte, zeile, spalte, laenge, form
+        )
+
+    speichere_array(ziel / "zonen.npy", zonen)
+    # meta.json zuletzt schreiben – sie markiert einen vollständigen Satz
+    schreibe_json_atomar(ziel / "meta.json", {
+        "version": ZONEN_VERSION,
+        "quellen": _quellen(),
+        "jahre": wuerfel.jahre,
+        "schadstoffe": wuerfel.schadstoffe,
+        "kennzahlen": list(KENNZAHLEN),
+        "grenzwert": GRENZWERT,
+    }, indent=2)
+
+
+def _quellen():
+    return {f.stem: list(signatur(f)) for f in sorted(zonen_strassen_dateien() + flaechen_dateien())}
+
+
+class Zonen:
+    """Straßenrand-Kennzahlen je Rasterzelle, Jahr und Schadstoff."""
+
+    def __init__(self, verzeichnis=ZONEN_DIR):
+        with open(verzeichnis / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.werte = np.load(verzeichnis / "zonen.npy", mmap_mode="r")
+        self.jahre = self.meta["jahre"]
+        self.schadstoffe = self.meta["schadstoffe"]
+        self._sortiert = {}
+        # Stand für die Collections im Zwischenspeicher: die Signaturen der Quellen
+        self._stand = tuple(sorted((name, tuple(sig)) for name, sig in self.meta["quellen"].items()))
+
+    def zelle(self, zeile, spalte, jahr, schadstoff):
+        """Kennzahlen einer Zelle als dict oder None, wenn keine Straße mit Wert durch die Zelle führt."""
+        werte = self.werte[self.jahre.index(str(jahr)), self.schadstoffe.index(schadstoff), :, zeile, spalte]
+        if np.isnan(werte[0]):
+            return None
+        return {name: float(w) for name, w in zip(KENNZAHLEN, werte)}
+
+    def zellen_ueber(self, jahr, schadstoff, grenze):
+        """(Zellen mit Mittel > grenze, Zellen mit Straßen) – binäre Suche in den sortierten Mitteln."""
+        key = (str(jahr), schadstoff)
+        if key not in self._sortiert:
+            mittel = np.asarray(self.werte[self.jahre.index(key[0]), self.schadstoffe.index(schadstoff), 0]).ravel()
+            self._sortiert[key] = np.sort(mittel[~np.isnan(mittel)])
+        sortiert = self._sortiert[key]
+        return len(sortiert) - int(np.searchsorted(sortiert, grenze, side="right")), len(sortiert)
+
+    def feature_collection(self, jahr, schadstoff, grenze=None):
+        """Alle Zellen mit Straßen als Polygone; properties: KENNZAHLEN (gerundet) und klasse (nach dem Mittel).
+
+        Mit grenze nur die Zellen, deren Mittel über grenze liegt.
+        """
+        key = (str(jahr), schadstoff, grenze)
+        return zwischenspeicher.hole_oder_baue(
+            "zonen_collection", key, lambda: self._baue_collection(*key), stand=self._stand
+        )
+
+    def _baue_collection(self, jahr, schadstoff, grenze):
+        werte = self.werte[self.jahre.index(jahr), self.schadstoffe.index(schadstoff)]
+        belegt = ~np.isnan(werte[0])
+        if grenze is not None:
+            belegt &= np.nan_to_num(werte[0], nan=-np.inf) > grenze
+        zeilen, spalten = np.nonzero(belegt)
+        ecken = lade_raster().zellpolygone(jahr, zeilen, spalten).tolist()
+        mittel, maximum, ueber, laenge = (werte[k, zeilen, spalten] for k in range(len(KENNZAHLEN)))
+        return {"type": "FeatureCollection", "features": [
+            {
+                "type": "Feature",
+                "id": f"{z}/{s}",
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+                "properties": {
+                    "mittel": round(m, 1),
+                    "max": round(x, 1),
+                    "ueberschreitung_m": round(u),
+                    "laenge_m": round(l),
+                    "klasse": k,
+                },
+            }
+            for z, s, ring, m, x, u, l, k in zip(
+                zeilen.tolist(), spalten.tolist(), ecken, mittel.tolist(), maximum.tolist(),
+                ueber.tolist(), laenge.tolist(), farbklassen(mittel).tolist(),
+            )
+        ]}
+
+
+def lade_zonen():
+    """Kennzahlen aller Zellen; werden bei geänderten Quellen neu berechnet und prozessweit geteilt."""
+    return lade_abgeleitet(
+        "zonen", ZONEN_DIR, ZONEN_VERSION, {"quellen": _quellen()},
+        baue_zonen, lambda: Zonen(ZONEN_DIR),
+    )
+
+
+if __name__ == "__main__":
+    zonen = lade_zonen()
+    belegt = int((~np.isnan(zonen.werte[:, :, 0])).sum())
+    print(f" Zonen aktuell: {len(zonen.jahre)} Jahre × {len(zonen.schadstoffe)} Schadstoffe, "
+          f"{belegt} Zellen mit Straßen")
@@ -0,0 +1,166 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import messung
+
+# Gemeinsamer Zwischenspeicher aller Sessions eines Server-Prozesses für
+# Daten, die groß werden können und sich pro Auswahl unterscheiden: geparste
+# GeoJSON-Dateien (daten.py), die Kartendaten je Layerauswahl (kartenlayer.py),
+# Rasterbilder (raster.py) und Zellen-Collections (zonen.py). Alle Einträge
+# teilen sich ein Speicherbudget; ist es überschritten, werden die am längsten
+# nicht benutzten Einträge verdrängt (LRU nach geschätzter Größe, groesse()).
+#
+# Einträge liegen je Bereich und Schlüssel; stand (z. B. die Signaturen der
+# Quellen) gehört nicht zum Schlüssel – ein Eintrag mit anderem stand wird
+# ersetzt, statt bis zur Verdrängung liegen zu bleiben.
+#
+# Die Einträge werden von allen Aufrufern geteilt und dürfen nicht verändert werden.
+# LUFTDATEN_CACHE_MB setzt das Budget (Standard BUDGET_MB).
+BUDGET_MB = 256
+# Listen mit mehr Elementen werden für die Größenschätzung stichprobenartig vermessen
+STICHPROBE = 64
+
+_budget = int(float(os.environ.get("LUFTDATEN_CACHE_MB", BUDGET_MB)) * 2**20)
+# (bereich, key) -> (stand, wert, groesse_bytes), älteste zuerst
+_eintraege = OrderedDict()
+_belegt = 0
+# bereich -> [treffer, fehlschlaege, verdraengt, eintraege, bytes]
+_bereiche = {}
+# (bereich, key) -> Lock, solange ein Eintrag gebaut wird
+_im_bau = {}
+_lock = threading.Lock()
+
+
+def groesse(obj):
+    """Geschätzter Speicherbedarf von obj in Bytes.
+
+    Rekursiv über dict, list, tuple und set; numpy-Arrays zählen mit nbytes,
+    per mmap gelesene nicht (sie liegen im Seitencache des Betriebssystems).
+    Lange Listen werden über eine Stichprobe von STICHPROBE Elementen hochgerechnet.
+    """
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) if isinstance(obj, np.memmap) else sys.getsizeof(obj) + obj.nbytes
+    summe = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return summe + sum(groesse(k) + groesse(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        elemente = obj if isinstance(obj, (list, tuple)) else list(obj)
+        if len(elemente) > STICHPROBE:
+            schritt = len(elemente) / STICHPROBE
+            probe = [elemente[int(k * schritt)] for k in range(STICHPROBE)]
+            return summe + sum(map(groesse, probe)) * len(elemente) // STICHPROBE
+        return summe + sum(map(groesse, elemente))
+    return summe
+
+
+def _bereich(bereich):
+    return _bereiche.setdefault(bereich, [0, 0, 0, 0, 0])
+
+
+def _entferne(key):
+    # Aufrufer hält _lock
+    global _belegt
+    _, _, g = _eintraege.pop(key)
+    _belegt -= g
+    b = _bereich(key[0])
+    b[3] -= 1
+    b[4] -= g
+
+
+def _verdraenge():
+    # Aufrufer hält _lock; älteste Einträge entfernen, bis das Budget passt
+    while _belegt > _budget and _eintraege:
+        key = next(iter(_eintraege))
+        g = _eintraege[key][2]
+        _entferne(key)
+        _bereich(key[0])[2] += 1
+        messung.menge(f"verdraengt_{key[0]}_bytes", g)
+
+
+def hole(bereich, key, stand=None):
+    """(True, Wert) bei einem Treffer mit passendem stand, sonst (False, None)."""
+    with _lock:
+        eintrag = _eintraege.get((bereich, key))
+        treffer = eintrag is not None and eintrag[0] == stand
+        if treffer:
+            _eintraege.move_to_end((bereich, key))
+        _bereich(bereich)[0 if treffer else 1] += 1
+    messung.cache(bereich, treffer)
+    return (True, eintrag[1]) if treffer else (False, None)
+
+
+def lege_ab(bereich, key, wert, stand=None, groesse_bytes=None):
+    """Legt wert ab (ersetzt einen älteren stand) und gibt ihn zurück.
+
+    groesse_bytes ist die Größe, falls bekannt; sonst wird sie mit groesse() geschätzt.
+    Einträge über dem ganzen Budget werden nicht abgelegt.
+    """
+    global _belegt
+    g = groesse(wert) if groesse_bytes is None else groesse_bytes
+    with _lock:
+        if (bereich, key) in _eintraege:
+            _entferne((bereich, key))
+        if g <= _budget:
+            _eintraege[(bereich, key)] = (stand, wert, g)
+            _belegt += g
+            b = _bereich(bereich)
+            b[3] += 1
+            b[4] += g
+            _verdraenge()
+        belegt = _belegt
+    messung.menge("zwischenspeicher_bytes", belegt)
+    return wert
+
+
+def hole_oder_baue(bereich, key, bauen, stand=None):
+    """Wert aus dem Zwischenspeicher oder von bauen() erzeugt und abgelegt.
+
+    Fragen mehrere Sessions gleichzeitig denselben fehlenden Eintrag an, baut
+    ihn nur die erste; die übrigen warten auf sie und bekommen ihr Ergebnis.
+    """
+    gefunden, wert = hole(bereich, key, stand)
+    if gefunden:
+        return wert
+    with _lock:
+        bau_lock = _im_bau.setdefault((bereich, key), threading.Lock())
+    with bau_lock:
+        # Inzwischen von einer anderen Session gebaut? (ohne die Statistik erneut zu zählen)
+        with _lock:
+            eintrag = _eintraege.get((bereich, key))
+            if eintrag is not None and eintrag[0] == stand:
+                _eintraege.move_to_end((bereich, key))
+                return eintrag[1]
+        try:
+            return lege_ab(bereich, key, bauen(), stand)
+        finally:
+            with _lock:
+                _im_bau.pop((bereich, key), None)
+
+
+def leeren(bereich=None):
+    """Entfernt alle Einträge (eines Bereichs); die Statistik bleibt erhalten."""
+    with _lock:
+        for key in [k for k in _eintraege if bereich is None or k[0] == bereich]:
+            _entferne(key)
+
+
+def statistik():
+    """{bereich: {treffer, fehlschlaege, verdraengt, eintraege, bytes}} und die Summe unter "gesamt"."""
+    with _lock:
+        ergebnis = {
+            name: dict(zip(("treffer", "fehlschlaege", "verdraengt", "eintraege", "bytes"), werte))
+            for name, werte in sorted(_bereiche.items())
+        }
+        ergebnis["gesamt"] = {
+            "treffer": sum(b[0] for b in _bereiche.values()),
+            "fehlschlaege": sum(b[1] for b in _bereiche.values()),
+            "verdraengt": sum(b[2] for b in _bereiche.values()),
+            "eintraege": len(_eintraege),
+            "bytes": _belegt,
+            "budget": _budget,
+        }
+    return ergebnis